@@ -0,0 +1,350 @@
+r"""
+Benchmark suite for building, formatting and parsing scores.
+
+Synthetic scores are generated from a seeded random generator, so every
+run measures exactly the same input. Scores grow along four axes: notes
+per voice, number of voices, nesting depth and markup density. For every
+size the suite measures:
+
+- construction time: building the object tree
+- format time: turning the tree into lilypond code
+- parse time: reading that code back into a tree
+- pickle and unpickle time, and pickle size in bytes
+- snapshot dump and load time, and snapshot size in bytes
+- peak memory of construction and formatting
+- output size in bytes, and whether the parsed tree formats the same
+
+Timings are the best of a number of repeats. Results are written as JSON,
+so runs on the same machine can be compared to catch regressions::
+
+    python -m lilyflower.benchmark --output before.json
+    python -m lilyflower.benchmark --output after.json --compare before.json
+
+Peak memory is measured with `tracemalloc` where there is one (python
+3.4 and later): the most memory python objects took up at once. On
+python 2, every measurement runs in a forked child process instead, and
+the growth of its peak resident size (``ru_maxrss``) is reported. That
+counts whole pages, so it is less precise, but it is comparable between
+runs. Memory is reported as null where neither works.
+
+Examples
+========
+.. testsetup::
+
+    from lilyflower.benchmark import Config, generate, run
+
+.. doctest::
+
+    >>> config = Config(notes=8, voices=2, depth=2, markup=0.1)
+    >>> print format(generate(config, seed=1)).split("\n", 1)[1]
+    \version "2.18.2"
+    <BLANKLINE>
+    <<
+      {
+        {
+          < d' gis ces'>8. r8 fes'2.\p f
+        }
+        {
+          ces''8 < c'' ges' ais'>2. g8. gis'
+        }
+      }
+      {
+        {
+          {
+            e4.
+            \markup { \huge { \eyeglasses } }
+            d,16 fes''8.
+          }
+          {
+            cis,16 f8. f' c2
+          }
+        }
+        a,4.
+      }
+    >>
+    >>> result = run(config, repeat=1)
+    >>> print result['bytes'] > 0, result['round_trip']
+    True True
+"""
+from argparse import ArgumentParser
+from collections import namedtuple
+import cPickle
+import json
+import os
+import platform
+import random
+import sys
+from timeit import default_timer
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+try:
+    import resource
+except ImportError:
+    resource = None
+from lilyflower import dom, dynamics
+from lilyflower.container import Container
+from lilyflower.containers import Parallel
+from lilyflower.tones import Note, Rest, Chord, Pitch
+from lilyflower.parser import parse
+from lilyflower.snapshot import (
+    dumps as snapshot_dumps, loads as snapshot_loads)
+
+Config = namedtuple('Config', 'notes voices depth markup')
+
+SIZES = (
+    Config(notes=100, voices=1, depth=1, markup=0.0),
+    Config(notes=1000, voices=1, depth=1, markup=0.0),
+    Config(notes=1000, voices=4, depth=1, markup=0.0),
+    Config(notes=1000, voices=4, depth=4, markup=0.0),
+    Config(notes=1000, voices=4, depth=4, markup=0.1),
+    Config(notes=10000, voices=4, depth=4, markup=0.1))
+
+SEED = 1
+
+TIMINGS = (
+    'construct', 'format', 'parse', 'pickle', 'unpickle', 'dump', 'load')
+
+_LEAF = 4
+# ru_maxrss is in bytes on macOS, in kilobytes elsewhere
+_RSS_UNIT = 1 if sys.platform == 'darwin' else 1024
+_PITCHES = ('c', 'd', 'e', 'f', 'g', 'a', 'b')
+_ACCIDENTALS = ('', '', '', 'is', 'es')
+_OCTAVES = ("", "'", "''", ",")
+_DURATIONS = ('', '', '', '4', '8', '16', '2', '4.', '8.', '2.')
+_DYNAMICS = (dynamics.Piano, dynamics.MezzoForte, dynamics.Forte)
+_MARKUP = (dom.Bold, dom.Italic, dom.Huge)
+
+
+def _material(config, seed):
+    """Draw all random choices up front, as plain python values."""
+    rng = random.Random(seed)
+    voices = []
+    for _ in range(config.voices):
+        items = []
+        for _ in range(config.notes):
+            roll = rng.random()
+            duration = rng.choice(_DURATIONS)
+            dynamic = rng.choice(_DYNAMICS) if rng.random() < 0.05 else None
+            if roll < 0.1:
+                items.append(('rest', duration))
+            elif roll < 0.2:
+                items.append(('chord', [
+                    (rng.choice(_PITCHES) + rng.choice(_ACCIDENTALS),
+                     rng.choice(_OCTAVES)) for _ in range(3)],
+                              duration, dynamic))
+            else:
+                items.append((
+                    'note',
+                    rng.choice(_PITCHES) + rng.choice(_ACCIDENTALS),
+                    rng.choice(_OCTAVES), duration, dynamic))
+            if rng.random() < config.markup:
+                items.append(('markup', rng.choice(_MARKUP)))
+        voices.append(items)
+    return voices
+
+
+def _build_item(item):
+    """Construct a single tone or markup."""
+    kind = item[0]
+    if kind == 'note':
+        _, pitch, octave, duration, dynamic = item
+        return Note(
+            pitch, octave, duration,
+            note_commands=None if dynamic is None else [dynamic()])
+    elif kind == 'chord':
+        _, pitches, duration, dynamic = item
+        return Chord(
+            [Pitch(pitch, octave) for pitch, octave in pitches], duration,
+            note_commands=None if dynamic is None else [dynamic()])
+    elif kind == 'rest':
+        return Rest(item[1])
+    return dom.Markup([item[1]([dom.Eyeglasses()])])
+
+
+def _nest(items, depth):
+    """Split items in two halves, depth levels deep."""
+    if depth <= 1 or len(items) < 2:
+        return Container([_build_item(item) for item in items])
+    half = len(items) // 2
+    return Container([
+        _nest(items[:half], depth - 1), _nest(items[half:], depth - 1)])
+
+
+def build(material, depth):
+    """Construct a score from material drawn by `_material`."""
+    # innermost containers hold _LEAF items
+    size = _LEAF * 2 ** (depth - 1)
+    voices = []
+    for items in material:
+        voices.append(Container([
+            _nest(items[start:start + size], depth)
+            for start in range(0, len(items), size)]))
+    if len(voices) == 1:
+        return dom.LilyFile(voices)
+    return dom.LilyFile([Parallel(voices)])
+
+
+def generate(config, seed=SEED):
+    """Generate a synthetic score of the given size."""
+    return build(_material(config, seed), config.depth)
+
+
+def _body(text):
+    """Strip the creation comment, which contains the time."""
+    return text.split("\n", 1)[1]
+
+
+def _peak_rss(function, *args):
+    """Return growth of peak resident size in bytes, in a child process."""
+    if resource is None or not hasattr(os, 'fork'):
+        return None
+    read_end, write_end = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        # the child starts with the peak reset to its current size
+        try:
+            os.close(read_end)
+            before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            function(*args)
+            after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            os.write(write_end, str(after - before))
+        finally:
+            os._exit(0)  # pylint: disable=protected-access
+    os.close(write_end)
+    with os.fdopen(read_end) as pipe:
+        data = pipe.read()
+    os.waitpid(pid, 0)
+    return int(data) * _RSS_UNIT if data else None
+
+
+def _peak(function, *args):
+    """Return peak memory in bytes used while calling function."""
+    if tracemalloc is None:
+        return _peak_rss(function, *args)
+    tracemalloc.start()
+    try:
+        function(*args)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def run(config, seed=SEED, repeat=3):
+    """Benchmark a single size, return a dict of measurements."""
+    material = _material(config, seed)
+    timings = dict((key, []) for key in TIMINGS)
+    for _ in range(repeat):
+        start = default_timer()
+        tree = build(material, config.depth)
+        timings['construct'].append(default_timer() - start)
+        start = default_timer()
+        text = format(tree)
+        timings['format'].append(default_timer() - start)
+        start = default_timer()
+        parsed = parse(text)
+        timings['parse'].append(default_timer() - start)
+        start = default_timer()
+        data = cPickle.dumps(tree, cPickle.HIGHEST_PROTOCOL)
+        timings['pickle'].append(default_timer() - start)
+        start = default_timer()
+        cPickle.loads(data)
+        timings['unpickle'].append(default_timer() - start)
+        start = default_timer()
+        snapshot = snapshot_dumps(tree)
+        timings['dump'].append(default_timer() - start)
+        start = default_timer()
+        snapshot_loads(snapshot)
+        timings['load'].append(default_timer() - start)
+    result = dict(config._asdict())
+    result.update((key, min(value)) for key, value in timings.items())
+    result['bytes'] = len(text)
+    result['pickle_bytes'] = len(data)
+    result['snapshot_bytes'] = len(snapshot)
+    result['round_trip'] = _body(format(parsed)) == _body(text)
+    result['construct_memory'] = _peak(build, material, config.depth)
+    result['format_memory'] = _peak(format, build(material, config.depth))
+    return result
+
+
+def run_all(sizes=SIZES, seed=SEED, repeat=3, report=None):
+    """Benchmark all sizes, return results ready to be stored as JSON."""
+    results = []
+    for config in sizes:
+        result = run(config, seed, repeat)
+        if report is not None:
+            report(result)
+        results.append(result)
+    return {
+        'python': platform.python_version(),
+        'implementation': platform.python_implementation(),
+        'machine': platform.machine(),
+        'seed': seed,
+        'repeat': repeat,
+        'results': results}
+
+
+def compare(old, new, tolerance=0.1):
+    """
+    Compare two stored runs.
+
+    Returns a list of (config, measurement, old, new) tuples for every
+    timing that got slower by more than `tolerance` (a fraction).
+    """
+    previous = dict(
+        (Config(**dict((field, result[field]) for field in Config._fields)),
+         result) for result in old['results'])
+    regressions = []
+    for result in new['results']:
+        config = Config(*(result[field] for field in Config._fields))
+        if config not in previous:
+            continue
+        for key in TIMINGS:
+            if key not in previous[config]:
+                continue
+            before = previous[config][key]
+            if result[key] > before * (1 + tolerance):
+                regressions.append((config, key, before, result[key]))
+    return regressions
+
+
+def _print_result(result):
+    """Print a single result as a table row."""
+    print "{notes:>6} {voices:>2} {depth:>2} {markup:>4}  " \
+        "{construct:9.4f} {format:8.4f} {parse:8.4f} {bytes:>10}  " \
+        "{pickle:8.4f} {unpickle:8.4f} {pickle_bytes:>10}  " \
+        "{dump:8.4f} {load:8.4f} {snapshot_bytes:>10}".format(**result)
+
+
+def main(argv=None):
+    """Run benchmarks from the command line."""
+    parser = ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument('-o', '--output', help="write results to JSON file")
+    parser.add_argument(
+        '-c', '--compare', help="compare with results from JSON file")
+    parser.add_argument('-r', '--repeat', type=int, default=3)
+    parser.add_argument('-s', '--seed', type=int, default=SEED)
+    parser.add_argument(
+        '-t', '--tolerance', type=float, default=0.1,
+        help="allowed slowdown before reporting a regression")
+    args = parser.parse_args(argv)
+    print " notes  v  d  mrk  construct   format    parse      bytes  " \
+        "  pickle unpickle     pickle      dump     load   snapshot"
+    results = run_all(
+        seed=args.seed, repeat=args.repeat, report=_print_result)
+    if args.output is not None:
+        with open(args.output, 'w') as output:
+            json.dump(results, output, indent=2, sort_keys=True)
+    if args.compare is not None:
+        with open(args.compare) as old:
+            regressions = compare(json.load(old), results, args.tolerance)
+        for config, key, before, after in regressions:
+            print "regression: %s %s %.4f -> %.4f" % (
+                config, key, before, after)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
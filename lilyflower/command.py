@@ -1,8 +1,10 @@
 """Non-container command."""
 from lilyflower.errors import InvalidArgument
+from lilyflower.pickling import CompactPickle
+from lilyflower.tools import get_indent_level, child_format_spec
 
 
-class Command(object):
+class Command(CompactPickle):
 
     r"""
     Command stub.
@@ -57,6 +59,7 @@ class Command(object):
         Expects between 0 and 0 arguments.
     """
 
+    _state = ('_arguments', '_validated_arguments')
     _command = "\\test"
     _min_arguments = 0
     _max_arguments = 0
@@ -82,14 +85,10 @@ class Command(object):
 
     def __format__(self, format_spec):
         """Return lilypond code."""
-        indent_level = 0
-        if format_spec != "":
-            indent_level = int(format_spec)
+        child_spec = child_format_spec(get_indent_level(format_spec))
         result = self._command
         if self._validated_arguments is not None:
-            new_indent = indent_level + 1
             result += " " + " ".join(
-                format(
-                    item,
-                    str(new_indent)) for item in self._validated_arguments)
+                format(item, child_spec)
+                for item in self._validated_arguments)
         return result
@@ -1,8 +1,13 @@
 """Container type - can contain leafs and other containers."""
 from lilyflower.errors import InvalidArgument
+from lilyflower.events import changing, notify
+from lilyflower.pickling import CompactPickle
+from lilyflower.tools import (
+    format_pieces, get_indent_level, child_format_spec, shallow_copy,
+    COMPACT)
 
 
-class Container(object):
+class Container(CompactPickle):
 
     r"""
     Main structural component.
@@ -110,12 +115,17 @@ class Container(object):
         }
     """
 
+    _state = ('_container', '_arguments', '_validated_arguments')
+    # see `lilyflower.events`
+    _transient = ('_observers',)
+    _observers = None
     _command = ""
     _delimiter_pre = "{"
     _delimiter_post = "}"
     _min_arguments = 0
     _max_arguments = 0
     _validated_arguments = None
+    _types = ('music',)
     _inline = False
 
     def __init__(self, content, arguments=None):
@@ -171,14 +181,24 @@ class Container(object):
     def append(self, value):
         """Add to the end of the container."""
         self._container.append(value)
+        if self._observers is not None:
+            notify(self, 'append', len(self._container) - 1, [], [value])
 
     def extend(self, extension):
         """Add list to end of container."""
+        start = len(self._container)
         self._container.extend(extension)
+        if self._observers is not None and len(self._container) > start:
+            notify(self, 'extend', start, [], self._container[start:])
 
     def insert(self, index, value):
         """Insert value at index."""
-        self._container.insert(index, value)
+        if self._observers is None:
+            self._container.insert(index, value)
+        else:
+            with changing(
+                    self, 'insert', self._container, slice(index, index)):
+                self._container.insert(index, value)
 
     def count(self, value):
         """Count occurances of value."""
@@ -187,15 +207,26 @@ class Container(object):
 
     def pop(self):
         """Pop value."""
-        return self._container.pop()
+        value = self._container.pop()
+        if self._observers is not None:
+            notify(self, 'pop', len(self._container), [value], [])
+        return value
 
     def remove(self, value):
         """Remove first occurenc of value."""
-        self._container.remove(value)
+        index = self._container.index(value)
+        old = self._container[index]
+        del self._container[index]
+        if self._observers is not None:
+            notify(self, 'remove', index, [old], [])
 
     def reverse(self):
         """Reverse order."""
-        self._container.reverse()
+        if self._observers is None:
+            self._container.reverse()
+        else:
+            with changing(self, 'reverse', self._container):
+                self._container.reverse()
         # now reverse all containers inside this one as well
         for item in self._container:
             if isinstance(item, Container):
@@ -203,7 +234,11 @@ class Container(object):
 
     def sort(self, cmp=None, key=None, reverse=False):
         """Sort container."""
-        self._container.sort(cmp, key, reverse)
+        if self._observers is None:
+            self._container.sort(cmp, key, reverse)
+        else:
+            with changing(self, 'sort', self._container):
+                self._container.sort(cmp, key, reverse)
 
     def index(self, value):
         """Find index of value in container."""
@@ -214,20 +249,31 @@ class Container(object):
         return iter(self._container)
 
     def __reversed__(self):
-        """Iterate over object in reverse order (UNIMPLEMENTED)."""
-        pass
+        """Iterate over content in reverse order, without copying it."""
+        return reversed(self._container)
 
     def __getitem__(self, index):
-        """Return item at index."""
+        """Return item at index, or a `lilyflower.view.View` for a slice."""
+        if isinstance(index, slice):
+            from lilyflower.view import View
+            return View(self._container, index.start, index.stop, index.step)
         return self._container[index]
 
     def __setitem__(self, index, value):
         """Set item at index."""
-        self._container[index] = value
+        if self._observers is None:
+            self._container[index] = value
+        else:
+            with changing(self, 'setitem', self._container, index):
+                self._container[index] = value
 
     def __delitem__(self, index):
         """Delete item at index."""
-        del self._container[index]
+        if self._observers is None:
+            del self._container[index]
+        else:
+            with changing(self, 'delitem', self._container, index):
+                del self._container[index]
 
     def __len__(self):
         """Return length of container."""
@@ -247,47 +293,64 @@ class Container(object):
 
     def __format__(self, format_spec):
         """Return lilypond code."""
-        indent_level = 0
-        if format_spec is not "":
-            indent_level = int(format_spec)
-        if len(self._container) == 1:
+        return format_pieces(self._iter_format(get_indent_level(format_spec)))
+
+    def _iter_format(self, indent_level):
+        """
+        Generate lilypond code in pieces.
+
+        Pieces are strings, or (child, format_spec) tuples for children
+        that still need formatting, see `lilyflower.tools.format_pieces`.
+        An indent_level of None gives compact code.
+        """
+        return self._iter_items(
+            indent_level, self._container, len(self._container))
+
+    def _iter_items(self, indent_level, items, length):
+        """Generate code in pieces for length items from iterable items."""
+        if length == 1:
             # don't print delimiters at length 1
             # also, don't increase indent, we didn't use it here
+            spec = COMPACT if indent_level is None else str(indent_level)
+            item = next(iter(items))
             if self._command == "":
-                return format(self._container[0], str(indent_level))
+                yield (item, spec)
             elif len(self._validated_arguments) == 0:
-                return "%s %s" % (
-                    self._command,
-                    format(self._container[0], str(indent_level)))
+                yield "%s " % self._command
+                yield (item, spec)
             else:
-                return "%s %s %s" % (
+                # formatted arguments end in a space
+                yield "%s %s" % (
                     self._command,
-                    self._format_arguments(),
-                    format(self._container[0], str(indent_level)))
-        result = ""
+                    self._format_arguments())
+                yield (item, spec)
+            return
         if self._command != "":
-            result += "%s %s%s" % (
+            yield "%s %s%s" % (
                 self._command,
                 self._format_arguments(),
                 self._delimiter_pre)
         else:
-            result += self._delimiter_pre
+            yield self._delimiter_pre
 
         inline_previous = False
-        for item in self._container:
-            separator = "\n%s" % ("  " * (indent_level + 1))
+        if indent_level is None:
+            newline = closing = " "
+        else:
+            newline = "\n%s" % ("  " * (indent_level + 1))
+            closing = "\n%s" % ("  " * indent_level)
+        child_spec = child_format_spec(indent_level)
+        for item in items:
             inline_current = item._inline
             # the only time we need a space as separator is
             # when both the current and previous item are inline
             if inline_previous and inline_current:
-                separator = " "
-            result += "%s%s" % (separator, format(
-                item,
-                str(indent_level + 1)))
+                yield " "
+            else:
+                yield newline
+            yield (item, child_spec)
             inline_previous = inline_current
-        result += "\n%s%s" % ("  " * indent_level, self._delimiter_post)
-
-        return result
+        yield closing + self._delimiter_post
 
     def __iadd__(self, other):
         """Add something to the container in place."""
@@ -316,13 +379,37 @@ class Container(object):
         # Other has to be an integer
         if not isinstance(other, int):
             raise TypeError
-        self._container *= other
+        if self._observers is None:
+            self._container *= other
+        else:
+            with changing(self, 'imul', self._container):
+                self._container *= other
         return self
 
     def __mul__(self, other):
-        """Multiply container."""
-        # Same thing as __imul__()
-        return self.__imul__(other)
+        """
+        Repeat the content, without copying it.
+
+        Returns a copy of the container, with the same command and
+        arguments, that holds a `lilyflower.repetition.Repetition` of
+        the content, so it formats the same as the container with the
+        content repeated. A plain container gives the repetition
+        itself. Containers that aren't sequential, like ``<< >>``, get
+        their content list repeated instead, sharing the items.
+        """
+        from lilyflower.repetition import Repetition
+        if not isinstance(other, int):
+            raise TypeError
+        if self._delimiter_pre != Container._delimiter_pre:
+            content = self._container * other
+        else:
+            loop = Repetition(self._container, other)
+            if type(self) is Container:
+                return loop
+            content = [loop]
+        new = shallow_copy(self)
+        new._container = content
+        return new
 
     def __rmul__(self, other):
         """Multiply conainer, arguments reversed."""
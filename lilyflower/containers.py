@@ -2,6 +2,11 @@
 import datetime
 
 from lilyflower.container import Container
+from lilyflower.errors import InvalidArgument
+from lilyflower.tones import Pitch
+from lilyflower.tools import (
+    format_pieces, get_indent_level, child_format_spec, COMPACT)
+from lilyflower.writer import save
 
 
 class LilyFile(Container):
@@ -79,21 +84,38 @@ class LilyFile(Container):
     _delimiter_pre = ""
     _delimiter_post = ""
 
-    def __format__(self, _):
+    def __format__(self, format_spec):
         """Return lilypond code."""
+        return format_pieces(self._iter_format(get_indent_level(format_spec)))
+
+    def _iter_format(self, indent_level):
+        """Generate lilypond code in pieces, see `Container._iter_format`."""
         # root container does not indent its children
-        result = "%% Created with lilyflower at %s\n" % datetime.datetime.now()
+        yield "%% Created with lilyflower at %s\n" % datetime.datetime.now()
+        if indent_level is None:
+            newline, spec = " ", COMPACT
+        else:
+            newline, spec = "\n", ""
         inline_previous = False
-        for item in self._container:
-            separator = "\n"
+        for index, item in enumerate(self._container):
             inline_current = item._inline
             # the only time we need a space as separator is when
             # both the current and previous item are inline
             if inline_previous and inline_current:
-                separator = " "
-            result += "%s%s" % (separator, format(item))
+                yield " "
+            elif index > 0 or indent_level is not None:
+                yield newline
+            yield (item, spec)
             inline_previous = inline_current
-        return result
+
+    def save(self, path, fsync=False, compress=None, keep_unchanged=False,
+             compact=False):
+        """
+        Write lilypond code to a file, atomically.
+
+        See `lilyflower.writer.save` for the parameters.
+        """
+        return save(self, path, fsync, compress, keep_unchanged, compact)
 
 
 class Book(Container):
@@ -321,8 +343,8 @@ class Parallel(Container):
 
     """Parallel block."""
 
-    delimiter_pre = "<<"
-    delimiter_post = ">>"
+    _delimiter_pre = "<<"
+    _delimiter_post = ">>"
 
 
 class Voice(Container):
@@ -378,17 +400,27 @@ class Absolute(Container):
     _command = "\\absolute"
 
 
-class Relative(Container):
+class _PitchArguments(Container):
+
+    """Block with pitches for arguments."""
+
+    def _validate_arguments(self):
+        """Make sure the arguments are pitches."""
+        for argument in self._arguments:
+            if not isinstance(argument, Pitch):
+                raise InvalidArgument("%r is not a Pitch." % argument)
+        self._validated_arguments = list(self._arguments)
+
+
+class Relative(_PitchArguments):
 
     """Relative block."""
 
     _command = "\\relative"
     _max_arguments = 1
 
-    # TODO: we need argument validation here!
 
-
-class Transpose(Container):
+class Transpose(_PitchArguments):
 
     """Transpose block."""
 
@@ -396,8 +428,6 @@ class Transpose(Container):
     _min_arguments = 2
     _max_arguments = 2
 
-    # TODO: we need argument validation here!
-
 
 class Markup(Container):
 
@@ -436,11 +466,9 @@ class Measure(Container):
 
     def __format__(self, format_spec):
         """Return lilypond code."""
-        indent_level = 0
-        if format_spec is not "":
-            indent_level = int(format_spec)
+        child_spec = child_format_spec(get_indent_level(format_spec))
         result = " ".join([
-            format(item, str(indent_level + 1)) for item in self._container])
+            format(item, child_spec) for item in self._container])
         if len(self._arguments) < 1:
             result += " |"
         else:
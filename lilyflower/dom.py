@@ -3,8 +3,62 @@ import datetime
 import re
 from lilyflower.syntax import SPEC
 from lilyflower.node import Node
-from lilyflower.tools import property_to_class, generate_docstring
+from lilyflower.tools import (
+    property_to_class, generate_docstring, format_pieces, get_indent_level,
+    child_format_spec, COMPACT)
 from lilyflower.errors import InvalidArgument, InvalidContent
+from lilyflower.writer import save
+
+
+def _compile_format(attributes):
+    """
+    Return a __format__ specialised for a spec item.
+
+    Everything `Node._iter_format` works out from the class attributes
+    (tag, delimiters, spacing) is put together once, here, so
+    formatting a node only fills in its position, arguments and
+    content. Nodes with more than one content item, which are not
+    the common case in markup, still go through `Node._iter_format`.
+    """
+    tag = attributes.lily_name
+    if attributes.allowed_content is None:
+        # plain command, maybe with arguments
+        def __format__(self, _):
+            """Return lilypond code."""
+            if self._stored_arguments:
+                return "%s%s %s" % (self._position, tag, " ".join([
+                    format(value, "")
+                    for value in self._stored_arguments.values()]))
+            return self._position + tag
+        return __format__
+    # tag and delimiter, with and without arguments in between
+    head = "%s %s" % (tag, attributes.delimiter_open) if tag != "" \
+        else attributes.delimiter_open
+    arguments_tail = " " + attributes.delimiter_open
+    tail = " " + attributes.delimiter_close
+
+    def __format__(self, format_spec):
+        """Return lilypond code."""
+        content = self._content
+        if len(content) > 1:
+            return format_pieces(
+                self._iter_format(get_indent_level(format_spec)))
+        if self._stored_arguments:
+            start = "%s%s %s%s" % (self._position, tag, " ".join([
+                format(value, "")
+                for value in self._stored_arguments.values()]),
+                                   arguments_tail)
+        else:
+            start = self._position + head
+        if not content:
+            return start + tail
+        return "%s %s%s" % (
+            start,
+            format(content[0], child_format_spec(
+                get_indent_level(format_spec))),
+            tail)
+    return __format__
+
 
 for key in SPEC:
     class_name = property_to_class(key)
@@ -14,6 +68,9 @@ for key in SPEC:
         (Node,),
         {
             '__doc__': generate_docstring(class_name, attributes),
+            '__format__': _compile_format(attributes),
+            # keeps nodes with a specialised __format__ streamable
+            '_iter_format': Node.__dict__['_iter_format'],
             '_tag': attributes.lily_name,
             '_types': attributes.types,
             '_arguments': attributes.arguments,
@@ -66,11 +123,13 @@ class LilyFile(Node):
 
         >>> print format(LilyFile([Score()], version="2.18.2"))
         % Created with lilyflower at ...-...-... ...:...:...
-        \version 2.18.2
+        \version "2.18.2"
         <BLANKLINE>
         \score { }
     """
 
+    _state = Node._state + ('_version',)
+
     def __init__(self, content=None, version=None):
         """Set content and version."""
         self._content = []
@@ -86,12 +145,33 @@ class LilyFile(Node):
         else:
             self._version = version
 
-    def __format__(self, _):
+    def __format__(self, format_spec):
         """Return lilypond code."""
-        result = "%% Created with lilyflower at %s\n" % datetime.datetime.now()
-        result += "\\version %s\n\n" % self._version
-        result += "\n".join(format(item) for item in self._content)
-        return result
+        return format_pieces(self._iter_format(get_indent_level(format_spec)))
+
+    def _iter_format(self, indent_level):
+        """Generate lilypond code in pieces, see `Node._iter_format`."""
+        yield "%% Created with lilyflower at %s\n" % datetime.datetime.now()
+        if indent_level is None:
+            yield "\\version \"%s\"" % self._version
+            for item in self._content:
+                yield " "
+                yield (item, COMPACT)
+            return
+        yield "\\version \"%s\"\n\n" % self._version
+        for index, item in enumerate(self._content):
+            if index > 0:
+                yield "\n"
+            yield (item, "")
+
+    def save(self, path, fsync=False, compress=None, keep_unchanged=False,
+             compact=False):
+        """
+        Write lilypond code to a file, atomically.
+
+        See `lilyflower.writer.save` for the parameters.
+        """
+        return save(self, path, fsync, compress, keep_unchanged, compact)
 
 
 class Comment(Node):
@@ -138,9 +218,12 @@ class Comment(Node):
 
     def __format__(self, format_spec):
         """Return lilypond code."""
-        indent_level = 0
-        if format_spec != "":
-            indent_level = int(format_spec)
+        indent_level = get_indent_level(format_spec)
+        if indent_level is None:
+            # a line comment has to end the line
+            if len(self._content) == 1:
+                return "%% %s\n" % self._content[0]
+            return "%%{ %s %%}" % "\n".join(self._content)
         if len(self._content) == 0:
             return "%"
         elif len(self._content) == 1:
@@ -21,6 +21,7 @@ class Crescendo(Dynamic):
     Optional argument: closing part (Dynamic) - default = \\!
     """
 
+    _state = Dynamic._state + ('_close', '_num_displays')
     _command = "\\<"
     _close = "\\!"
     _max_arguments = 1
@@ -41,3 +41,24 @@ class InvalidContent(ValueError):
     """Invalid content."""
 
     pass
+
+
+class ParseError(ValueError):
+
+    """Invalid lilypond input."""
+
+    pass
+
+
+class RenderError(EnvironmentError):
+
+    """Lilypond could not be run."""
+
+    pass
+
+
+class SnapshotError(ValueError):
+
+    """Invalid or incompatible snapshot."""
+
+    pass
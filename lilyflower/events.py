@@ -0,0 +1,208 @@
+r"""
+Change events for nodes and containers.
+
+Caches, indexes and editors can `observe` a `Node` or `Container` to
+hear about every change made through its methods: ``append``,
+``extend``, ``insert``, ``pop``, ``remove``, ``reverse``, ``sort``,
+item assignment and deletion, and ``+=`` and ``*=`` on containers.
+Observers are called with a `Change` right after the change is made.
+Objects nobody observes only pay for checking an attribute.
+
+A `Change` has the object that changed, the name of the operation, and
+what it replaced:
+
+- for content, index is where the change starts, and old and new are
+  lists of the items that were there before and are there now. Sorting
+  and reversing replace all content, starting at 0.
+- for arguments of a node, index is the name of the argument, and old
+  and new are its values, None when not set. Multiplying a repetition
+  in place changes ``'repeats'`` the same way.
+
+Indexes are into the stored content, for a `Repetition` that is the
+body. Only the observed object itself reports changes: reversing a tree
+changes every container in it, and each of them reports its own change.
+
+Inside `batch` changes are held back and delivered when the outermost
+batch ends. Changes to the same object that follow each other are
+merged where the later one is inside what the earlier one did: a run of
+appends becomes a single change, and so does setting an item twice.
+Merged changes have operation ``"splice"`` when their operations
+differ, and changes that end up replacing items by the same items are
+dropped. Batches belong to the thread they are in: changes made by
+other threads at the same time are delivered right away.
+
+Changes made directly to ``_content`` or ``_container`` are not seen.
+
+Examples
+========
+.. testsetup::
+
+    from lilyflower.events import batch, observe
+    from lilyflower.container import Container
+    from lilyflower.tones import Note
+
+.. doctest::
+
+    >>> music = Container([Note('c')])
+    >>> def show(change):
+    ...     print change.operation, change.index, [
+    ...         format(item) for item in change.new]
+    >>> observe(music, show)
+    >>> music.append(Note('d'))
+    append 1 ['d']
+    >>> with batch():
+    ...     music.append(Note('e'))
+    ...     music.append(Note('f'))
+    ...     music[0] = Note('g')
+    append 2 ['e', 'f']
+    setitem 0 ['g']
+"""
+import threading
+from collections import namedtuple
+from contextlib import contextmanager
+
+Change = namedtuple('Change', 'node operation index old new')
+
+
+class _Batches(threading.local):
+
+    """Changes held back by batch, and the nesting depth, per thread."""
+
+    def __init__(self):
+        """Start outside any batch."""
+        super(_Batches, self).__init__()
+        self.pending = []
+        self.depth = 0
+
+_BATCHES = _Batches()
+
+
+def observe(obj, observer):
+    """Call observer with a `Change` for every change to obj."""
+    # pylint: disable=protected-access
+    if obj._observers is None:
+        obj._observers = []
+    obj._observers.append(observer)
+
+
+def unobserve(obj, observer):
+    """Stop calling observer for changes to obj."""
+    # pylint: disable=protected-access
+    observers = obj._observers or []
+    observers.remove(observer)
+    if not observers:
+        obj._observers = None
+
+
+@contextmanager
+def batch():
+    """Hold back changes and deliver them merged at the end."""
+    batches = _BATCHES
+    batches.depth += 1
+    try:
+        yield
+    finally:
+        batches.depth -= 1
+        if not batches.depth:
+            changes = _merged(batches.pending)
+            del batches.pending[:]
+            for change in changes:
+                _deliver(change)
+
+
+def notify(obj, operation, index, old, new):
+    """Tell the observers of obj about a change, see `Change`."""
+    change = Change(obj, operation, index, old, new)
+    batches = _BATCHES
+    if batches.depth:
+        batches.pending.append(change)
+    else:
+        _deliver(change)
+
+
+@contextmanager
+def changing(obj, operation, content, key=slice(None)):
+    """
+    Notify observers of obj about a change to content[key] in the block.
+
+    key is an index or a slice. Slices with a step report all content
+    as changed, like sorting does.
+    """
+    length = len(content)
+    if isinstance(key, slice):
+        start, stop, step = key.indices(length)
+        if step != 1:
+            start, stop = 0, length
+        stop = max(start, stop)
+    else:
+        start = key + length if key < 0 else key
+        stop = start + 1
+    old = list(content[start:stop])
+    yield
+    stop += len(content) - length
+    notify(obj, operation, start, old, list(content[start:stop]))
+
+
+def _deliver(change):
+    """Call the observers of the object that changed."""
+    # pylint: disable=protected-access
+    observers = change.node._observers
+    if observers is not None:
+        for observer in list(observers):
+            observer(change)
+
+
+def _same(old, new):
+    """See if old and new are the same items or value."""
+    if type(old) is list and type(new) is list:
+        return len(old) == len(new) and \
+            all(first is second for first, second in zip(old, new))
+    return old is new
+
+
+def _merge(first, second):
+    """Return first and second as a single change, or None if they don't."""
+    operation = first.operation
+    if second.operation != operation:
+        operation = "splice"
+    if isinstance(first.index, basestring) or \
+            isinstance(second.index, basestring):
+        if first.index != second.index:
+            return None
+        return Change(
+            first.node, operation, first.index, first.old, second.new)
+    # second changed part of what first put in
+    offset = second.index - first.index
+    if 0 <= offset and offset + len(second.old) <= len(first.new):
+        return Change(
+            first.node, operation, first.index, first.old,
+            first.new[:offset] + second.new +
+            first.new[offset + len(second.old):])
+    # second replaced everything first put in, and maybe more
+    offset = first.index - second.index
+    if 0 <= offset and offset + len(first.new) <= len(second.old):
+        return Change(
+            first.node, operation, second.index,
+            second.old[:offset] + first.old +
+            second.old[offset + len(first.new):],
+            second.new)
+    return None
+
+
+def _merged(changes):
+    """Return changes with those that follow each other merged."""
+    result = []
+    # id of a changed object -> position of its last change in result
+    last = {}
+    for change in changes:
+        key = id(change.node)
+        position = last.get(key)
+        if position is not None:
+            merged = _merge(result[position], change)
+            if merged is not None:
+                result[position] = merged
+                continue
+        last[key] = len(result)
+        result.append(change)
+    return [
+        change for change in result if not _same(change.old, change.new)]
@@ -0,0 +1,185 @@
+r"""
+Undo and redo with snapshots that share structure.
+
+A `History` keeps versions of a tree without copying it. Versions share
+everything that did not change between them: an edit goes through
+`History.edit`, which copies the objects on the path from the root to
+the object that is edited, and nothing else. Taking a snapshot only
+marks the current tree as done, so it takes constant time, and the
+memory a version costs grows with the size of its edits, not with the
+size of the tree.
+
+Paths are lists of steps from the root: an int picks an item of the
+content (the body for a `Repetition`), a string picks an argument of a
+node. Copies of nodes and containers have copies of their content and
+arguments, the items in them are shared until they are edited
+themselves. Content stored in a `Rope` is copied in full.
+
+Trees in the history, including the root that was passed in, must not
+be changed directly, only through the objects `edit` returns. Those
+can be changed until the next `commit`, `snapshot`, `undo` or `redo`.
+Copies made by `edit` are not observed, see `lilyflower.events`.
+
+Examples
+========
+.. testsetup::
+
+    from lilyflower.history import History
+    from lilyflower.container import Container
+    from lilyflower.tones import Note
+
+.. doctest::
+
+    >>> music = Container([Container([Note('c')]), Container([Note('e')])])
+    >>> history = History(music)
+    >>> history.edit(0).append(Note('d'))
+    >>> first = history.snapshot()
+    >>> history.edit(1)[0] = Note('f')
+    >>> print format(history.root, 'c')
+    { { c d } f }
+    >>> history.root[1] is music[1], history.root[0] is first[0]
+    (False, True)
+    >>> print format(history.undo(), 'c')
+    { { c d } e }
+    >>> print format(history.undo(), 'c')
+    { c e }
+    >>> print format(history.redo(), 'c')
+    { { c d } e }
+"""
+from collections import OrderedDict
+from lilyflower.rope import Rope
+from lilyflower.tools import shallow_copy
+
+# attributes that hold the content of nodes and containers
+_CONTENT = ('_content', '_container')
+
+
+def _copy(obj):
+    """Return a copy of obj with copies of its lists, sharing the items."""
+    new = shallow_copy(obj)
+    attributes = new.__dict__
+    for name, value in attributes.iteritems():
+        kind = type(value)
+        if kind is list:
+            attributes[name] = list(value)
+        elif kind is OrderedDict:
+            attributes[name] = OrderedDict(value)
+        elif kind is Rope:
+            # pylint: disable=protected-access
+            attributes[name] = Rope(value, value._chunk_size)
+    return new
+
+
+def _storage(obj, step):
+    """Return the list or dict that holds the child of obj at step."""
+    if isinstance(step, basestring):
+        arguments = getattr(obj, '_stored_arguments', None)
+        if arguments is None:
+            raise KeyError("%r has no arguments" % obj)
+        return arguments
+    for name in _CONTENT:
+        content = getattr(obj, name, None)
+        if content is not None:
+            return content
+    raise IndexError("%r has no content" % obj)
+
+
+class History(object):
+
+    """
+    Versions of a tree, with undo and redo.
+
+    Usage::
+
+        History(root, limit=None)
+
+    Parameters
+    ==========
+    root: lilyflower object
+        the first version, it is not changed
+    limit: int, optional
+        number of versions to keep, the oldest are forgotten first
+    """
+
+    def __init__(self, root, limit=None):
+        """Start with root as the only version."""
+        self.root = root
+        self._limit = limit
+        self._versions = [root]
+        self._position = 0
+        # id -> object, for copies made since the last commit, which
+        # are not part of a version yet and can be changed in place
+        self._owned = {}
+
+    def edit(self, *path):
+        """
+        Return the object at path, to be changed in place.
+
+        Objects on the way there that belong to a version are copied
+        first, so versions don't see the change.
+        """
+        owned = self._owned
+        obj = self.root
+        if id(obj) not in owned:
+            obj = self.root = _copy(obj)
+            owned[id(obj)] = obj
+        for step in path:
+            storage = _storage(obj, step)
+            child = storage[step]
+            if id(child) not in owned:
+                child = _copy(child)
+                owned[id(child)] = child
+                storage[step] = child
+            obj = child
+        return obj
+
+    @property
+    def changed(self):
+        """See if there are edits since the last commit."""
+        return self.root is not self._versions[self._position]
+
+    def commit(self):
+        """Make the current tree a version, forgetting undone versions."""
+        if not self.changed:
+            return
+        del self._versions[self._position + 1:]
+        self._versions.append(self.root)
+        if self._limit is not None and len(self._versions) > self._limit:
+            del self._versions[:-self._limit]
+        self._position = len(self._versions) - 1
+        self._owned = {}
+
+    def snapshot(self):
+        """Commit, and return the current tree, which is then a version."""
+        self.commit()
+        return self.root
+
+    def can_undo(self):
+        """See if there is a version to go back to."""
+        return self.changed or self._position > 0
+
+    def can_redo(self):
+        """See if there is an undone version to go forward to."""
+        return not self.changed and \
+            self._position + 1 < len(self._versions)
+
+    def undo(self):
+        """Go back to the previous version, and return it."""
+        self.commit()
+        if not self._position:
+            raise IndexError("nothing to undo")
+        self._position -= 1
+        self.root = self._versions[self._position]
+        return self.root
+
+    def redo(self):
+        """Go forward to the version that was undone last, and return it."""
+        if not self.can_redo():
+            raise IndexError("nothing to redo")
+        self._position += 1
+        self.root = self._versions[self._position]
+        return self.root
+
+    def __len__(self):
+        """Return number of versions."""
+        return len(self._versions)
@@ -0,0 +1,468 @@
+r"""
+Standard MIDI file writer.
+
+Renders an object tree straight to a MIDI file, without going through
+lilypond. Meant for quick previews: durations are resolved the way
+lilypond resolves them (inherited from the previous tone), dynamics are
+mapped to velocities, and ``\relative`` blocks are resolved. Everything
+else that influences playback in lilypond (tempo changes, tuplets,
+repeats other than unfold, articulation) is ignored.
+
+Events are generated lazily and written in a single pass. Parallel
+music is merged on the fly, so memory use does not depend on the
+length of the score.
+
+Examples
+========
+.. testsetup::
+
+    from StringIO import StringIO
+    from lilyflower.midi import write_midi
+    from lilyflower.container import Container
+    from lilyflower.tones import Note, Rest
+
+.. doctest::
+
+    >>> output = StringIO()
+    >>> write_midi(Container([Note('c', "'", '4'), Rest(), Note('e')]), output)
+    >>> output.getvalue()[:4]
+    'MThd'
+    >>> len(output.getvalue())
+    49
+"""
+import heapq
+import struct
+from itertools import count
+from lilyflower.containers import Parallel, Relative, Repeat
+from lilyflower.dynamics import (
+    Dynamic,
+    Piano5,
+    Piano4,
+    Piano3,
+    Piano2,
+    Piano,
+    MezzoPiano,
+    MezzoForte,
+    Forte,
+    Forte2,
+    Forte3,
+    Forte4,
+    Forte5,
+    FortePiano,
+    Sforzato,
+    Sfortissimo,
+    Sforzando,
+    Spiano,
+    Spianissimo,
+    Rinforzando)
+from lilyflower.tones import Pitch, Note, Rest, Chord
+from lilyflower.errors import InvalidArgument
+
+RESOLUTION = 384
+DEFAULT_VELOCITY = 90
+
+VELOCITIES = {
+    Piano5: 8,
+    Piano4: 16,
+    Piano3: 24,
+    Piano2: 36,
+    Piano: 48,
+    MezzoPiano: 64,
+    MezzoForte: 80,
+    Forte: 96,
+    Forte2: 108,
+    Forte3: 116,
+    Forte4: 122,
+    Forte5: 127,
+    FortePiano: 96,
+    Sforzato: 110,
+    Sfortissimo: 120,
+    Sforzando: 110,
+    Spiano: 48,
+    Spianissimo: 36,
+    Rinforzando: 100}
+
+_STEPS = {'c': 0, 'd': 1, 'e': 2, 'f': 3, 'g': 4, 'a': 5, 'b': 6}
+_SEMITONES = (0, 2, 4, 5, 7, 9, 11)
+
+# event kinds, note-off sorts before note-on at the same tick
+_NOTE_OFF = 0
+_NOTE_ON = 1
+
+
+def _alteration(pitch):
+    """Return alteration in semitones for a pitch name like 'ases'."""
+    suffix = pitch[1:]
+    if suffix.startswith('s'):
+        # as, es and friends
+        alteration = -1
+        suffix = suffix[1:]
+    else:
+        alteration = 0
+    # quarter tones (eh, ih) can't be played, they round to the natural
+    alteration -= suffix.count('es')
+    alteration += suffix.count('is')
+    return alteration
+
+
+def _octave_offset(octave):
+    """Return number of octaves described by octave marks."""
+    return octave.count("'") - octave.count(",")
+
+
+def _duration_ticks(duration, resolution):
+    """Convert a lilypond duration string (e.g. '4..') to ticks."""
+    dots = len(duration) - len(duration.rstrip('.'))
+    length = resolution * 4 // int(duration.rstrip('.'))
+    ticks = length
+    for _ in range(dots):
+        length //= 2
+        ticks += length
+    return ticks
+
+
+class _State(object):
+
+    """Everything a voice inherits from its previous tones."""
+
+    def __init__(self, resolution, keys=None, lengths=None):
+        """Start out like lilypond does, with quarter notes."""
+        self.resolution = resolution
+        self.duration = "4"
+        self.ticks = resolution
+        self.velocity = DEFAULT_VELOCITY
+        # diatonic position of the last pitch in relative mode,
+        # None means absolute mode
+        self.relative = None
+        self.tied = ()
+        # lookup tables, shared between voices
+        self.keys = {} if keys is None else keys
+        self.lengths = {} if lengths is None else lengths
+
+    def copy(self):
+        """Return state for a voice that starts here."""
+        state = _State(self.resolution, self.keys, self.lengths)
+        state.duration = self.duration
+        state.ticks = self.ticks
+        state.velocity = self.velocity
+        state.relative = self.relative
+        return state
+
+    def set_duration(self, duration):
+        """Update inherited duration, return length in ticks."""
+        if duration != "" and duration != self.duration:
+            self.duration = duration
+            ticks = self.lengths.get(duration)
+            if ticks is None:
+                ticks = self.lengths[duration] = _duration_ticks(
+                    duration, self.resolution)
+            self.ticks = ticks
+        return self.ticks
+
+    def key(self, pitch):
+        """Return midi key number for a Pitch, Note or Chord member."""
+        # pylint: disable=protected-access
+        lookup = (pitch._pitch, pitch.octave, self.relative)
+        try:
+            key, self.relative = self.keys[lookup]
+        except KeyError:
+            key, self.relative = self.keys[lookup] = _resolve_key(*lookup)
+        return key
+
+
+def _resolve_key(name, octave, relative):
+    """Return (midi key, new relative position) for a pitch."""
+    octave = octave.lstrip('=')
+    step = _STEPS[name[0]]
+    if relative is None:
+        position = step + 7 * (3 + _octave_offset(octave))
+    else:
+        # nearest position with this step, then apply octave marks
+        position = relative - (relative - step) % 7
+        if relative - position > 3:
+            position += 7
+        position += 7 * _octave_offset(octave)
+        relative = position
+    octave_number, step = divmod(position, 7)
+    key = 12 * (octave_number + 1) + _SEMITONES[step] + _alteration(name)
+    return key, relative
+
+
+def _dynamics(tone, state):
+    """Pick up dynamic marks attached to tone."""
+    # pylint: disable=protected-access
+    for command in tone._note_commands:
+        if isinstance(command, Dynamic):
+            velocity = VELOCITIES.get(type(command))
+            if velocity is not None:
+                state.velocity = velocity
+
+
+def _tone_events(tone, tick, channel, state):
+    """Return (events, length) for a single tone."""
+    # pylint: disable=protected-access
+    length = state.set_duration(tone._duration)
+    if isinstance(tone, Note):
+        if not state.tied and not tone._tie:
+            # by far the most common case
+            key = state.key(tone)
+            if tone._note_commands:
+                _dynamics(tone, state)
+            return [
+                (tick, _NOTE_ON, channel, key, state.velocity),
+                (tick + length, _NOTE_OFF, channel, key, 0)], length
+        keys = (state.key(tone),)
+    elif isinstance(tone, Chord):
+        reference = state.relative
+        keys = [state.key(pitch) for pitch in tone._pitches]
+        if reference is not None:
+            # the first pitch of a chord is the next reference
+            state.relative = reference
+            state.key(tone._pitches[0])
+    else:
+        keys = ()
+    if keys and tone._note_commands:
+        _dynamics(tone, state)
+    tied = state.tied
+    if tied:
+        events = [
+            (tick, _NOTE_OFF, channel, key, 0)
+            for key in tied if key not in keys]
+        events.extend(
+            (tick, _NOTE_ON, channel, key, state.velocity)
+            for key in keys if key not in tied)
+    else:
+        events = [(tick, _NOTE_ON, channel, key, state.velocity)
+                  for key in keys]
+    if keys and tone._tie:
+        state.tied = keys
+    else:
+        state.tied = ()
+        events.extend(
+            (tick + length, _NOTE_OFF, channel, key, 0) for key in keys)
+    return events, length
+
+
+def _repeat_count(repeat):
+    """Return number of times a Repeat container is played."""
+    # pylint: disable=protected-access
+    if len(repeat._arguments) == 2 and \
+            format(repeat._arguments[0]).strip('"') == "unfold":
+        return int(format(repeat._arguments[1]))
+    return 1
+
+
+class _RestoreRelative(object):
+
+    """Marker that ends a relative block."""
+
+    def __init__(self, position):
+        """Store relative position from before the block."""
+        self.position = position
+
+
+class _Voice(object):
+
+    """Event generator for sequential music."""
+
+    def __init__(self, music, tick, channels, state):
+        """Store walking position."""
+        self.tick = tick
+        self._music = music
+        self._channels = channels
+        self._channel = next(channels)
+        self._state = state
+
+    def __iter__(self):
+        """Generate (tick, kind, channel, key, velocity) tuples."""
+        # pylint: disable=protected-access
+        state = self._state
+        channel = self._channel
+        stack = [iter((self._music,))]
+        while stack:
+            try:
+                item = next(stack[-1])
+            except StopIteration:
+                stack.pop()
+                continue
+            if isinstance(item, (Note, Rest, Chord)):
+                events, length = _tone_events(item, self.tick, channel, state)
+                for event in events:
+                    yield event
+                self.tick += length
+            elif isinstance(item, Pitch):
+                continue
+            elif isinstance(item, Parallel):
+                for event in self._parallel(item):
+                    yield event
+            elif isinstance(item, _RestoreRelative):
+                state.relative = item.position
+            elif isinstance(item, Relative):
+                stack.append(iter((_RestoreRelative(state.relative),)))
+                stack.append(iter(item))
+                # without a start pitch, the first note is absolute
+                state.relative = 3 + 7 * 3
+                if len(item._arguments) > 0:
+                    state.key(item._arguments[0])
+            elif isinstance(item, Repeat):
+                stack.append(iter(list(item) * _repeat_count(item)))
+            elif hasattr(item, '_container') or (
+                    getattr(item, '_allowed_content', None) is not None and
+                    hasattr(item, '_content')):
+                stack.append(iter(item))
+        for key in state.tied:
+            yield (self.tick, _NOTE_OFF, channel, key, 0)
+        state.tied = ()
+
+    def _parallel(self, music):
+        """Merge simultaneous voices, advance to the end of the longest."""
+        voices = []
+        for item in music:
+            voices.append(_Voice(
+                item, self.tick, self._channels, self._state.copy()))
+        for event in heapq.merge(*voices):
+            yield event
+        self.tick = max([self.tick] + [voice.tick for voice in voices])
+
+
+def _channel_numbers():
+    """Hand out midi channels, skipping the percussion channel."""
+    for number in count():
+        channel = number % 15
+        yield channel if channel < 9 else channel + 1
+
+
+def iter_events(music, resolution=RESOLUTION):
+    """
+    Generate note events for music in chronological order.
+
+    Every event is a tuple ``(tick, kind, channel, key, velocity)``, kind
+    is 1 for note-on and 0 for note-off.
+    """
+    return iter(_Voice(music, 0, _channel_numbers(), _State(resolution)))
+
+
+def ticks(music, resolution=RESOLUTION, times=1):
+    """
+    Return how long music plays, in ticks, when played times in a row.
+
+    Durations are resolved like for `iter_events`. Only the first two
+    times are walked: from the second one on, every time starts with
+    the same inherited duration.
+    """
+    if not times:
+        return 0
+    state = _State(resolution)
+    channels = _channel_numbers()
+    lengths = []
+    for _ in range(min(times, 2)):
+        voice = _Voice(music, 0, channels, state)
+        for _ in voice:
+            pass
+        lengths.append(voice.tick)
+    return lengths[0] + lengths[-1] * (times - 1)
+
+
+def _varint(value):
+    """Encode a variable length quantity."""
+    result = chr(value & 0x7f)
+    value >>= 7
+    while value:
+        result = chr(0x80 | (value & 0x7f)) + result
+        value >>= 7
+    return result
+
+
+# pylint: disable=too-many-locals
+def write_midi(music, target, tempo=60, resolution=RESOLUTION):
+    """
+    Write music as a single track standard MIDI file.
+
+    Usage::
+
+        write_midi(music, target, tempo=60, resolution=384)
+
+    Parameters
+    ==========
+    music: lilyflower object
+        Container, Node, or a single tone
+    target: str or file object
+        path of the file to write, or a file opened in binary mode
+    tempo: int, optional
+        quarter notes per minute
+    resolution: int, optional
+        ticks per quarter note
+
+    Raises
+    ======
+    InvalidArgument:
+        if tempo or resolution are out of range
+
+    Notes
+    =====
+    When target is seekable, the track is streamed straight into it,
+    otherwise the track is buffered before writing.
+    """
+    if not 0 < resolution < 0x8000:
+        raise InvalidArgument("%r is not a valid resolution" % resolution)
+    if tempo <= 0:
+        raise InvalidArgument("%r is not a valid tempo" % tempo)
+    if isinstance(target, basestring):
+        with open(target, 'wb') as midi_file:
+            return write_midi(music, midi_file, tempo, resolution)
+
+    target.write(struct.pack(">4sLHHH", "MThd", 6, 0, 1, resolution))
+    try:
+        start = target.tell()
+    except (AttributeError, IOError):
+        start = None
+    if start is None:
+        buffered = []
+        write = buffered.append
+    else:
+        target.write(struct.pack(">4sL", "MTrk", 0))
+        write = target.write
+
+    microseconds = 60000000 // tempo
+    chunk = [
+        "\x00\xff\x51\x03",
+        struct.pack(">L", microseconds)[1:]]
+    size = 0
+    messages = {}
+    previous = 0
+    status = None
+    for tick, _, channel, key, velocity in iter_events(music, resolution):
+        # note-off is a note-on with velocity 0, so running status
+        # keeps working as long as the channel doesn't change
+        if status == channel:
+            lookup = (tick - previous, None, key, velocity)
+        else:
+            status = channel
+            lookup = (tick - previous, channel, key, velocity)
+        previous = tick
+        try:
+            chunk.append(messages[lookup])
+        except KeyError:
+            message = messages[lookup] = "".join((
+                _varint(lookup[0]),
+                "" if lookup[1] is None else chr(0x90 | channel),
+                chr(key),
+                chr(velocity)))
+            chunk.append(message)
+        if len(chunk) > 4096:
+            data = "".join(chunk)
+            size += len(data)
+            write(data)
+            chunk = []
+    chunk.append("\x00\xff\x2f\x00")
+    data = "".join(chunk)
+    size += len(data)
+    write(data)
+    if start is None:
+        target.write(struct.pack(">4sL", "MTrk", size))
+        target.write("".join(buffered))
+    else:
+        end = target.tell()
+        target.seek(start + 4)
+        target.write(struct.pack(">L", size))
+        target.seek(end)
@@ -2,13 +2,17 @@
 from collections import OrderedDict
 import re
 from lilyflower.errors import InvalidArgument, InvalidContent
-from lilyflower.tools import compare_iter
+from lilyflower.events import changing, notify
+from lilyflower.pickling import CompactPickle
+from lilyflower.tools import (
+    compare_iter, format_pieces, get_indent_level, child_format_spec)
+from lilyflower.view import View
 
 
 # pylint: disable=protected-access
 # We only access protected content of our own children,
 # content needs to stay protected for end user.
-class Node(object):
+class Node(CompactPickle):
 
     r"""
     Basic building block for the object tree.
@@ -61,11 +65,16 @@ class Node(object):
         { }
     """
 
+    _state = ('_content', '_stored_arguments', '_position')
+    # see `lilyflower.events`
+    _transient = ('_observers',)
+    _observers = None
     _tag = ""
     _types = ()
     _arguments = ()
     _stored_arguments = None
     _allowed_content = ()
+    _content = None
     _inline = False
     _delimiter_open = "{"
     _delimiter_close = "}"
@@ -112,7 +121,7 @@ class Node(object):
             arg_order.append('content')
             arg_value['content'] = None
 
-        for key in kwargs:
+        for key in list(kwargs):
             if key in arg_order:
                 arg_value[key] = kwargs[key]
                 # now delete key from arg_order and kwargs
@@ -141,9 +150,12 @@ class Node(object):
 
         # validate arguments
         for arg in self._arguments:
-            if arg_value[arg.name] is None and not arg.optional:
-                raise InvalidArgument(
-                    "%s argument is not optional" % arg.name)
+            if arg_value[arg.name] is None:
+                if not arg.optional:
+                    raise InvalidArgument(
+                        "%s argument is not optional" % arg.name)
+                # optional arguments that are not given are left out
+                continue
             self._validate_argument(arg.name, arg_value[arg.name])
             # now we're sure this is a valid argument, store it
             self._stored_arguments[arg.name] = arg_value[arg.name]
@@ -164,7 +176,8 @@ class Node(object):
 
     def _validate_content(self, item):
         """Validate content item."""
-        if not isinstance(item, Node):
+        # tones and old style containers declare their types as well
+        if not isinstance(item, Node) and not hasattr(item, '_types'):
             raise InvalidContent("%r not a Node object." % item)
         if not compare_iter(self._allowed_content, item._types):
             raise InvalidContent("Type mismatch: %r, %r" % (
@@ -192,7 +205,7 @@ class Node(object):
             # Unimplemented type, issue warning, accept any value
             return True
         elif isinstance(arg.type_, tuple):
-            if not isinstance(value, Node):
+            if not isinstance(value, Node) and not hasattr(value, '_types'):
                 raise InvalidArgument("Expected Node for %s, not %r" % (
                     name,
                     value))
@@ -212,14 +225,23 @@ class Node(object):
         if self._allowed_content is not None:
             self._validate_content(value)
             self._content.append(value)
+            if self._observers is not None:
+                notify(self, 'append', len(self._content) - 1, [], [value])
         else:
             raise ValueError("%s has no content" % self._tag)
 
     def extend(self, extension):
         """Add iterable to end of container (another Node for example)."""
         if self._allowed_content is not None:
-            for item in extension:
-                self.append(item)
+            start = len(self._content)
+            try:
+                for item in extension:
+                    self._validate_content(item)
+                    self._content.append(item)
+            finally:
+                if self._observers is not None and \
+                        len(self._content) > start:
+                    notify(self, 'extend', start, [], self._content[start:])
         else:
             raise ValueError("%s has no content" % self._tag)
 
@@ -227,7 +249,12 @@ class Node(object):
         """Insert value into content at index."""
         if self._allowed_content is not None:
             self._validate_content(value)
-            self._content.insert(index, value)
+            if self._observers is None:
+                self._content.insert(index, value)
+            else:
+                with changing(
+                        self, 'insert', self._content, slice(index, index)):
+                    self._content.insert(index, value)
         else:
             raise ValueError("%s has no content" % self._tag)
 
@@ -241,30 +268,47 @@ class Node(object):
     def pop(self):
         """Pop value from content."""
         if self._allowed_content is not None:
-            return self._content.pop()
+            value = self._content.pop()
+            if self._observers is not None:
+                notify(self, 'pop', len(self._content), [value], [])
+            return value
         else:
             raise ValueError("%s has no content" % self._tag)
 
     def remove(self, value):
         """Remove first occurance of value from content."""
         if self._allowed_content is not None:
-            self._content.remove(value)
+            index = self._content.index(value)
+            old = self._content[index]
+            del self._content[index]
+            if self._observers is not None:
+                notify(self, 'remove', index, [old], [])
         else:
             raise ValueError("%s has no content" % self._tag)
 
     def reverse(self, depth=-1):
         """Reverse order of content and that of children to depth."""
         if self._allowed_content is not None and depth != 0:
-            self._content.reverse()
+            if self._observers is None:
+                self._content.reverse()
+            else:
+                with changing(self, 'reverse', self._content):
+                    self._content.reverse()
             for item in self._content:
-                item.reverse(depth - 1)
+                if isinstance(item, Node):
+                    item.reverse(depth - 1)
 
     def sort(self, cmp=None, key=None, reverse=False, depth=-1):
         """Sort content to depth."""
         if self._allowed_content is not None and depth != 0:
-            self._content.sort(cmp, key, reverse)
+            if self._observers is None:
+                self._content.sort(cmp, key, reverse)
+            else:
+                with changing(self, 'sort', self._content):
+                    self._content.sort(cmp, key, reverse)
             for item in self._content:
-                item.sort(cmp, key, reverse, depth - 1)
+                if isinstance(item, Node):
+                    item.sort(cmp, key, reverse, depth - 1)
 
     def index(self, value):
         """Find index of value in content."""
@@ -279,11 +323,15 @@ class Node(object):
 
         if `name` is `str`: return from `self._stored_arguments`
         if `name` is `int`: return from `self._content`
+        if `name` is `slice`: return a `lilyflower.view.View` of
+        `self._content`
         """
         if isinstance(name, basestring):
             return self._stored_arguments[name]
-        elif isinstance(name, int) or isinstance(name, slice):
+        elif isinstance(name, int):
             return self._content[name]
+        elif isinstance(name, slice):
+            return View(self._content, name.start, name.stop, name.step)
         else:
             raise NameError("%r is not a valid key" % name)
 
@@ -296,10 +344,17 @@ class Node(object):
         """
         if isinstance(name, basestring):
             self._validate_argument(name, value)
+            old = self._stored_arguments.get(name)
             self._stored_arguments[name] = value
+            if self._observers is not None:
+                notify(self, 'setitem', name, old, value)
         elif isinstance(name, int) or isinstance(name, slice):
             self._validate_content(value)
-            self._content[name] = value
+            if self._observers is None:
+                self._content[name] = value
+            else:
+                with changing(self, 'setitem', self._content, name):
+                    self._content[name] = value
         else:
             raise NameError("%r is not a valid key" % name)
 
@@ -311,9 +366,15 @@ class Node(object):
         if `name` is `int` or `slice`: del item in `self._content`
         """
         if isinstance(name, basestring):
-            del self._stored_arguments[name]
+            old = self._stored_arguments.pop(name)
+            if self._observers is not None:
+                notify(self, 'delitem', name, old, None)
         elif isinstance(name, int) or isinstance(name, slice):
-            del self._content[name]
+            if self._observers is None:
+                del self._content[name]
+            else:
+                with changing(self, 'delitem', self._content, name):
+                    del self._content[name]
         else:
             raise NameError("%r is not a valid key" % name)
 
@@ -334,7 +395,7 @@ class Node(object):
     def __reversed__(self):
         """Return iterable for backwards iteration over content."""
         if self._allowed_content is not None:
-            return iter(self._content[::-1])
+            return reversed(self._content)
         else:
             raise StopIteration
 
@@ -343,56 +404,83 @@ class Node(object):
         if depth != 0:
             for child in self:
                 yield child
+                if not isinstance(child, Node):
+                    continue
                 for child_content in child.iter_depth(depth - 1):
                     yield child_content
         else:
             raise StopIteration
 
+    def _state_values(self):
+        """Return values to pickle, see `lilyflower.pickling`."""
+        values = CompactPickle._state_values(self)
+        if values[1] is not None:
+            # argument items pickle smaller than an OrderedDict
+            values = (values[0], tuple(values[1].items())) + values[2:]
+        return values
+
+    def _restore_values(self, values):
+        """Restore pickled values."""
+        if values[1] is not None:
+            values = (values[0], OrderedDict(values[1])) + tuple(values[2:])
+        CompactPickle._restore_values(self, values)
+
     def __format__(self, format_spec):
         """Return lilypond code."""
-        indent_level = 0
-        if format_spec != "":
-            indent_level = int(format_spec)
-        result = "%s%s" % (self._position, self._tag)
+        return format_pieces(self._iter_format(get_indent_level(format_spec)))
+
+    def _iter_format(self, indent_level):
+        """
+        Generate lilypond code in pieces.
+
+        Pieces are strings, or (child, format_spec) tuples for children
+        that still need formatting. `format_pieces` joins them, a
+        streaming writer can expand the children instead.
+
+        An indent_level of None gives compact code, see
+        `lilyflower.tools.get_indent_level`.
+        """
+        yield "%s%s" % (self._position, self._tag)
         if len(self._stored_arguments) > 0:
-            result += " %s%s" % (
-                " ".join(
-                    format(self._stored_arguments[key])
-                    for key in self._stored_arguments),
-                " " if self._allowed_content is not None else "")
+            for key in self._stored_arguments:
+                yield " "
+                yield (self._stored_arguments[key], "")
+            if self._allowed_content is not None:
+                yield " "
         if len(self._stored_arguments) == 0 and \
                 self._allowed_content is not None and \
                 self._tag is not "":
-            result += " "
+            yield " "
 
         # now handle content!
+        child_spec = child_format_spec(indent_level)
         if self._allowed_content is not None:
-            result += "%s" % self._delimiter_open
+            yield self._delimiter_open
             if len(self._content) == 0:
                 # directly close, no newline!
-                result += " %s" % self._delimiter_close
+                yield " %s" % self._delimiter_close
             elif len(self._content) == 1:
                 # keep it on the same rule
-                result += " %s %s" % (
-                    format(self._content[0], str(indent_level + 1)),
-                    self._delimiter_close)
+                yield " "
+                yield (self._content[0], child_spec)
+                yield " %s" % self._delimiter_close
             else:
                 # more than one item, start newline and indent stuff
                 inline_previous = False
+                if indent_level is None:
+                    newline = closing = " "
+                else:
+                    newline = "\n%s" % ("  " * (indent_level + 1))
+                    closing = "\n%s" % ("  " * indent_level)
                 for item in self._content:
-                    separator = "\n%s" % ("  " * (indent_level + 1))
                     inline_current = item._inline
                     # the only time when we need a space as a
                     # separator is when both the current and
                     # previous item are inline
                     if inline_previous and inline_current:
-                        separator = " "
-                    result += "%s%s" % (separator, format(
-                        item,
-                        str(indent_level + 1)))
+                        yield " "
+                    else:
+                        yield newline
+                    yield (item, child_spec)
                     inline_previous = inline_current
-                result += "\n%s%s" % (
-                    "  " * indent_level,
-                    self._delimiter_close)
-
-        return result
+                yield closing + self._delimiter_close
@@ -8,6 +8,7 @@ class NoteCommand(Command):
 
     """Commands that attach to a tone."""
 
+    _state = Command._state + ('_position',)
     _inline = True
 
     def __init__(self, *arguments, **kwargs):
@@ -0,0 +1,781 @@
+r"""
+Lilypond source parser.
+
+Turns lilypond code back into an object tree. Commands are recognized
+by looking up their lilypond name in :data:`lilyflower.syntax.SPEC`,
+their arguments and content are read according to the spec, and the
+matching :mod:`lilyflower.dom` class is instantiated. Tones become
+:mod:`lilyflower.tones` objects, scheme values become
+:mod:`lilyflower.schemedata` objects.
+
+Parsing happens in three stages. The input, a string or a file object
+read in chunks, is split into tokens by a single compiled regular
+expression. :func:`iterparse` turns the tokens into a stream of events,
+in the spirit of SAX, without building anything but the tones. Finally
+:class:`TreeBuilder` consumes the events and builds the tree. Code that
+only needs statistics over big inputs can consume the events itself,
+memory use then stays bounded by the chunk size and nesting depth.
+
+The parser never backtracks, so parsing time is linear in the size
+of the input.
+
+Only what lilyflower can represent is supported: anything else (markup
+text, variables, commands missing from the spec) raises a `ParseError`.
+
+Examples
+========
+.. testsetup::
+
+    from lilyflower.parser import parse
+
+.. doctest::
+
+    >>> tree = parse(r'''
+    ... \version "2.18.2"
+    ... \markup { \bold { \abs-fontsize #12 { \eyeglasses } } }
+    ... { c'4( d' e'2)\p }
+    ... ''')
+    >>> for item in tree:
+    ...     print format(item)
+    \markup { \bold { \abs-fontsize #12 { \eyeglasses } } }
+    {
+      c'4( d' e'2\p)
+    }
+"""
+from collections import namedtuple
+import re
+from lilyflower.syntax import SPEC
+from lilyflower import dom, dynamics
+from lilyflower.node import Node
+from lilyflower.container import Container
+from lilyflower.containers import Parallel, Measure
+from lilyflower.repetition import Repetition
+from lilyflower.tones import Note, Rest, Chord, Pitch
+from lilyflower.spanners import Slur, PhrasingSlur, Beam
+from lilyflower.dynamics import Dynamic, Crescendo, Decrescendo
+from lilyflower.schemedata import (
+    SchemeData,
+    SignedInt,
+    UnsignedInt,
+    SignedFloat,
+    UnsignedFloat)
+from lilyflower.schemereader import read_scheme, _Incomplete
+from lilyflower.tools import (
+    property_to_class, compare_iter, collection_paused)
+from lilyflower.errors import ParseError
+
+Token = namedtuple('Token', 'kind value line parts')
+Event = namedtuple('Event', 'kind value line')
+Start = namedtuple('Start', 'cls position')
+
+START_CONTAINER = 'start_container'
+END_CONTAINER = 'end_container'
+COMMAND = 'command'
+ARGUMENT = 'argument'
+TONE = 'tone'
+PITCH = 'pitch'
+REPEAT = 'repeat'
+SCHEME = 'scheme'
+STRING = 'string'
+COMMENT = 'comment'
+BAR_CHECK = 'bar_check'
+VERSION = 'version'
+
+CHUNK_SIZE = 64 * 1024
+# characters past the end of a token needed to be sure it's complete
+_LOOKAHEAD = 2
+
+
+def _duration(prefix):
+    """Regex for duration, tremolo and tie, with named groups."""
+    return r"(?P<{0}_duration>\d*\.*)(?::(?P<{0}_division>\d+))?" \
+        r"(?P<{0}_tie>~?)".format(prefix)
+
+TOKENS = (
+    ('whitespace', r"\s+"),
+    ('comment_block', r"%\{.*?%\}"),
+    ('comment', r"%[^\n]*"),
+    ('string', r'"(?:[^"\\]|\\.)*"'),
+    ('scheme', r"#"),
+    ('parallel_open', r"<<"),
+    ('parallel_close', r">>"),
+    ('chord_open', r"<"),
+    ('chord_close', r">" + _duration('chord')),
+    ('brace_open', r"\{"),
+    ('brace_close', r"\}"),
+    ('command', r"[\-_^]?\\(?:[a-zA-Z]+(?:[\-_][a-zA-Z0-9]+)*|[()<>!])"),
+    ('note', r"(?P<note_pitch>[a-g](?:[!?]|s?(?:es|is|eh|ih)*))"
+             r"(?![a-zA-Z])(?P<note_octave>=?[',]*)" + _duration('note')),
+    ('rest', r"r(?![a-zA-Z])" + _duration('rest')),
+    ('spanner', r"[()\[\]]"),
+    ('bar_check', r"\|"),
+    ('word', r"[^\s{}<>#\\%\"|()\[\]]+"))
+
+MASTER = re.compile(
+    "|".join("(?P<%s>%s)" % token for token in TOKENS),
+    re.DOTALL)
+
+_PARTS = {
+    'note': (
+        'note_pitch',
+        'note_octave',
+        'note_duration',
+        'note_division',
+        'note_tie'),
+    'rest': ('rest_duration', 'rest_division', 'rest_tie'),
+    'chord_close': ('chord_duration', 'chord_division', 'chord_tie')}
+
+_NUMERIC = (SignedInt, UnsignedInt, SignedFloat, UnsignedFloat)
+
+# lilypond name -> dom classes, in a fixed order
+_CLASSES = {}
+for _rule in sorted(SPEC):
+    _CLASSES.setdefault(SPEC[_rule].lily_name, []).append(
+        getattr(dom, property_to_class(_rule)))
+
+# note commands that can follow a tone
+_DYNAMICS = dict(
+    (cls._command, cls) for cls in vars(dynamics).values()
+    if isinstance(cls, type) and issubclass(cls, Dynamic) and
+    cls is not Dynamic and not issubclass(cls, Crescendo))
+_SPANNERS = {
+    '(': (Slur, True),
+    ')': (Slur, False),
+    '[': (Beam, True),
+    ']': (Beam, False),
+    '\\(': (PhrasingSlur, True),
+    '\\)': (PhrasingSlur, False)}
+_HAIRPINS = {'\\<': Crescendo, '\\>': Decrescendo}
+
+
+class _Buffer(object):
+
+    """Input text, refilled from a file object as it is consumed."""
+
+    def __init__(self, source, chunk_size):
+        """Wrap a string or a file object."""
+        if isinstance(source, basestring):
+            self.text = source
+            self._read = None
+        else:
+            self.text = ""
+            self._read = source.read
+        self.pos = 0
+        self._chunk_size = chunk_size
+
+    @property
+    def eof(self):
+        """Whether the whole input is in the buffer."""
+        return self._read is None
+
+    def fill(self):
+        """Drop consumed text and read a chunk, False at end of input."""
+        if self._read is None:
+            return False
+        chunk = self._read(self._chunk_size)
+        if not chunk:
+            self._read = None
+            return False
+        self.text = self.text[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+
+def tokenize(source, chunk_size=CHUNK_SIZE):
+    """
+    Split lilypond code into tokens.
+
+    Source is either a string or a file object, which is read in chunks
+    of `chunk_size` characters. Only the current chunk and the token
+    being read are kept in memory.
+
+    Whitespace is skipped, scheme expressions are read as a whole
+    and come out as a single token holding a SchemeData object.
+    """
+    buf = _Buffer(source, chunk_size)
+    text = buf.text
+    pos = 0
+    limit = len(text)
+    refill = not buf.eof
+    line = 1
+    match = MASTER.match
+    while True:
+        if refill:
+            buf.pos = pos
+            buf.fill()
+            text = buf.text
+            pos = buf.pos
+            # a token ending near the end of the buffer might continue in
+            # the next chunk (think of '\with-' before 'color')
+            limit = len(text) if buf.eof else len(text) - _LOOKAHEAD
+            refill = False
+        found = match(text, pos)
+        if found is None or found.end() > limit or (
+                found.lastgroup == 'comment' and
+                text.startswith('%{', pos)):
+            if not buf.eof:
+                refill = True
+                continue
+            if found is None:
+                if pos >= len(text):
+                    return
+                raise ParseError(
+                    "line %d: unexpected %r" % (line, text[pos]))
+            elif found.lastgroup == 'comment':
+                raise ParseError(
+                    "line %d: unterminated comment block" % line)
+        kind = found.lastgroup
+        end = found.end()
+        if kind == 'whitespace':
+            line += text.count("\n", pos, end)
+            pos = end
+            continue
+        elif kind == 'scheme':
+            try:
+                value, end = read_scheme(text, end, buf.eof)
+            except _Incomplete as error:
+                if not buf.eof:
+                    refill = True
+                    continue
+                raise ParseError("line %d: %s" % (line, error))
+            except ValueError as error:
+                raise ParseError("line %d: %s" % (line, error))
+            yield Token(kind, value, line, None)
+            line += text.count("\n", pos, end)
+            pos = end
+            continue
+        pos = end
+        value = found.group()
+        parts = found.group(*_PARTS[kind]) if kind in _PARTS else None
+        yield Token(kind, value, line, parts)
+        if kind == 'comment_block' or kind == 'string':
+            line += value.count("\n")
+
+
+def _coerce(value, type_, line):
+    """Make parsed scheme data fit the type of an argument."""
+    if isinstance(value, type_):
+        return value
+    # pylint: disable=protected-access
+    if type_ in _NUMERIC and type(value) in _NUMERIC:
+        try:
+            return type_(value._data)
+        except ValueError as error:
+            raise ParseError("line %d: %s" % (line, error))
+    raise ParseError("line %d: expected %s, got %s" % (
+        line, type_.__name__, type(value).__name__))
+
+
+class _Frame(object):
+
+    """A block or command that is still being read."""
+
+    __slots__ = ('cls', 'arguments', 'expected', 'close', 'mode')
+
+    def __init__(self, cls, arguments, expected, close, mode):
+        """Store state."""
+        self.cls = cls
+        # reversed, so the next argument can be popped off the end
+        self.arguments = list(arguments[::-1])
+        self.expected = expected
+        self.close = close
+        self.mode = mode
+
+
+class _EventReader(object):
+
+    """
+    Reads tokens and turns them into events.
+
+    Nesting is kept on an explicit stack, so deeply nested input does
+    not hit the recursion limit, and nothing but the open blocks and
+    spanners is remembered.
+    """
+
+    def __init__(self, tokens):
+        """Start reading tokens."""
+        self._tokens = tokens
+        self._token = None
+        self._line = 1
+        self._open_spanners = {}
+        self._hairpin = None
+        self._advance()
+
+    def _advance(self):
+        """Return current token and move on to the next."""
+        token = self._token
+        if token is not None:
+            self._line = token.line
+        self._token = next(self._tokens, None)
+        return token
+
+    def _error(self, message, token=None):
+        """Return ParseError with position information."""
+        if token is None:
+            token = self._token
+        if token is None:
+            return ParseError("end of input: %s" % message)
+        return ParseError("line %d: %s" % (token.line, message))
+
+    def events(self):
+        """Generate events for a complete file."""
+        token = self._token
+        if token is not None and token.kind == 'comment' and \
+                token.value.startswith("% Created with lilyflower at"):
+            self._advance()
+        stack = [_Frame(None, (), None, None, 'content')]
+        while True:
+            frame = stack[-1]
+            token = self._token
+            mode = frame.mode
+            if mode == 'arguments':
+                if frame.arguments:
+                    arg = frame.arguments.pop()
+                    if arg.type_ is Pitch:
+                        # optional pitches are only there if a bare
+                        # note follows, like in \relative c' { }
+                        pitch = self._pitch(arg)
+                        if pitch is not None:
+                            yield Event(ARGUMENT, arg.name, pitch.line)
+                            yield pitch
+                        continue
+                    yield Event(ARGUMENT, arg.name, self._line)
+                    if arg.type_ is None or isinstance(arg.type_, tuple):
+                        # None is an unimplemented type, take anything
+                        yield self._item(arg.type_, stack)
+                    else:
+                        yield self._value(arg)
+                elif frame.cls._allowed_content is None:
+                    stack.pop()
+                else:
+                    frame.mode = 'open'
+            elif mode == 'open':
+                if token is not None and \
+                        token.value == frame.cls._delimiter_open:
+                    self._advance()
+                    frame.mode = 'content'
+                    frame.close = 'brace_close'
+                elif token is not None and token.kind not in (
+                        'brace_close', 'parallel_close', 'bar_check'):
+                    # a single item does not need braces
+                    frame.mode = 'end'
+                    yield self._item(frame.expected, stack)
+                else:
+                    frame.mode = 'end'
+            elif mode == 'single':
+                frame.mode = 'end'
+                yield self._item(frame.expected, stack)
+            elif mode == 'end':
+                stack.pop()
+                yield Event(END_CONTAINER, frame.cls, self._line)
+            elif token is None:
+                if frame.close is not None:
+                    raise self._error("expected %s" % frame.close)
+                break
+            elif token.kind == frame.close:
+                self._advance()
+                stack.pop()
+                yield Event(END_CONTAINER, frame.cls, token.line)
+            elif token.kind == 'bar_check':
+                self._advance()
+                yield Event(BAR_CHECK, None, token.line)
+            elif token.value == '\\version' and frame.cls is None:
+                self._advance()
+                version = self._advance()
+                if version is None or version.kind not in ('string', 'word'):
+                    raise self._error("expected version string", version)
+                yield Event(VERSION, version.value.strip('"'), token.line)
+            else:
+                yield self._item(frame.expected, stack)
+        self._check_closed()
+
+    def _check_closed(self):
+        """Make sure all spanners have been closed."""
+        for spanner_type in self._open_spanners:
+            if self._open_spanners[spanner_type]:
+                raise self._error("unclosed %s" % spanner_type.__name__)
+        if self._hairpin is not None:
+            raise self._error("unclosed %s" % type(self._hairpin).__name__)
+
+    def _item(self, expected, stack):
+        """
+        Read the start of a single item, return its first event.
+
+        Blocks and commands are pushed onto the stack, their remaining
+        events are generated from there.
+        """
+        token = self._token
+        if token is None:
+            raise self._error("expected music or markup")
+        kind = token.kind
+        if kind == 'note' or kind == 'rest' or kind == 'chord_open':
+            return Event(TONE, self._tone(), token.line)
+        elif kind == 'command':
+            return self._command(expected, stack)
+        elif kind == 'brace_open':
+            self._advance()
+            stack.append(_Frame(Container, (), None, 'brace_close', 'content'))
+            return Event(START_CONTAINER, Start(Container, ""), token.line)
+        elif kind == 'parallel_open':
+            self._advance()
+            stack.append(
+                _Frame(Parallel, (), None, 'parallel_close', 'content'))
+            return Event(START_CONTAINER, Start(Parallel, ""), token.line)
+        elif kind == 'comment':
+            self._advance()
+            text = token.value[1:].strip()
+            return Event(COMMENT, [text] if text else [], token.line)
+        elif kind == 'comment_block':
+            self._advance()
+            return Event(COMMENT, [
+                line.strip() for line in token.value[2:-2].splitlines()
+                if line.strip() != ""], token.line)
+        elif kind == 'scheme':
+            self._advance()
+            return Event(SCHEME, token.value, token.line)
+        raise self._error("unexpected %r" % token.value)
+
+    def _build(self, cls, *args, **kwargs):
+        """Instantiate cls, turn validation errors into ParseError."""
+        try:
+            return cls(*args, **kwargs)
+        except ValueError as error:
+            raise self._error(str(error))
+
+    def _tone(self):
+        """Read a note, rest or chord and everything attached to it."""
+        token = self._advance()
+        if token.kind == 'chord_open':
+            pitches = []
+            while self._token is not None and self._token.kind == 'note':
+                note = self._advance()
+                if note.parts[2] or note.parts[3] or note.parts[4]:
+                    raise self._error("duration inside chord", note)
+                pitches.append(self._build(Pitch, *note.parts[:2]))
+            if self._token is None or self._token.kind != 'chord_close':
+                raise self._error("expected end of chord")
+            duration, division, tie = self._advance().parts
+        elif token.kind == 'note':
+            pitch, octave, duration, division, tie = token.parts
+        else:
+            duration, division, tie = token.parts
+        note_commands, spanners = self._post_events()
+        if token.kind == 'rest':
+            if division or tie or spanners:
+                raise self._error("rests can't be tied or slurred", token)
+            return self._build(Rest, duration, note_commands)
+        division = int(division) if division else None
+        if token.kind == 'note':
+            return self._build(
+                Note, pitch, octave, duration, division, tie == "~",
+                note_commands, spanners)
+        return self._build(
+            Chord, pitches, duration, division, tie == "~",
+            note_commands, spanners)
+
+    def _post_events(self):
+        """Read dynamics and spanners attached to a tone."""
+        # pylint: disable=protected-access
+        note_commands = []
+        spanners = []
+        while self._token is not None:
+            value = self._token.value
+            if value in _SPANNERS:
+                spanner_type, opening = _SPANNERS[value]
+                stack = self._open_spanners.setdefault(spanner_type, [])
+                if opening:
+                    spanner = spanner_type()
+                    stack.append(spanner)
+                elif stack:
+                    spanner = stack.pop()
+                else:
+                    raise self._error("%r closes nothing" % value)
+                spanners.append(spanner)
+            elif value.lstrip('-_^') in _DYNAMICS:
+                position = value[0] if value[0] in '-_^' else ""
+                dynamic = _DYNAMICS[value.lstrip('-_^')](position=position)
+                if self._hairpin is not None:
+                    self._hairpin._close = dynamic
+                    dynamic = self._hairpin
+                    self._hairpin = None
+                note_commands.append(dynamic)
+            elif value in _HAIRPINS:
+                if self._hairpin is not None:
+                    note_commands.append(self._hairpin)
+                self._hairpin = _HAIRPINS[value]()
+                note_commands.append(self._hairpin)
+            elif value == '\\!':
+                if self._hairpin is None:
+                    raise self._error("\\! closes nothing")
+                note_commands.append(self._hairpin)
+                self._hairpin = None
+            else:
+                break
+            self._advance()
+        return note_commands, spanners
+
+    def _command(self, expected, stack):
+        """Read a command from the spec, push it if it takes anything."""
+        # pylint: disable=protected-access
+        token = self._advance()
+        name = token.value.lstrip('-_^')
+        position = token.value[:len(token.value) - len(name)]
+        if name == '\\repeat' and not position:
+            return self._repeat(token, stack)
+        if name not in _CLASSES:
+            raise self._error("unknown command %r" % name, token)
+        cls = _CLASSES[name][0]
+        if expected is not None:
+            for candidate in _CLASSES[name]:
+                if compare_iter(expected, candidate._types):
+                    cls = candidate
+                    break
+        if position and 'attachment' not in cls._types:
+            raise self._error("%s can't have a position" % name, token)
+        if cls._allowed_content is not None:
+            stack.append(_Frame(
+                cls, cls._arguments, cls._allowed_content, None,
+                'arguments'))
+            return Event(START_CONTAINER, Start(cls, position), token.line)
+        if cls._arguments:
+            stack.append(_Frame(cls, cls._arguments, None, None, 'arguments'))
+        return Event(COMMAND, Start(cls, position), token.line)
+
+    def _repeat(self, token, stack):
+        """Read the start of a repeat, only unfolded ones are supported."""
+        kind = self._advance()
+        if kind is None or kind.value != 'unfold':
+            raise self._error(
+                "only \\repeat unfold is supported", kind or token)
+        count = self._advance()
+        if count is None or not count.value.isdigit():
+            raise self._error("expected repeat count", count)
+        if self._token is not None and self._token.kind == 'brace_open':
+            self._advance()
+            stack.append(_Frame(
+                Repetition, (), None, 'brace_close', 'content'))
+        else:
+            stack.append(_Frame(Repetition, (), None, None, 'single'))
+        return Event(REPEAT, int(count.value), token.line)
+
+    def _pitch(self, arg):
+        """Read a pitch argument, None if it's optional and not there."""
+        token = self._token
+        if token is not None and token.kind == 'note' and \
+                not any(token.parts[2:]):
+            self._advance()
+            return Event(
+                PITCH, self._build(Pitch, *token.parts[:2]), token.line)
+        if arg.optional:
+            return None
+        raise self._error("expected pitch for %s" % arg.name)
+
+    def _value(self, arg):
+        """Read a scheme or string argument, return its event."""
+        token = self._advance()
+        if token is None:
+            raise self._error("expected argument %s" % arg.name)
+        if issubclass(arg.type_, SchemeData):
+            if token.kind != 'scheme':
+                raise self._error(
+                    "expected scheme value for %s" % arg.name, token)
+            return Event(
+                SCHEME, _coerce(token.value, arg.type_, token.line),
+                token.line)
+        elif token.kind == 'string':
+            return Event(
+                STRING, token.value[1:-1].decode('string_escape'),
+                token.line)
+        raise self._error("expected string for %s" % arg.name, token)
+
+
+def iterparse(source, chunk_size=CHUNK_SIZE):
+    r"""
+    Generate parser events for lilypond code.
+
+    Source is a string or a file object, file objects are read in
+    chunks of `chunk_size` characters. Events are `Event` tuples of
+    kind, value and line number:
+
+    ``start_container``
+        A block or a command that takes content starts, value is a
+        `Start` tuple of class and position. Its arguments and content
+        follow, ended by ``end_container`` with the class as value.
+    ``command``
+        A command without content, value is a `Start` tuple. Its
+        arguments follow.
+    ``argument``
+        The next item is the argument named by value, instead of
+        content. Arguments always come before content.
+    ``tone``
+        A `Note`, `Rest` or `Chord`.
+    ``pitch``
+        A `Pitch`, the argument of commands like ``\relative``.
+    ``repeat``
+        ``\repeat unfold`` starts, value is the count. The content to
+        repeat follows, ended by ``end_container``. Other kinds of
+        repeats are not supported.
+    ``scheme``, ``string``
+        A scheme value or a string.
+    ``comment``
+        A list of comment lines.
+    ``bar_check``
+        Groups everything since the last bar check in a `Measure`.
+    ``version``
+        The lilypond version string.
+
+    Examples
+    ========
+    .. testsetup::
+
+        from lilyflower.parser import iterparse
+
+    .. doctest::
+
+        >>> for event in iterparse(r"\relative { c'4 \f d }"):
+        ...     print event.kind, event.value.__class__.__name__
+        start_container Start
+        tone Note
+        tone Note
+        end_container type
+        >>> notes = 0
+        >>> for event in iterparse(r"{ c d <e g> } \relative { f }"):
+        ...     if event.kind == 'tone':
+        ...         notes += 1
+        >>> print notes
+        4
+    """
+    return _EventReader(tokenize(source, chunk_size)).events()
+
+
+class _Node(object):
+
+    """A block or command that is still being built."""
+
+    __slots__ = ('cls', 'position', 'kwargs', 'content', 'pending',
+                 'measure_start')
+
+    def __init__(self, cls, position):
+        """Store state."""
+        self.cls = cls
+        self.position = position
+        self.kwargs = {}
+        self.content = []
+        self.pending = None
+        self.measure_start = 0
+
+
+class TreeBuilder(object):
+
+    """
+    Builds an object tree from parser events.
+
+    Usage::
+
+        builder = TreeBuilder()
+        for event in iterparse(text):
+            builder.feed(event)
+        lily_file = builder.close()
+    """
+
+    def __init__(self):
+        """Start with an empty file."""
+        self._stack = [_Node(None, "")]
+        self._version = None
+
+    def feed(self, event):
+        """Process a single event."""
+        kind, value, line = event
+        if kind == TONE or kind == PITCH or kind == SCHEME or \
+                kind == STRING:
+            self._add(value, line)
+        elif kind == START_CONTAINER:
+            self._stack.append(_Node(*value))
+        elif kind == REPEAT:
+            node = _Node(Repetition, "")
+            node.kwargs.update(count=value, unfold=True)
+            self._stack.append(node)
+        elif kind == END_CONTAINER:
+            self._add(self._make(self._stack.pop(), line), line)
+        elif kind == COMMAND:
+            # pylint: disable=protected-access
+            if value.cls._arguments:
+                self._stack.append(_Node(*value))
+            else:
+                self._add(self._make(_Node(*value), line), line)
+        elif kind == ARGUMENT:
+            self._stack[-1].pending = value
+        elif kind == COMMENT:
+            self._add(dom.Comment(value), line)
+        elif kind == BAR_CHECK:
+            node = self._stack[-1]
+            measure = self._build(
+                line, Measure, node.content[node.measure_start:])
+            node.content[node.measure_start:] = [measure]
+            node.measure_start = len(node.content)
+        elif kind == VERSION:
+            self._version = value
+        else:
+            raise ParseError("line %d: unknown event %r" % (line, kind))
+
+    def close(self):
+        """Return the `LilyFile` built from all events."""
+        if len(self._stack) > 1:
+            raise ParseError("end of input: unfinished %s" % (
+                self._stack[-1].cls.__name__))
+        try:
+            return dom.LilyFile(self._stack[0].content, self._version)
+        except ValueError as error:
+            raise ParseError("end of input: %s" % error)
+
+    @staticmethod
+    def _build(line, cls, *args, **kwargs):
+        """Instantiate cls, turn validation errors into ParseError."""
+        try:
+            return cls(*args, **kwargs)
+        except ValueError as error:
+            raise ParseError("line %d: %s" % (line, error))
+
+    def _make(self, node, line):
+        """Instantiate a finished block or command."""
+        # pylint: disable=protected-access
+        if not issubclass(node.cls, Node):
+            return self._build(line, node.cls, node.content, **node.kwargs)
+        kwargs = node.kwargs
+        if node.cls._allowed_content is not None:
+            kwargs['content'] = node.content
+        if node.position:
+            kwargs['position'] = node.position
+        return self._build(line, node.cls, **kwargs)
+
+    def _add(self, value, line):
+        """Store a finished item as argument or content."""
+        # pylint: disable=protected-access
+        while True:
+            node = self._stack[-1]
+            if node.pending is None:
+                node.content.append(value)
+                return
+            node.kwargs[node.pending] = value
+            node.pending = None
+            if node.cls._allowed_content is not None or \
+                    len(node.kwargs) < len(node.cls._arguments):
+                return
+            # a command is complete once it has all its arguments
+            self._stack.pop()
+            value = self._make(node, line)
+
+
+def parse(source, chunk_size=CHUNK_SIZE, pause_gc=False):
+    """
+    Parse lilypond code from a string or file object, return `LilyFile`.
+
+    With pause_gc, garbage collection is turned off while parsing, which
+    makes big inputs parse faster, see `lilyflower.tools.collection_paused`.
+    """
+    with collection_paused(pause_gc):
+        builder = TreeBuilder()
+        feed = builder.feed
+        for event in iterparse(source, chunk_size):
+            feed(event)
+        return builder.close()
@@ -0,0 +1,425 @@
+r"""
+Incremental output: edits instead of whole files.
+
+An `Output` formats a tree once and remembers, for every node, the
+byte span its code takes up. It observes the nodes in the tree, see
+`lilyflower.events`, so it knows which ones change. `Output.update`
+formats only those again: their ancestors are walked to put the code
+together, and the code of everything else is taken from the previous
+text as it is. What changed comes back as a list of `Edit` tuples.
+These can be applied to the previous text with `apply_edits`, or to the
+file it was written to with `patch_file`, so an editor only has to
+write what actually changed.
+
+Whether a spanner opens or closes depends on the rest of the tree, so
+when a changed node has spanners in it, or new ones are added, the
+whole tree is formatted again. That is also needed after changes
+observers don't hear about, such as changes made directly to
+``_container``, which ``update(full=True)`` takes care of. Call
+`Output.close` to stop observing the tree.
+
+Edits are sorted by offset and don't overlap, offsets are into the
+previous text. The creation comment at the top of a `LilyFile` is
+written again whenever anything in the file changed, so that gives a
+small edit of its own.
+
+Examples
+========
+.. testsetup::
+
+    from lilyflower.patch import Output, apply_edits
+    from lilyflower.container import Container
+    from lilyflower.tones import Note
+
+.. doctest::
+
+    >>> music = Container([
+    ...     Container([Note('c'), Note('d')]),
+    ...     Container([Note('e'), Note('f')])])
+    >>> output = Output(music)
+    >>> print output.text
+    {
+      {
+        c d
+      }
+      {
+        e f
+      }
+    }
+    >>> output.span(music[1])
+    (20, 33)
+    >>> previous = output.text
+    >>> music[1].append(Note('g'))
+    >>> edits = output.update()
+    >>> edits
+    [Edit(offset=29, length=0, replacement=' g')]
+    >>> apply_edits(previous, edits) == output.text
+    True
+"""
+from collections import namedtuple
+import os
+from lilyflower.events import observe, unobserve
+from lilyflower.spanners import Spanner
+from lilyflower.tools import get_indent_level
+from lilyflower.writer import _streamable, save
+
+Edit = namedtuple('Edit', 'offset length replacement')
+
+
+class _Span(object):
+
+    """Where the code for a single object ended up."""
+
+    __slots__ = ('obj', 'spec', 'length', 'children', 'parent', 'spanners')
+
+    def __init__(self, obj, spec, parent):
+        """Start recording, children are only kept for expanded nodes."""
+        self.obj = obj
+        self.spec = spec
+        self.length = 0
+        # (offset from the start of this span, span) for expanded nodes
+        self.children = None
+        self.parent = parent
+        # whether there are spanners in the code
+        self.spanners = False
+
+
+def _has_spanners(obj):
+    """See if formatting obj formats a spanner."""
+    return isinstance(obj, Spanner) or bool(getattr(obj, '_spanners', None))
+
+
+def _candidates(span):
+    """Return the children of span by the id of their object."""
+    candidates = {}
+    for child in span.children:
+        candidates.setdefault(id(child[1].obj), []).append(child)
+    return candidates
+
+
+def _pop(candidates, obj, spec):
+    """Take the first (offset, span) of obj formatted with spec."""
+    children = candidates.get(id(obj))
+    if children:
+        for index, child in enumerate(children):
+            if child[1].spec == spec:
+                return children.pop(index)
+    return None
+
+
+def _trim(offset, old, new):
+    """Return an edit replacing old by new, without common ends."""
+    size = min(len(old), len(new))
+    start = 0
+    while start < size and old[start] == new[start]:
+        start += 1
+    end = 0
+    while end < size - start and old[-end - 1] == new[-end - 1]:
+        end += 1
+    return Edit(
+        offset + start, len(old) - start - end,
+        new[start:len(new) - end])
+
+
+def _diff(old_text, old, old_start, new_text, new, new_start, edits):
+    """Add edits that turn the code for span old into that of new."""
+    if old is new:
+        # reused, so the code is the same
+        return
+    old_code = old_text[old_start:old_start + old.length]
+    new_code = new_text[new_start:new_start + new.length]
+    if old_code == new_code:
+        return
+    if old.children is None or new.children is None or \
+            len(old.children) != len(new.children) or any(
+                old_child[1].obj is not new_child[1].obj
+                for old_child, new_child in zip(old.children, new.children)):
+        # different content, replace as a whole
+        edits.append(_trim(old_start, old_code, new_code))
+        return
+    old_end, new_end = old_start, new_start
+    for (old_offset, old_child), (new_offset, new_child) in zip(
+            old.children, new.children):
+        old_child_start = old_start + old_offset
+        new_child_start = new_start + new_offset
+        old_gap = old_text[old_end:old_child_start]
+        new_gap = new_text[new_end:new_child_start]
+        if old_gap != new_gap:
+            edits.append(_trim(old_end, old_gap, new_gap))
+        _diff(
+            old_text, old_child, old_child_start,
+            new_text, new_child, new_child_start, edits)
+        old_end = old_child_start + old_child.length
+        new_end = new_child_start + new_child.length
+    old_gap = old_text[old_end:old_start + old.length]
+    new_gap = new_text[new_end:new_start + new.length]
+    if old_gap != new_gap:
+        edits.append(_trim(old_end, old_gap, new_gap))
+
+
+class Output(object):
+
+    """
+    Lilypond code for a tree, kept up to date with edits.
+
+    Usage::
+
+        output = Output(lily_file)
+        ...  # change lily_file
+        for edit in output.update():
+            ...
+        output.close()
+
+    Parameters
+    ==========
+    obj: lilyflower object
+        root of the tree, usually a `LilyFile`
+    format_spec: str, optional
+        format spec for obj
+    """
+
+    def __init__(self, obj, format_spec=""):
+        """Format obj for the first time."""
+        self.obj = obj
+        self._format_spec = format_spec
+        # id of an object -> its spans
+        self._occurrences = {}
+        # id of an observed object -> the object
+        self._observed = {}
+        # ids of objects that changed since the last update
+        self._dirty = set()
+        self.text = ""
+        self._top = None
+        self.text, self._top = self._render_all()
+        self._spans = None
+
+    def span(self, node):
+        """
+        Return (start, end) of the code for node in `text`.
+
+        If node occurs more than once, this is the first. Returns None
+        if node was not part of the tree.
+        """
+        if self._spans is None:
+            self._spans = {}
+            stack = [self._top.children[0]]
+            while stack:
+                start, span = stack.pop()
+                self._spans.setdefault(
+                    id(span.obj), (start, start + span.length))
+                if span.children is not None:
+                    stack.extend(
+                        (start + offset, child)
+                        for offset, child in reversed(span.children))
+        return self._spans.get(id(node))
+
+    def update(self, full=False):
+        """
+        Format what changed, return the edits since the last time.
+
+        Parameters
+        ==========
+        full: bool, optional
+            format the whole tree, needed after changes observers don't
+            hear about, see `lilyflower.events`
+
+        Returns
+        =======
+        list of `Edit`, by offset into the previous `text`
+        """
+        dirty, self._dirty = self._dirty, set()
+        walk = set()
+        for key in dirty:
+            for span in self._occurrences.get(key, ()):
+                # moving spanners around can swap their open and close
+                full = full or span.spanners
+                while span is not None and id(span) not in walk:
+                    walk.add(id(span))
+                    span = span.parent
+        if not walk and not full:
+            return []
+        rendered = None if full else self._render(walk)
+        if rendered is None:
+            rendered = self._render_all()
+        text, top = rendered
+        edits = []
+        _diff(self.text, self._top, 0, text, top, 0, edits)
+        self.text, self._top = text, top
+        self._spans = None
+        return edits
+
+    def close(self):
+        """Stop watching the tree for changes."""
+        for obj in self._observed.values():
+            unobserve(obj, self._changed)
+        self._observed = {}
+
+    def _changed(self, change):
+        """Remember what changed, for the next update."""
+        self._dirty.add(id(change.node))
+
+    def _found(self, span):
+        """Remember span, and watch its object for changes."""
+        obj = span.obj
+        self._occurrences.setdefault(id(obj), []).append(span)
+        if id(obj) not in self._observed and hasattr(obj, '_observers'):
+            observe(obj, self._changed)
+            self._observed[id(obj)] = obj
+
+    def _lost(self, span):
+        """Forget span, and its object if it is gone from the tree."""
+        key = id(span.obj)
+        spans = self._occurrences[key]
+        spans.remove(span)
+        if not spans:
+            del self._occurrences[key]
+            if key in self._observed:
+                unobserve(self._observed.pop(key), self._changed)
+
+    def _render(self, walk):
+        """
+        Format the tree, return its code and top span.
+
+        walk has the ids of the spans to expand again, the code of the
+        others is taken from `text`. If walk is None, everything is
+        formatted. Returns None if a spanner would have to be formatted
+        while reusing code, since whether it opens or closes depends on
+        the rest of the tree.
+        """
+        old_text = self.text
+        pieces = []
+        offset = 0
+        # holds the root, so it is handled like any other child
+        top = _Span(None, None, None)
+        top.children = []
+        candidates = None if walk is None else _candidates(self._top)
+        stack = [(
+            iter([(self.obj, self._format_spec)]), top, 0, 0, candidates)]
+        while stack:
+            iterator, span, start, old_start, candidates = stack[-1]
+            for piece in iterator:
+                if type(piece) is not tuple:
+                    pieces.append(piece)
+                    offset += len(piece)
+                    continue
+                child, spec = piece
+                previous = None
+                if candidates is not None:
+                    previous = _pop(candidates, child, spec)
+                if previous is not None and id(previous[1]) not in walk:
+                    # unchanged, reuse the code
+                    old_offset, child_span = previous
+                    code_start = old_start + old_offset
+                    pieces.append(
+                        old_text[code_start:code_start + child_span.length])
+                    span.children.append((offset - start, child_span))
+                    offset += child_span.length
+                    child_span.parent = span
+                    span.spanners = span.spanners or child_span.spanners
+                    continue
+                child_span = _Span(child, spec, span)
+                span.children.append((offset - start, child_span))
+                self._found(child_span)
+                if previous is not None:
+                    self._lost(previous[1])
+                if _streamable(type(child)):
+                    child_span.children = []
+                    child_candidates = child_start = None
+                    if previous is not None and \
+                            previous[1].children is not None:
+                        child_candidates = _candidates(previous[1])
+                        child_start = old_start + previous[0]
+                    stack.append((
+                        child._iter_format(get_indent_level(spec)),
+                        child_span, offset, child_start, child_candidates))
+                    break
+                if _has_spanners(child):
+                    if walk is not None:
+                        return None
+                    child_span.spanners = span.spanners = True
+                code = format(child, spec)
+                pieces.append(code)
+                offset += len(code)
+                child_span.length = len(code)
+            else:
+                span.length = offset - start
+                if candidates is not None:
+                    # children that are not there anymore
+                    for children in candidates.values():
+                        for _, child_span in children:
+                            self._lost_tree(child_span)
+                if span.parent is not None and span.spanners:
+                    span.parent.spanners = True
+                stack.pop()
+        return "".join(pieces), top
+
+    def _lost_tree(self, span):
+        """Forget span and all spans inside it."""
+        stack = [span]
+        while stack:
+            span = stack.pop()
+            self._lost(span)
+            if span.children is not None:
+                stack.extend(child for _, child in span.children)
+
+    def _render_all(self):
+        """Format the whole tree, and watch only what is in it."""
+        self._occurrences = {}
+        rendered = self._render(None)
+        for key in self._observed.keys():
+            if key not in self._occurrences:
+                unobserve(self._observed.pop(key), self._changed)
+        return rendered
+def apply_edits(text, edits):
+    """Apply edits from `Output.update` to the text they were made for."""
+    pieces = []
+    position = 0
+    for edit in edits:
+        pieces.append(text[position:edit.offset])
+        pieces.append(edit.replacement)
+        position = edit.offset + edit.length
+    pieces.append(text[position:])
+    return "".join(pieces)
+
+
+def patch_file(path, edits):
+    """
+    Apply edits from `Output.update` to a file.
+
+    Edits that don't change the length are written where they are.
+    Otherwise everything from the first edit that does is written
+    again, since the rest of the file has to move. That is done in
+    place too, as long as it is at most half of the file. Writing in
+    place is not atomic: if it is interrupted, the file is left half
+    patched. When more than half of the file would move, the whole file
+    is written with `lilyflower.writer.save` instead, which is atomic.
+    """
+    if not edits:
+        return
+    for index, edit in enumerate(edits):
+        if edit.length != len(edit.replacement):
+            start = edit.offset
+            break
+    else:
+        index = start = None
+    if start is not None:
+        size = os.path.getsize(path)
+        if size - start > size // 2:
+            with open(path, 'rb') as lily_file:
+                text = lily_file.read()
+            save(apply_edits(text, edits), path)
+            return
+    with open(path, 'r+b') as lily_file:
+        for edit in edits[:index]:
+            lily_file.seek(edit.offset)
+            lily_file.write(edit.replacement)
+        if start is None:
+            return
+        lily_file.seek(start)
+        tail = lily_file.read()
+        moved = [
+            Edit(edit.offset - start, edit.length, edit.replacement)
+            for edit in edits[index:]]
+        lily_file.seek(start)
+        lily_file.write(apply_edits(tail, moved))
+        lily_file.truncate()
@@ -0,0 +1,237 @@
+r"""
+Compact pickling of lilyflower trees.
+
+Default pickling stores the class name and the whole instance dict of
+every object. Classes that derive from `CompactPickle` list the
+attributes that make up their state in `_state`, and pickle as a tuple
+of just the values. The class is stored as a number: its position in a
+table of all lilyflower classes. That table is sorted by module and
+name, so it is the same in every process running the same version of
+lilyflower, which is what process pools and caches need. Pickles are
+not meant to be read by a different version of lilyflower.
+
+Attributes listed in `_transient` are caches: they are left out, and
+computed again when needed. Objects with other attributes that are not
+in `_state` (set by a subclass, or by hand) fall back to pickling their
+instance dict, and classes from outside lilyflower are stored by
+reference, so nothing is lost.
+
+Examples
+========
+.. testsetup::
+
+    import cPickle
+    from lilyflower.container import Container
+    from lilyflower.tones import Note
+
+.. doctest::
+
+    >>> music = Container([Note('c', '', '4'), Note('d')])
+    >>> data = cPickle.dumps(music, cPickle.HIGHEST_PROTOCOL)
+    >>> print format(cPickle.loads(data))
+    {
+      c4 d
+    }
+"""
+import importlib
+from operator import attrgetter
+
+_MODULES = (
+    'lilyflower.node',
+    'lilyflower.dom',
+    'lilyflower.container',
+    'lilyflower.containers',
+    'lilyflower.command',
+    'lilyflower.commands',
+    'lilyflower.notecommands',
+    'lilyflower.dynamics',
+    'lilyflower.spanners',
+    'lilyflower.tones',
+    'lilyflower.repetition',
+    'lilyflower.rope',
+    'lilyflower.schemedata')
+
+# class id -> class, and class -> class id
+_CLASSES = []
+_IDS = {}
+# full name -> class, for the classes in the table
+_NAMES = {}
+# class -> names in _state and _transient as a set, and a function that
+# gets the values of those in _state
+_STATE_NAMES = {}
+_GETTERS = {}
+# classes that restore their state the way CompactPickle does
+_PLAIN = set()
+
+
+def _load_table():
+    """Fill the class table, the first time it is needed."""
+    found = set()
+    for name in _MODULES:
+        module = importlib.import_module(name)
+        for value in vars(module).values():
+            if isinstance(value, type) and \
+                    issubclass(value, CompactPickle) and \
+                    value.__module__ == name:
+                found.add(value)
+    _CLASSES.extend(sorted(
+        found, key=lambda cls: (cls.__module__, cls.__name__)))
+    _IDS.update((cls, index) for index, cls in enumerate(_CLASSES))
+    _NAMES.update(
+        ("%s.%s" % (cls.__module__, cls.__name__), cls) for cls in _CLASSES)
+    for cls in _CLASSES:
+        if _plain(cls):
+            _PLAIN.add(cls)
+            state_names(cls)
+            _GETTERS[cls] = _getter(cls._state)
+
+
+def class_id(cls):
+    """Return the number for cls, or cls itself if it's not in the table."""
+    if not _CLASSES:
+        _load_table()
+    return _IDS.get(cls, cls)
+
+
+def class_named(name):
+    """Return the class in the table with full name name, or None."""
+    if not _CLASSES:
+        _load_table()
+    return _NAMES.get(name)
+
+
+def state_names(cls):
+    """Return the names of the attributes cls pickles or caches, as a set."""
+    names = _STATE_NAMES.get(cls)
+    if names is None:
+        names = _STATE_NAMES[cls] = frozenset(cls._state + cls._transient)
+    return names
+
+
+def restore(key, state):
+    """Recreate a pickled object from class id and state."""
+    if type(key) is int:
+        if not _CLASSES:
+            _load_table()
+        key = _CLASSES[key]
+    obj = object.__new__(key)
+    if type(state) is tuple and key in _PLAIN:
+        # skip the method calls for the common case
+        names = key._state
+        attributes = obj.__dict__
+        if len(state) == len(names):
+            attributes.update(zip(names, state))
+        else:
+            attributes.update(zip(names, state[1:]))
+            mask = state[0]
+            index = 0
+            while mask:
+                if mask & 1:
+                    attributes[names[index]] = []
+                mask >>= 1
+                index += 1
+    else:
+        obj.__setstate__(state)
+    return obj
+
+
+def _getter(names):
+    """Return a function that gets a tuple of attribute values."""
+    if len(names) > 1:
+        return attrgetter(*names)
+    return lambda obj: tuple([getattr(obj, name) for name in names])
+
+
+def _pack(values):
+    """Replace empty lists in a tuple of values by a bit mask in front."""
+    # empty lists are common and every one takes a memo entry
+    mask = 0
+    for index, value in enumerate(values):
+        if type(value) is list and not value:
+            mask |= 1 << index
+    return (mask,) + tuple([
+        None if mask >> index & 1 else value
+        for index, value in enumerate(values)])
+
+
+def _unpack(state, count):
+    """Return the values packed by `_pack`, count is the number of values."""
+    if len(state) == count:
+        return state
+    mask = state[0]
+    values = list(state[1:])
+    index = 0
+    while mask:
+        if mask & 1:
+            values[index] = []
+        mask >>= 1
+        index += 1
+    return values
+
+
+def _plain(cls):
+    """See if cls handles its state the way `CompactPickle` does."""
+    for method in ('__setstate__', '_restore_values', '_state_values'):
+        for base in cls.__mro__:
+            if method in vars(base):
+                if base is not CompactPickle:
+                    return False
+                break
+    return True
+
+
+class CompactPickle(object):
+
+    """
+    Mixin for pickling as class id and a tuple of attribute values.
+
+    Subclasses list their state in `_state`, and attributes that only
+    cache something in `_transient`. Attributes that are not set on the
+    instance are pickled with their class default, so the restored
+    object behaves the same. Subclasses that need to convert values
+    override `_state_values` and `_restore_values`.
+    """
+
+    __slots__ = ()
+    _state = ()
+    _transient = ()
+
+    def __reduce__(self):
+        """Pickle as class id and state."""
+        if not _CLASSES:
+            _load_table()
+        cls = type(self)
+        if cls in _PLAIN and self.__dict__.viewkeys() <= _STATE_NAMES[cls]:
+            # the common case, without the method calls
+            values = _GETTERS[cls](self)
+            if [] in values:
+                values = _pack(values)
+            return (restore, (_IDS[cls], values))
+        return (restore, (_IDS.get(cls, cls), self.__getstate__()))
+
+    def __getstate__(self):
+        """Return attribute values, or the instance dict if incomplete."""
+        if not self.__dict__.viewkeys() <= state_names(type(self)):
+            return self.__dict__
+        values = self._state_values()
+        if [] in values:
+            values = _pack(values)
+        return values
+
+    def __setstate__(self, state):
+        """Restore attributes."""
+        if type(state) is tuple:
+            self._restore_values(_unpack(state, len(self._state)))
+        else:
+            self.__dict__.update(state)
+
+    def _state_values(self):
+        """Return a tuple with the values of the attributes in `_state`."""
+        cls = type(self)
+        if cls not in _GETTERS:
+            _GETTERS[cls] = _getter(cls._state)
+        return _GETTERS[cls](self)
+
+    def _restore_values(self, values):
+        """Set the attributes in `_state` from values."""
+        self.__dict__.update(zip(self._state, values))
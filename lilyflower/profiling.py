@@ -0,0 +1,248 @@
+r"""
+Per-class profiling of lilypond code generation.
+
+While a `Profile` is enabled, every `__format__` method in lilyflower is
+wrapped to record, per class of the formatted object, the number of
+calls, the time spent in its own code, the cumulative time including
+children, and the number of bytes produced. When disabled, the original
+methods are put back, so there is no overhead at all outside of
+profiling.
+
+Calls a class makes to a parent class formatter on the same object
+(like `NoteCommand` does with `Command.__format__`) count as one call.
+
+The data can be printed as a sorted report, or handed to `pstats`::
+
+    import pstats
+    pstats.Stats(profile).sort_stats('cumulative').print_stats()
+
+Examples
+========
+.. testsetup::
+
+    from lilyflower.profiling import Profile
+    from lilyflower.container import Container
+    from lilyflower.tones import Note
+
+.. doctest::
+
+    >>> music = Container([Note('c'), Container([Note('d'), Note('e')])])
+    >>> with Profile() as profile:
+    ...     code = format(music)
+    >>> for cls, stats in sorted(profile.items(), key=lambda x: x[1].calls):
+    ...     print cls.__name__, stats.calls, stats.bytes
+    Container 2 36
+    Note 3 3
+"""
+from collections import namedtuple
+import inspect
+import marshal
+from timeit import default_timer
+from lilyflower import (
+    node,
+    dom,
+    container,
+    containers,
+    command,
+    commands,
+    notecommands,
+    dynamics,
+    spanners,
+    tones,
+    schemedata)
+
+ClassStats = namedtuple('ClassStats', 'calls own cumulative bytes')
+
+_MODULES = (
+    node,
+    dom,
+    container,
+    containers,
+    command,
+    commands,
+    notecommands,
+    dynamics,
+    spanners,
+    tones,
+    schemedata)
+
+SORT_KEYS = ('calls', 'own', 'cumulative', 'bytes')
+
+
+def formatters():
+    """Return all lilyflower classes that define their own __format__."""
+    found = set()
+    for module in _MODULES:
+        for value in vars(module).values():
+            if isinstance(value, type) and '__format__' in vars(value) and \
+                    value.__module__.startswith('lilyflower.'):
+                found.add(value)
+    return sorted(found, key=lambda cls: (cls.__module__, cls.__name__))
+
+
+class _Entry(object):
+
+    """Mutable counters for a single class."""
+
+    __slots__ = ('calls', 'primitive', 'own', 'cumulative', 'bytes',
+                 'active', 'callers')
+
+    def __init__(self):
+        """Start at zero."""
+        self.calls = 0
+        # calls that are not nested in a call for the same class
+        self.primitive = 0
+        self.own = 0.0
+        self.cumulative = 0.0
+        self.bytes = 0
+        self.active = 0
+        self.callers = {}
+
+
+class Profile(object):
+
+    """
+    Records format statistics per class while enabled.
+
+    Usage::
+
+        with Profile() as profile:
+            format(lily_file)
+        print profile.report()
+
+    Parameters
+    ==========
+    classes: iterable of classes, optional
+        classes whose __format__ is wrapped, default is `formatters()`
+    """
+
+    def __init__(self, classes=None):
+        """Prepare, don't enable yet."""
+        self._classes = formatters() if classes is None else list(classes)
+        self._originals = []
+        self._entries = {}
+        self._stack = []
+        self.stats = {}
+
+    def enable(self):
+        """Start recording."""
+        if self._originals:
+            return
+        for cls in self._classes:
+            original = vars(cls)['__format__']
+            self._originals.append((cls, original))
+            setattr(cls, '__format__', self._wrap(original))
+
+    def disable(self):
+        """Stop recording, restore the original methods."""
+        while self._originals:
+            cls, original = self._originals.pop()
+            setattr(cls, '__format__', original)
+
+    def __enter__(self):
+        """Enable profiling."""
+        self.enable()
+        return self
+
+    def __exit__(self, *_):
+        """Disable profiling."""
+        self.disable()
+
+    def _wrap(self, function):
+        """Return a timing wrapper around a __format__ function."""
+        stack = self._stack
+        entries = self._entries
+        timer = default_timer
+
+        def __format__(obj, format_spec):
+            """Record call count, time and output size."""
+            if stack and stack[-1][0] is obj:
+                # parent class formatter for the same object
+                return function(obj, format_spec)
+            cls = type(obj)
+            entry = entries.get(cls)
+            if entry is None:
+                entry = entries[cls] = _Entry()
+            frame = [obj, 0.0]
+            stack.append(frame)
+            entry.active += 1
+            start = timer()
+            try:
+                result = function(obj, format_spec)
+            finally:
+                elapsed = timer() - start
+                entry.active -= 1
+                stack.pop()
+            entry.calls += 1
+            entry.own += elapsed - frame[1]
+            if entry.active == 0:
+                entry.primitive += 1
+                entry.cumulative += elapsed
+            entry.bytes += len(result)
+            if stack:
+                stack[-1][1] += elapsed
+                caller = type(stack[-1][0])
+                counts = entry.callers.get(caller, (0, 0.0, 0.0))
+                entry.callers[caller] = (
+                    counts[0] + 1, counts[1] + elapsed - frame[1],
+                    counts[2] + elapsed)
+            return result
+        __format__.__doc__ = function.__doc__
+        return __format__
+
+    def clear(self):
+        """Forget everything recorded so far."""
+        self._entries.clear()
+
+    def items(self):
+        """Return a list of (class, `ClassStats`) tuples."""
+        return [
+            (cls, ClassStats(
+                entry.calls, entry.own, entry.cumulative, entry.bytes))
+            for cls, entry in self._entries.items()]
+
+    def report(self, sort='cumulative', limit=None):
+        """Return a table of statistics, sorted by one of `SORT_KEYS`."""
+        if sort not in SORT_KEYS:
+            raise ValueError("can't sort by %r, use one of %s" % (
+                sort, ", ".join(SORT_KEYS)))
+        rows = sorted(
+            self.items(),
+            key=lambda item: getattr(item[1], sort),
+            reverse=True)[:limit]
+        lines = ["%10s %10s %10s %10s  %s" % (
+            "calls", "own", "cumulative", "bytes", "class")]
+        for cls, stats in rows:
+            lines.append("%10d %10.6f %10.6f %10d  %s.%s" % (
+                stats.calls, stats.own, stats.cumulative, stats.bytes,
+                cls.__module__, cls.__name__))
+        return "\n".join(lines)
+
+    @staticmethod
+    def _key(cls):
+        """Function key in pstats format for a class."""
+        try:
+            filename = inspect.getsourcefile(cls) or "~"
+            line = inspect.getsourcelines(cls)[1]
+        except (IOError, TypeError):
+            filename, line = "~", 0
+        return (filename, line, "%s.__format__" % cls.__name__)
+
+    def create_stats(self):
+        """Store statistics in `stats`, in the format `pstats` reads."""
+        keys = dict((cls, self._key(cls)) for cls in self._entries)
+        self.stats = {}
+        for cls, entry in self._entries.items():
+            callers = dict(
+                (keys[caller], (calls, calls, own, cumulative))
+                for caller, (calls, own, cumulative)
+                in entry.callers.items())
+            self.stats[keys[cls]] = (
+                entry.primitive, entry.calls, entry.own, entry.cumulative,
+                callers)
+
+    def dump_stats(self, filename):
+        """Write statistics to a file `pstats.Stats` can load."""
+        self.create_stats()
+        with open(filename, 'wb') as stats_file:
+            marshal.dump(self.stats, stats_file)
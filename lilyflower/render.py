@@ -0,0 +1,544 @@
+r"""
+Compile lilyflower output with the lilypond binary.
+
+A `Renderer` formats `LilyFile` objects, runs lilypond on them in a
+temporary directory and collects the output files (pdf, png, ps, midi)
+together with the diagnostics lilypond printed. Multiple files are
+compiled in parallel, with at most `workers` lilypond processes running
+at any time. Small files can be compiled in batches, many files per
+lilypond run, with output files and diagnostics mapped back to the
+`LilyFile` they came from.
+
+Lilypond takes a while to start, so results are cached by a hash of the
+generated code and everything that influences the output: the lilypond
+command, output formats and extra options. The creation comment
+lilyflower puts at the top of every file holds the current time, it is
+left out of the hash. By default the cache lives in memory, give a
+`cache_dir` to keep it on disk between runs.
+
+Usage::
+
+    with Renderer(formats=('pdf', 'png'), workers=4) as renderer:
+        for result in renderer.render_all(lily_files):
+            if not result.ok:
+                for diagnostic in result.diagnostics:
+                    print diagnostic
+            else:
+                pdf = result.outputs['score.pdf']
+
+Examples
+========
+.. testsetup::
+
+    from lilyflower.render import parse_diagnostics
+
+.. doctest::
+
+    >>> log = '''Processing `score.ly'
+    ... score.ly:4:3: error: syntax error, unexpected '}'
+    ... score.ly:7:1: warning: no \\version statement found
+    ... fatal error: failed files: "score.ly"
+    ... '''
+    >>> for diagnostic in parse_diagnostics(log):
+    ...     print diagnostic.severity, diagnostic.line, diagnostic.message
+    error 4 syntax error, unexpected '}'
+    warning 7 no \version statement found
+    fatal error None failed files: "score.ly"
+"""
+from collections import namedtuple, OrderedDict
+import errno
+import hashlib
+from multiprocessing import cpu_count, TimeoutError
+from multiprocessing.pool import ThreadPool
+import os
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+from lilyflower.errors import RenderError
+from lilyflower.tools import without_creation_comment
+
+LILYPOND = 'lilypond'
+FORMATS = ('pdf', 'png', 'ps')
+OUTPUT_EXTENSIONS = ('.pdf', '.png', '.ps', '.midi', '.mid')
+
+Diagnostic = namedtuple('Diagnostic', 'severity message file line column')
+
+_DIAGNOSTIC = re.compile(
+    r"^(?:(?P<file>[^:\n]+):(?P<line>\d+):(?P<column>\d+): )?"
+    r"(?P<severity>fatal error|programming error|error|warning): "
+    r"(?P<message>.*)$",
+    re.MULTILINE)
+
+_PROCESSING = re.compile(r"^Processing `(?P<file>[^']*)'")
+_FAILED = re.compile(r'^fatal error: failed files: "(?P<files>[^"]*)"')
+
+
+def parse_diagnostics(log):
+    """Return a list of `Diagnostic` tuples found in lilypond output."""
+    diagnostics = []
+    for found in _DIAGNOSTIC.finditer(log):
+        line = found.group('line')
+        column = found.group('column')
+        diagnostics.append(Diagnostic(
+            found.group('severity'),
+            found.group('message').rstrip(),
+            found.group('file'),
+            None if line is None else int(line),
+            None if column is None else int(column)))
+    return diagnostics
+
+
+class Result(namedtuple(
+        'Result', 'key returncode outputs log diagnostics cached')):
+
+    """
+    Outcome of compiling a single file.
+
+    Attributes
+    ==========
+    key: str
+        cache key, a hash of the source and render settings
+    returncode: int
+        exit status of lilypond
+    outputs: dict
+        file name -> contents of every output file
+    log: str
+        everything lilypond printed
+    diagnostics: list of `Diagnostic`
+        errors and warnings found in the log
+    cached: bool
+        whether this came from the cache instead of lilypond
+    """
+
+    __slots__ = ()
+
+    @property
+    def ok(self):
+        """Whether compilation succeeded."""
+        return self.returncode == 0
+
+
+class Renderer(object):
+
+    """
+    Runs lilypond on `LilyFile` objects, with a worker pool and a cache.
+
+    Usage::
+
+        Renderer(lilypond='lilypond', formats=('pdf',), options=(),
+                 workers=None, cache_dir=None, batch_size=1)
+
+    Parameters
+    ==========
+    lilypond: str or list of str, optional
+        lilypond executable, or a command to prefix the arguments with
+    formats: iterable of str, optional
+        output formats to ask for, any of `FORMATS`. Midi files are
+        collected when the score asks for them with a midi block.
+    options: iterable of str, optional
+        extra command line options, like '-dresolution=300'
+    workers: int, optional
+        maximum number of lilypond processes, default is the number of
+        processors
+    cache_dir: str, optional
+        directory to keep results in, default is to cache in memory
+    batch_size: int, optional
+        number of files to compile with a single lilypond run. Startup
+        dominates the time it takes to compile small files, so batches
+        of a few dozen make a big difference for those. Default is 1.
+
+    Raises
+    ======
+    ValueError:
+        when asked for an unknown format or a batch size below 1
+    RenderError:
+        when the lilypond command can't be run
+    """
+
+    def __init__(
+            self, lilypond=LILYPOND, formats=('pdf',), options=(),
+            workers=None, cache_dir=None, batch_size=1):
+        """Store settings, the pool is started on first use."""
+        if isinstance(lilypond, basestring):
+            lilypond = [lilypond]
+        self._command = list(lilypond)
+        self._formats = tuple(formats)
+        for output_format in self._formats:
+            if output_format not in FORMATS:
+                raise ValueError("unknown output format %r" % output_format)
+        self._options = tuple(options)
+        self._workers = cpu_count() if workers is None else workers
+        self._cache_dir = cache_dir
+        if batch_size < 1:
+            raise ValueError("batch size should be at least 1")
+        self._batch_size = batch_size
+        self._cache = {}
+        self._lock = threading.Lock()
+        self._pool = None
+
+    def __enter__(self):
+        """Use as context manager, closes pool on exit."""
+        return self
+
+    def __exit__(self, *_):
+        """Close pool."""
+        self.close()
+
+    def close(self):
+        """Stop the worker pool."""
+        if self._pool is not None:
+            self._pool.close()
+            self._pool.join()
+            self._pool = None
+
+    def key(self, source):
+        """Return cache key for lilypond source code."""
+        digest = hashlib.sha1()
+        for part in self._command + list(self._formats + self._options):
+            digest.update(part)
+            digest.update("\0")
+        digest.update(without_creation_comment(source))
+        return digest.hexdigest()
+
+    def render(self, lily_file, name='score'):
+        """Compile a single file, return a `Result`."""
+        return self.render_all([lily_file], name)[0]
+
+    def render_all(self, lily_files, name='score'):
+        """
+        Compile many files, return a list of `Result` in the same order.
+
+        Files are formatted one after the other first, formatting is
+        not thread safe (spanners keep state while being formatted).
+        Files that are not cached are compiled in batches, batches run
+        in parallel. Identical files are compiled only once.
+
+        Output file names and diagnostics look like every file was
+        compiled on its own, as `name`.ly.
+        """
+        keys, results, batches = self._prepare(lily_files)
+        if len(batches) == 1:
+            done = [self._run(batches[0], name)]
+        elif batches:
+            done = self._get_pool().map(
+                lambda batch: self._run(batch, name), batches, 1)
+        else:
+            done = []
+        return self._finish(keys, results, done)
+
+    def render_async(
+            self, lily_files, name='score', callback=None,
+            error_callback=None):
+        """
+        Start compiling many files, return a `PendingRender` right away.
+
+        Works like `render_all`, except that lilypond runs in the
+        background. Formatting still happens before this returns. When
+        all files are done, callback is called with the list of
+        `Result`. If compiling raised an exception instead, like a
+        `RenderError` when lilypond can't be started, error_callback is
+        called with the exception and callback is not called. Both are
+        called from a worker thread. An exception they raise is stored
+        as `PendingRender.callback_error` instead of reaching the worker
+        pool. No more than `workers` lilypond processes run at any time,
+        for all calls together.
+        """
+        keys, results, batches = self._prepare(lily_files)
+        return PendingRender(
+            self, keys, results, batches, name, callback, error_callback)
+
+    def _get_pool(self):
+        """Return the worker pool, start it if needed."""
+        with self._lock:
+            if self._pool is None:
+                self._pool = ThreadPool(self._workers)
+            return self._pool
+
+    def _prepare(self, lily_files):
+        """
+        Format files and look them up in the cache.
+
+        Returns the keys of all files in order, a dict of key -> cached
+        result, and batches of (key, source) jobs to compile.
+        """
+        keys = []
+        results = {}
+        pending = OrderedDict()
+        for lily_file in lily_files:
+            source = format(lily_file)
+            key = self.key(source)
+            keys.append(key)
+            if key in results or key in pending:
+                continue
+            result = self._load(key)
+            if result is None:
+                pending[key] = source
+            else:
+                results[key] = result
+        jobs = pending.items()
+        return keys, results, [
+            jobs[start:start + self._batch_size]
+            for start in range(0, len(jobs), self._batch_size)]
+
+    def _finish(self, keys, results, done):
+        """Store compiled batches, return results in order of keys."""
+        for batch in done:
+            for result in batch:
+                # a crash or kill might not happen next time, don't
+                # cache that
+                if result.returncode in (0, 1):
+                    self._store(result)
+                results[result.key] = result
+        return [results[key] for key in keys]
+
+    def _run(self, jobs, name):
+        """
+        Compile a batch of (key, source) jobs with one lilypond run.
+
+        Return a list of `Result`, one for every job.
+        """
+        if len(jobs) == 1:
+            stems = [name]
+        else:
+            stems = ["%s-%d" % (name, number) for number in range(len(jobs))]
+        workdir = tempfile.mkdtemp(prefix='lilyflower-')
+        try:
+            for stem, (_, source) in zip(stems, jobs):
+                with open(os.path.join(workdir, '%s.ly' % stem), 'w') as ly:
+                    ly.write(source)
+            command = self._command + [
+                '--%s' % output_format for output_format in self._formats
+            ] + list(self._options) + ['%s.ly' % stem for stem in stems]
+            try:
+                process = subprocess.Popen(
+                    command,
+                    cwd=workdir,
+                    stdout=subprocess.PIPE,
+                    stderr=subprocess.STDOUT)
+            except OSError as error:
+                raise RenderError(
+                    "can't run %s: %s" % (" ".join(self._command), error))
+            log = process.communicate()[0]
+            outputs = _collect(workdir)
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+        if len(jobs) == 1:
+            return [Result(
+                jobs[0][0], process.returncode, outputs, log,
+                parse_diagnostics(log), False)]
+        logs, failed = _split_log(log, stems)
+        results = []
+        for stem, (key, _) in zip(stems, jobs):
+            returncode = process.returncode
+            if returncode == 1 and stem not in failed:
+                returncode = 0
+            # make it look like the file was compiled on its own
+            job_log = logs[stem].replace("%s.ly" % stem, "%s.ly" % name)
+            job_outputs = {}
+            for filename, data in outputs.items():
+                if filename.startswith(stem) and \
+                        filename[len(stem)] in '.-':
+                    job_outputs[name + filename[len(stem):]] = data
+            results.append(Result(
+                key, returncode, job_outputs, job_log,
+                parse_diagnostics(job_log), False))
+        return results
+
+    def _load(self, key):
+        """Return cached result or None."""
+        with self._lock:
+            if key in self._cache:
+                return self._cache[key]._replace(cached=True)
+        if self._cache_dir is None:
+            return None
+        path = os.path.join(self._cache_dir, key)
+        try:
+            with open(os.path.join(path, 'returncode')) as status_file:
+                returncode = int(status_file.read())
+            with open(os.path.join(path, 'log')) as log_file:
+                log = log_file.read()
+            outputs = _collect(os.path.join(path, 'outputs'))
+        except (IOError, OSError, ValueError):
+            return None
+        return Result(
+            key, returncode, outputs, log, parse_diagnostics(log), True)
+
+    def _store(self, result):
+        """Put result in the cache."""
+        if self._cache_dir is None:
+            with self._lock:
+                self._cache[result.key] = result
+            return
+        if not os.path.isdir(self._cache_dir):
+            try:
+                os.makedirs(self._cache_dir)
+            except OSError as error:
+                if error.errno != errno.EEXIST:
+                    raise
+        # write everything next to the cache entry, then move it in
+        # place, so other processes never see a half written entry
+        temp = tempfile.mkdtemp(dir=self._cache_dir)
+        try:
+            os.mkdir(os.path.join(temp, 'outputs'))
+            for filename, data in result.outputs.items():
+                with open(os.path.join(temp, 'outputs', filename),
+                          'wb') as output:
+                    output.write(data)
+            with open(os.path.join(temp, 'log'), 'w') as log_file:
+                log_file.write(result.log)
+            with open(os.path.join(temp, 'returncode'), 'w') as status_file:
+                status_file.write(str(result.returncode))
+            try:
+                os.rename(temp, os.path.join(self._cache_dir, result.key))
+            except OSError:
+                # somebody else stored the same result first
+                pass
+        finally:
+            shutil.rmtree(temp, ignore_errors=True)
+
+
+class PendingRender(object):
+
+    """
+    Compilation running in the background, see `Renderer.render_async`.
+
+    Works like the result of `multiprocessing.pool.Pool.map_async`.
+    An exception raised by callback or error_callback is kept in
+    callback_error, None if there was none.
+    """
+
+    def __init__(
+            self, renderer, keys, results, batches, name, callback,
+            error_callback):
+        """Hand batches to the worker pool."""
+        self._renderer = renderer
+        self._keys = keys
+        self._cached = results
+        self._results = None
+        self._name = name
+        self._callback = callback
+        self._error_callback = error_callback
+        self._count = len(batches)
+        self._done = []
+        self._error = None
+        self.callback_error = None
+        self._lock = threading.Lock()
+        self._event = threading.Event()
+        if not batches:
+            self._complete()
+            return
+        pool = renderer._get_pool()
+        for batch in batches:
+            pool.apply_async(self._call, (batch,), callback=self._batch_done)
+
+    def _call(self, batch):
+        """Compile a batch, return results and exception info."""
+        try:
+            # pylint: disable=protected-access
+            return self._renderer._run(batch, self._name), None
+        except Exception:  # pylint: disable=broad-except
+            # handed to whoever calls get
+            return None, sys.exc_info()
+
+    def _batch_done(self, outcome):
+        """Collect a finished batch."""
+        with self._lock:
+            self._done.append(outcome)
+            finished = len(self._done) == self._count
+        if finished:
+            self._complete()
+
+    def _complete(self):
+        """All batches are done, store and report results."""
+        errors = [error for _, error in self._done if error is not None]
+        if errors:
+            self._error = errors[0]
+        else:
+            try:
+                # pylint: disable=protected-access
+                self._results = self._renderer._finish(
+                    self._keys, self._cached,
+                    [batch for batch, _ in self._done])
+            except Exception:  # pylint: disable=broad-except
+                self._error = sys.exc_info()
+        # like map_async, callbacks are done by the time get returns
+        try:
+            if self._error is None:
+                if self._callback is not None:
+                    self._callback(self._results)
+            elif self._error_callback is not None:
+                self._error_callback(self._error[1])
+        except Exception as error:  # pylint: disable=broad-except
+            # raising in the result thread of the pool would stop it
+            self.callback_error = error
+        finally:
+            self._event.set()
+
+    def ready(self):
+        """Whether compilation is done."""
+        return self._event.is_set()
+
+    def successful(self):
+        """Whether compilation is done without raising an exception."""
+        if not self.ready():
+            raise ValueError("compilation is not done yet")
+        return self._error is None
+
+    def wait(self, timeout=None):
+        """Wait until compilation is done, or timeout seconds passed."""
+        self._event.wait(timeout)
+
+    def get(self, timeout=None):
+        """Return list of `Result`, raise whatever compilation raised."""
+        self.wait(timeout)
+        if not self.ready():
+            raise TimeoutError("compilation is not done yet")
+        if self._error is not None:
+            raise self._error[0], self._error[1], self._error[2]
+        return self._results
+
+
+def _collect(directory):
+    """Read all output files in a directory."""
+    outputs = {}
+    for filename in sorted(os.listdir(directory)):
+        if os.path.splitext(filename)[1] in OUTPUT_EXTENSIONS:
+            with open(os.path.join(directory, filename), 'rb') as output:
+                outputs[filename] = output.read()
+    return outputs
+
+
+def _split_log(log, stems):
+    """
+    Split the log of a batch run per input file.
+
+    Lines before the first file are common to all files. Returns a dict
+    of stem -> log, and the set of stems that failed.
+    """
+    common = []
+    parts = dict((stem, []) for stem in stems)
+    failed = set()
+    current = common
+    for line in log.splitlines(True):
+        found = _PROCESSING.match(line)
+        if found is not None:
+            stem = os.path.splitext(os.path.basename(found.group('file')))[0]
+            current = parts.get(stem, current)
+        else:
+            found = _FAILED.match(line)
+            if found is not None:
+                for filename in found.group('files').split():
+                    stem = os.path.splitext(os.path.basename(filename))[0]
+                    if stem in parts:
+                        failed.add(stem)
+                        parts[stem].append(
+                            'fatal error: failed files: "%s.ly"\n' % stem)
+                continue
+        current.append(line)
+    common = "".join(common)
+    return dict(
+        (stem, common + "".join(lines)) for stem, lines in parts.items()), \
+        failed
@@ -0,0 +1,193 @@
+r"""
+Repeated music that is not copied.
+
+A `Repetition` stores a body and a count, and acts like a container
+holding the body count times: it has the expanded length, iterates and
+indexes over the expanded content, and formats as the expanded code.
+None of that copies the body, formatting streams it count times, so a
+loop of thousands of repeats takes no more memory than a single one.
+
+With ``unfold=True`` the body is written only once, as
+``\repeat unfold``, and lilypond does the repeating. That is shorter,
+and spanners in the body are formatted once, so the open and close
+parts stay in order whatever the body contains.
+
+Changing the content (append, remove, item assignment) changes the
+body, so it changes every repeat.
+
+Examples
+========
+.. testsetup::
+
+    from lilyflower.repetition import Repetition
+    from lilyflower.container import Container
+    from lilyflower.tones import Note
+
+.. doctest::
+
+    >>> loop = Repetition([Note('c', '', '8'), Note('d')], 3)
+    >>> len(loop)
+    6
+    >>> print format(loop)
+    {
+      c8 d c8 d c8 d
+    }
+    >>> loop.duration()
+    1152
+    >>> print format(Repetition([Note('c', '', '8'), Note('d')], 3, True))
+    \repeat unfold 3 {
+      c8 d
+    }
+    >>> print format(Container([Note('e')]) * 2)
+    {
+      e e
+    }
+"""
+from itertools import chain, repeat
+from lilyflower.container import Container
+from lilyflower.errors import InvalidArgument
+from lilyflower.events import changing, notify
+from lilyflower.midi import RESOLUTION, ticks
+from lilyflower.tools import format_pieces, get_indent_level
+from lilyflower.view import View
+
+
+class Repetition(Container):
+
+    r"""
+    Content repeated a number of times, without copies.
+
+    Usage::
+
+        Repetition(content, count, unfold=False)
+
+    Parameters
+    ==========
+    content: list, lilyflower objects
+        the body that is repeated
+    count: int
+        how many times the body is played
+    unfold: bool, optional
+        write ``\repeat unfold count { body }`` instead of the body
+        count times
+
+    Raises
+    ======
+    InvalidArgument:
+        if count is not an int of at least 0
+    """
+
+    _state = Container._state + ('_count', '_unfold')
+    _count = 1
+    _unfold = False
+
+    def __init__(self, content, count, unfold=False):
+        """Store body and count."""
+        if not isinstance(count, (int, long)) or count < 0:
+            raise InvalidArgument(
+                "Repeat count should be an int >= 0, not %r." % (count,))
+        Container.__init__(self, content)
+        self._count = count
+        self._unfold = unfold
+
+    @property
+    def repeats(self):
+        """Number of times the body is played."""
+        return self._count
+
+    def body(self):
+        """Return the repeated content as a list."""
+        return list(self._container)
+
+    def _body_index(self, index):
+        """Convert an index into the expanded content to one into body."""
+        length = len(self)
+        if index < 0:
+            index += length
+        if not 0 <= index < length:
+            raise IndexError("repetition index out of range")
+        return index % len(self._container)
+
+    def __iter__(self):
+        """Iterate over the expanded content."""
+        return chain.from_iterable(repeat(self._container, self._count))
+
+    def __reversed__(self):
+        """Iterate over the expanded content backwards."""
+        return chain.from_iterable(
+            reversed(self._container) for _ in repeat(None, self._count))
+
+    def __len__(self):
+        """Return length of the expanded content."""
+        return len(self._container) * self._count
+
+    def __getitem__(self, index):
+        """Return item at index in the expanded content, or a view."""
+        if isinstance(index, slice):
+            return View(self, index.start, index.stop, index.step)
+        return self._container[self._body_index(index)]
+
+    def __setitem__(self, index, value):
+        """Set item at index, which sets it in every repeat."""
+        if isinstance(index, slice):
+            raise TypeError("can't assign to a slice of a repetition")
+        index = self._body_index(index)
+        if self._observers is None:
+            self._container[index] = value
+        else:
+            with changing(self, 'setitem', self._container, index):
+                self._container[index] = value
+
+    def __delitem__(self, index):
+        """Delete item at index, which deletes it from every repeat."""
+        if isinstance(index, slice):
+            raise TypeError("can't delete a slice of a repetition")
+        index = self._body_index(index)
+        if self._observers is None:
+            del self._container[index]
+        else:
+            with changing(self, 'delitem', self._container, index):
+                del self._container[index]
+
+    def count(self, value):
+        """Count occurances of value in the expanded content."""
+        return self._container.count(value) * self._count
+
+    def duration(self, resolution=RESOLUTION):
+        """
+        Return how long the expanded content plays, in midi ticks.
+
+        Durations are inherited like in lilypond, starting from a
+        quarter note, with resolution ticks per quarter note, see
+        `lilyflower.midi.ticks`.
+        """
+        return ticks(Container(self._container), resolution, self._count)
+
+    def __format__(self, format_spec):
+        """Return lilypond code."""
+        return format_pieces(self._iter_format(get_indent_level(format_spec)))
+
+    def _iter_format(self, indent_level):
+        """Generate lilypond code in pieces, see `Container._iter_format`."""
+        if self._unfold:
+            return chain(
+                ["\\repeat unfold %d " % self._count],
+                self._iter_items(
+                    indent_level, self._container, len(self._container)))
+        return self._iter_items(indent_level, iter(self), len(self))
+
+    def __imul__(self, other):
+        """Multiply the count in place."""
+        if not isinstance(other, int):
+            raise TypeError
+        old = self._count
+        self._count *= other
+        if self._observers is not None:
+            notify(self, 'imul', 'repeats', old, self._count)
+        return self
+
+    def __mul__(self, other):
+        """Return a repetition of the same body, count times other."""
+        if not isinstance(other, int):
+            raise TypeError
+        return Repetition(self._container, self._count * other, self._unfold)
@@ -0,0 +1,342 @@
+r"""
+Retrograde: music played backwards, as a new tree.
+
+`Container.reverse` and `Node.reverse` only flip the order of content,
+which gets the notes right but not what connects them. `retrograde`
+builds a reversed copy of a tree in a single pass, and fixes up:
+
+ties
+    a tie goes from a tone to the next one, so in the retrograde every
+    tone is tied when the tone before it used to be
+spanners
+    slurs, beams and other spanners open and close by the order they
+    are formatted in, so spanners attached to tones are right as they
+    are. Spanners that are items of their own stay behind the tone
+    they followed.
+hairpins
+    a crescendo becomes a decrescendo and the other way around. The
+    dynamic a hairpin ended on moves to where it starts now, and a
+    dynamic where it started becomes its new end.
+grace notes
+    ``\grace`` (and the other grace commands) leads into the next tone,
+    so it turns into an ``\afterGrace`` of that tone, and back.
+durations
+    durations that tones inherited are written out wherever the tone
+    now follows a different duration
+
+Simultaneous music (`Parallel`) keeps its order, every part of it is
+reversed on its own. Containers that are not music, like scores,
+headers and markup, also keep their order. Relative octaves are not
+recomputed, so music in ``\relative`` may need its octaves checked.
+
+The original tree is not changed. Tones, commands and spanners are
+copied, scheme data is shared.
+
+Examples
+========
+.. testsetup::
+
+    from lilyflower.retrograde import retrograde
+    from lilyflower.container import Container
+    from lilyflower.dynamics import Crescendo, Forte, Piano
+    from lilyflower.spanners import Slur
+    from lilyflower.tones import Note
+
+.. doctest::
+
+    >>> slur = Slur()
+    >>> hairpin = Crescendo(Forte())
+    >>> music = Container([
+    ...     Note('c', '', '4', tie=True, note_commands=[Piano(), hairpin]),
+    ...     Note('c', spanners=[slur]),
+    ...     Note('d', '', '8'),
+    ...     Note('e', '', '2', note_commands=[hairpin], spanners=[slur])])
+    >>> print format(music)
+    {
+      c4~\p\< c( d8 e2\f)
+    }
+    >>> print format(retrograde(music))
+    {
+      e2\f\>( d8 c4~) c4\p
+    }
+"""
+from collections import OrderedDict
+from lilyflower import containers, dom
+from lilyflower.container import Container
+from lilyflower.dynamics import Crescendo, Decrescendo, Dynamic
+from lilyflower.node import Node
+from lilyflower.notecommands import NoteCommand
+from lilyflower.pickling import CompactPickle
+from lilyflower.repetition import Repetition
+from lilyflower.schemedata import SchemeData
+from lilyflower.spanners import Spanner
+from lilyflower.tones import Chord, Note, Rest
+from lilyflower.tools import collection_paused, shallow_copy
+
+# containers that keep the order of their content
+_KEEP_ORDER = (
+    containers.LilyFile,
+    containers.Book,
+    containers.BookPart,
+    containers.Score,
+    containers.Header,
+    containers.Layout,
+    containers.Midi,
+    containers.Paper,
+    containers.With,
+    containers.Markup,
+    containers.Parallel)
+_GRACES = (dom.Grace, dom.Acciaccatura, dom.Appoggiatura, dom.SlashedGrace)
+_OPPOSITE = {Crescendo: Decrescendo, Decrescendo: Crescendo}
+
+
+def retrograde(music, pause_gc=False):
+    """
+    Return a copy of music, reversed.
+
+    See the module documentation for what that involves. With pause_gc,
+    garbage collection is turned off meanwhile, which makes big trees
+    faster, see `lilyflower.tools.collection_paused`.
+    """
+    with collection_paused(pause_gc):
+        return _Retrograde().music(music)
+
+
+class _Retrograde(object):
+
+    """State of a single retrograde."""
+
+    def __init__(self):
+        """Start like lilypond does, with quarter notes."""
+        # id of an original spanner or hairpin -> its copy
+        self.memo = {}
+        # lexically inherited duration, like the lilypond parser has it
+        self.duration = "4"
+        # tie of the previous tone, per voice
+        self.ties = [False]
+        # id of a new tone -> duration it had in the original
+        self.effective = {}
+
+    def music(self, item):
+        """Return the retrograde of a single item."""
+        # pylint: disable=protected-access
+        if isinstance(item, Container):
+            return self.container(item)
+        elif isinstance(item, dom.AfterGrace):
+            return self.after_grace(item)
+        elif isinstance(item, Node):
+            return self.node(item)
+        elif isinstance(item, (Note, Rest, Chord)):
+            return self.tone(item)
+        elif isinstance(item, Spanner):
+            return self.spanner(item)
+        elif isinstance(item, NoteCommand):
+            commands = self.commands([item])
+            if len(commands) == 1:
+                return commands[0]
+            return Container(commands)
+        elif isinstance(item, SchemeData) or \
+                not isinstance(item, CompactPickle):
+            return item
+        return shallow_copy(item)
+
+    def voice(self, item):
+        """Return the retrograde of item, which has ties of its own."""
+        self.ties.append(False)
+        try:
+            return self.music(item)
+        finally:
+            self.ties.pop()
+
+    def container(self, item):
+        """Return the retrograde of an old style container."""
+        # pylint: disable=protected-access
+        new = shallow_copy(item)
+        if isinstance(item, containers.Parallel):
+            new._container = [self.voice(child) for child in item._container]
+            self.ties[-1] = False
+            for child in new._container:
+                self.explicit([child])
+        elif isinstance(item, Repetition):
+            self.ties.append(False)
+            new._container = self.sequence(item._container, True)
+            self.ties.pop()
+        else:
+            new._container = self.sequence(
+                item._container, not isinstance(item, _KEEP_ORDER))
+        new._arguments = list(item._arguments)
+        if item._validated_arguments is not None:
+            new._validated_arguments = list(item._validated_arguments)
+        return new
+
+    def node(self, item):
+        """Return the retrograde of a node."""
+        # pylint: disable=protected-access
+        new = shallow_copy(item)
+        if item._stored_arguments is not None:
+            new._stored_arguments = OrderedDict(item._stored_arguments)
+        if item._allowed_content is None:
+            return new
+        if isinstance(item, _GRACES):
+            self.ties.append(False)
+            new._content = self.sequence(item._content, True)
+            self.ties.pop()
+        else:
+            new._content = self.sequence(
+                item._content,
+                'music' in item._types and 'music' in item._allowed_content)
+        return new
+
+    def after_grace(self, item):
+        """Return an afterGrace with both its parts reversed."""
+        # pylint: disable=protected-access
+        new = shallow_copy(item)
+        arguments = new._stored_arguments = OrderedDict(
+            item._stored_arguments)
+        arguments['main_music'] = self.music(arguments['main_music'])
+        arguments['grace'] = self.voice(arguments['grace'])
+        return new
+
+    def tone(self, item):
+        """Return a copy of a tone, tied when its predecessor was."""
+        # pylint: disable=protected-access
+        new = shallow_copy(item)
+        if item._duration:
+            self.duration = item._duration
+        self.effective[id(new)] = self.duration
+        if isinstance(item, Rest):
+            self.ties[-1] = False
+        else:
+            new._tie = self.ties[-1]
+            self.ties[-1] = item._tie
+            if item._spanners is not None:
+                new._spanners = [
+                    self.spanner(spanner) for spanner in item._spanners]
+        if isinstance(item, Chord):
+            new._pitches = [shallow_copy(pitch) for pitch in item._pitches]
+        if item._note_commands is not None:
+            new._note_commands = self.commands(item._note_commands)
+        return new
+
+    def spanner(self, spanner):
+        """Return the copy of a spanner, the same one every time."""
+        new = self.memo.get(id(spanner))
+        if new is None:
+            new = self.memo[id(spanner)] = shallow_copy(spanner)
+            new._num_displays = 0  # pylint: disable=protected-access
+        return new
+
+    def commands(self, commands):
+        """Return copies of the note commands on a tone."""
+        # a dynamic where a hairpin starts becomes the end of the new one
+        start = None
+        if any(isinstance(command, Crescendo) and id(command) not in self.memo
+               for command in commands):
+            for command in commands:
+                if isinstance(command, Dynamic) and \
+                        not isinstance(command, Crescendo):
+                    start = command
+        result = []
+        for command in commands:
+            if command is start:
+                continue
+            elif isinstance(command, Crescendo):
+                result.extend(self.hairpin(command, start))
+            else:
+                result.append(shallow_copy(command))
+        return result
+
+    def hairpin(self, hairpin, start):
+        """Return note commands for the copy of a hairpin."""
+        # pylint: disable=protected-access
+        new = self.memo.get(id(hairpin))
+        if new is None:
+            # it started here, so this is where it ends now
+            new = self.memo[id(hairpin)] = shallow_copy(hairpin)
+            new.__class__ = _OPPOSITE.get(type(hairpin), type(hairpin))
+            new._num_displays = 0
+            if start is None:
+                new.__dict__.pop('_close', None)
+                new._arguments = ()
+            else:
+                new._close = shallow_copy(start)
+                new._arguments = (new._close,)
+            return [new]
+        # it ended here, so it starts here, from the dynamic it ended on
+        if isinstance(hairpin._close, Dynamic):
+            return [shallow_copy(hairpin._close), new]
+        return [new]
+
+    def sequence(self, items, reverse):
+        """Return the retrograde of content, reversed if reverse."""
+        # units of (grace notes before, item, attachments after)
+        units = []
+        graces = []
+        for item in items:
+            if isinstance(item, (Spanner, NoteCommand)):
+                if isinstance(item, Spanner):
+                    attachments = [self.spanner(item)]
+                else:
+                    attachments = self.commands([item])
+                if graces:
+                    graces.extend(attachments)
+                elif units:
+                    units[-1][2].extend(attachments)
+                else:
+                    units.append(([], None, attachments))
+            elif reverse and isinstance(item, _GRACES):
+                graces.append(self.music(item))
+            else:
+                units.append((graces, self.music(item), []))
+                graces = []
+        if graces:
+            units.append((graces, None, []))
+        result = []
+        if not reverse:
+            for graces, item, attachments in units:
+                result.extend(graces)
+                if item is not None:
+                    result.append(item)
+                result.extend(attachments)
+            self.explicit(result)
+            return result
+        for graces, item, attachments in reversed(units):
+            if item is None:
+                result.extend(reversed(graces))
+            elif graces:
+                # grace notes that led into item now follow it
+                music = []
+                for grace in reversed(graces):
+                    # pylint: disable=protected-access
+                    music.extend(grace._content if isinstance(
+                        grace, _GRACES) else [grace])
+                result.append(dom.AfterGrace(item, Container(music)))
+            elif isinstance(item, dom.AfterGrace):
+                # pylint: disable=protected-access
+                arguments = item._stored_arguments
+                grace = arguments['grace']
+                if type(grace) is Container:
+                    grace = list(grace._container)
+                else:
+                    grace = [grace]
+                result.append(dom.Grace(grace))
+                result.append(arguments['main_music'])
+            else:
+                result.append(item)
+            result.extend(attachments)
+        self.explicit(result)
+        return result
+
+    def explicit(self, items):
+        """Write out durations that would be inherited wrongly now."""
+        # pylint: disable=protected-access
+        previous = None
+        for item in items:
+            duration = self.effective.get(id(item))
+            if duration is None:
+                if not isinstance(item, (Spanner, NoteCommand)):
+                    previous = None
+                continue
+            if item._duration == "" and duration != previous:
+                item._duration = duration
+            previous = duration
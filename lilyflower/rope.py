@@ -0,0 +1,425 @@
+r"""
+Chunked storage for very long content.
+
+Content of a `Node` or `Container` is a plain list, so inserting or
+deleting near the start of a voice with hundreds of thousands of items
+moves all the items after it. A `Rope` is a list-like sequence that
+keeps its items in chunks of about `CHUNK_SIZE`, with the chunk lengths
+in a binary indexed tree. Finding, inserting and deleting an item by
+index takes O(log n) time, plus the size of a single chunk.
+
+`chunk_content` switches an existing node or container over to a rope.
+Everything keeps working through the usual list methods, and trees
+with ropes format, pickle and snapshot like any other tree.
+
+`Rope.total` sums a measure over all items, with the sum for every
+chunk cached until that chunk changes. `is_inline` is such a measure,
+any function that maps an item to a number will do.
+
+Examples
+========
+.. testsetup::
+
+    from lilyflower.rope import Rope, chunk_content, is_inline
+    from lilyflower.container import Container
+    from lilyflower.spanners import Slur
+    from lilyflower.tones import Note
+
+.. doctest::
+
+    >>> rope = Rope(range(10), chunk_size=4)
+    >>> rope.insert(0, -1)
+    >>> del rope[5]
+    >>> rope[4], len(rope)
+    (3, 10)
+    >>> list(rope)
+    [-1, 0, 1, 2, 3, 5, 6, 7, 8, 9]
+    >>> slur = Slur()
+    >>> voice = chunk_content(Container([Note('c'), slur, Note('d')]))
+    >>> voice.insert(0, slur)
+    >>> voice.append(Container([Note('e'), Note('f')]))
+    >>> voice._container.total(is_inline)
+    4
+    >>> print format(voice)
+    {
+      ( c ) d
+      {
+        e f
+      }
+    }
+"""
+from itertools import chain, izip
+from lilyflower.pickling import CompactPickle
+
+CHUNK_SIZE = 512
+
+
+def is_inline(item):
+    """Measure for `Rope.total`, 1 for inline items and 0 otherwise."""
+    return 1 if item._inline else 0  # pylint: disable=protected-access
+
+
+def chunk_content(obj, chunk_size=CHUNK_SIZE):
+    """
+    Store the content of a node or container in a `Rope`.
+
+    Only obj itself is changed, not its children. Returns obj.
+    """
+    name = '_container' if hasattr(obj, '_container') else '_content'
+    content = getattr(obj, name)
+    if content is None:
+        raise ValueError("%r has no content" % obj)
+    if type(content) is not Rope:
+        setattr(obj, name, Rope(content, chunk_size))
+    return obj
+
+
+class Rope(CompactPickle):
+
+    """
+    List-like sequence stored in chunks.
+
+    Usage::
+
+        Rope(items=(), chunk_size=CHUNK_SIZE)
+
+    Supports the list methods and operators that lilyflower uses on
+    content. Slices read as lists, and only read the chunks they cover.
+    Assigning or deleting slices, sorting and reversing rebuild the
+    whole rope, like they would copy a list.
+
+    Parameters
+    ==========
+    items: iterable, optional
+        initial items
+    chunk_size: int, optional
+        chunks are split when they grow past twice this, and merged
+        with a neighbour when they shrink below a quarter of it
+    """
+
+    _state = ('_chunks', '_chunk_size')
+    _transient = ('_tree', '_subtotals')
+    _chunk_size = CHUNK_SIZE
+    # binary indexed tree of chunk lengths, rebuilt when chunks are
+    # split or merged, None until needed
+    _tree = None
+    # measure -> cached total per chunk, None for chunks that changed
+    _subtotals = None
+
+    def __init__(self, items=(), chunk_size=CHUNK_SIZE):
+        """Fill chunks with items."""
+        if chunk_size < 2:
+            raise ValueError("chunk_size should be at least 2")
+        self._chunk_size = chunk_size
+        self._fill(items)
+
+    def _fill(self, items):
+        """Replace all items."""
+        items = list(items)
+        size = self._chunk_size
+        self._chunks = [
+            items[start:start + size]
+            for start in xrange(0, len(items), size)]
+        self._tree = None
+        self._subtotals = None
+
+    def _build(self):
+        """Build the binary indexed tree of chunk lengths."""
+        tree = [0]
+        tree.extend(len(chunk) for chunk in self._chunks)
+        size = len(tree)
+        for index in xrange(1, size):
+            parent = index + (index & -index)
+            if parent < size:
+                tree[parent] += tree[index]
+        self._tree = tree
+        return tree
+
+    def _changed(self, number, difference):
+        """Update the length of chunk number, and forget its subtotals."""
+        tree = self._tree
+        if tree is not None:
+            index = number + 1
+            size = len(tree)
+            while index < size:
+                tree[index] += difference
+                index += index & -index
+        if self._subtotals:
+            for values in self._subtotals.itervalues():
+                values[number] = None
+
+    def _restructured(self):
+        """Forget everything that depends on the chunk boundaries."""
+        self._tree = None
+        self._subtotals = None
+
+    def _locate(self, index):
+        """Return (chunk number, offset) of item index, which must exist."""
+        tree = self._tree
+        if tree is None:
+            tree = self._build()
+        size = len(tree)
+        number = 0
+        bit = 1 << (size.bit_length() - 1)
+        while bit:
+            step = number + bit
+            if step < size and tree[step] <= index:
+                number = step
+                index -= tree[step]
+            bit >>= 1
+        return number, index
+
+    def _index(self, index):
+        """Return index as a non-negative index of an existing item."""
+        length = len(self)
+        if index < 0:
+            index += length
+        if not 0 <= index < length:
+            raise IndexError("rope index out of range")
+        return index
+
+    def _balance(self, number):
+        """Split or merge chunk number if it got too large or small."""
+        chunk = self._chunks[number]
+        if len(chunk) > 2 * self._chunk_size:
+            half = len(chunk) // 2
+            self._chunks[number:number + 1] = [chunk[:half], chunk[half:]]
+            self._restructured()
+        elif len(chunk) < max(self._chunk_size // 4, 1) and \
+                len(self._chunks) > 1:
+            if number + 1 < len(self._chunks):
+                chunk.extend(self._chunks.pop(number + 1))
+            else:
+                self._chunks[number - 1].extend(chunk)
+                del self._chunks[number]
+                number -= 1
+            self._restructured()
+            self._balance(number)
+
+    def __len__(self):
+        """Return number of items."""
+        tree = self._tree
+        if tree is None:
+            tree = self._build()
+        # the root of a binary indexed tree covers everything below the
+        # highest power of two, add the rest
+        length = 0
+        index = len(tree) - 1
+        while index:
+            length += tree[index]
+            index -= index & -index
+        return length
+
+    def __iter__(self):
+        """Iterate over items."""
+        return chain.from_iterable(self._chunks)
+
+    def __reversed__(self):
+        """Iterate over items backwards."""
+        for chunk in reversed(self._chunks):
+            for item in reversed(chunk):
+                yield item
+
+    def __contains__(self, value):
+        """See if value is one of the items."""
+        return any(value in chunk for chunk in self._chunks)
+
+    def _range(self, start, stop):
+        """Return a list of the items from start up to stop."""
+        result = []
+        if start >= stop:
+            return result
+        number, offset = self._locate(start)
+        needed = stop - start
+        while needed:
+            part = self._chunks[number][offset:offset + needed]
+            result.extend(part)
+            needed -= len(part)
+            number += 1
+            offset = 0
+        return result
+
+    def __getitem__(self, index):
+        """Return item at index, or a list for a slice."""
+        if isinstance(index, slice):
+            start, stop, step = index.indices(len(self))
+            if step > 0:
+                return self._range(start, stop)[::step]
+            count = len(xrange(start, stop, step))
+            # read the items covered from the other end, start is last
+            return self._range(start + (count - 1) * step, start + 1)[::step]
+        number, offset = self._locate(self._index(index))
+        return self._chunks[number][offset]
+
+    def __setitem__(self, index, value):
+        """Replace item at index, or a slice."""
+        if isinstance(index, slice):
+            items = list(self)
+            items[index] = value
+            self._fill(items)
+            return
+        number, offset = self._locate(self._index(index))
+        self._chunks[number][offset] = value
+        self._changed(number, 0)
+
+    def __delitem__(self, index):
+        """Delete item at index, or a slice."""
+        if isinstance(index, slice):
+            items = list(self)
+            del items[index]
+            self._fill(items)
+            return
+        number, offset = self._locate(self._index(index))
+        del self._chunks[number][offset]
+        self._changed(number, -1)
+        self._balance(number)
+
+    def __eq__(self, other):
+        """Compare items with another rope or a list."""
+        if isinstance(other, (Rope, list)):
+            return len(self) == len(other) and all(
+                mine == theirs for mine, theirs in izip(self, other))
+        return NotImplemented
+
+    def __ne__(self, other):
+        """Compare items with another rope or a list."""
+        equal = self.__eq__(other)
+        return equal if equal is NotImplemented else not equal
+
+    __hash__ = None
+
+    def __add__(self, other):
+        """Return a list with the items of self and other."""
+        return list(self) + list(other)
+
+    def __radd__(self, other):
+        """Return a list with the items of other and self."""
+        return list(other) + list(self)
+
+    def __iadd__(self, other):
+        """Extend with other."""
+        self.extend(other)
+        return self
+
+    def __mul__(self, other):
+        """Return a list with the items repeated other times."""
+        return list(self) * other
+
+    def __rmul__(self, other):
+        """Return a list with the items repeated other times."""
+        return list(self) * other
+
+    def __imul__(self, other):
+        """Repeat the items other times, in place."""
+        if not isinstance(other, (int, long)):
+            raise TypeError(
+                "can't multiply rope by non-int of type %r" %
+                type(other).__name__)
+        if other <= 0:
+            self._fill(())
+        else:
+            items = list(self)
+            for _ in xrange(other - 1):
+                self.extend(items)
+        return self
+
+    def __repr__(self):
+        """Show items like a list."""
+        return "Rope(%r)" % list(self)
+
+    def append(self, value):
+        """Add value to the end."""
+        if not self._chunks:
+            self._chunks.append([value])
+            self._restructured()
+            return
+        number = len(self._chunks) - 1
+        self._chunks[number].append(value)
+        self._changed(number, 1)
+        self._balance(number)
+
+    def extend(self, extension):
+        """Add all items of extension to the end."""
+        items = list(extension)
+        if self._chunks:
+            # fill up the last chunk first
+            last = self._chunks[-1]
+            room = max(self._chunk_size - len(last), 0)
+            last.extend(items[:room])
+            items = items[room:]
+        size = self._chunk_size
+        self._chunks.extend(
+            items[start:start + size] for start in xrange(0, len(items), size))
+        self._restructured()
+
+    def insert(self, index, value):
+        """Insert value before index."""
+        length = len(self)
+        if index < 0:
+            index = max(index + length, 0)
+        if index >= length:
+            self.append(value)
+            return
+        number, offset = self._locate(index)
+        self._chunks[number].insert(offset, value)
+        self._changed(number, 1)
+        self._balance(number)
+
+    def pop(self, index=-1):
+        """Remove and return item at index, the last one by default."""
+        if not self._chunks:
+            raise IndexError("pop from empty rope")
+        value = self[index]
+        del self[index]
+        return value
+
+    def remove(self, value):
+        """Remove first occurance of value."""
+        del self[self.index(value)]
+
+    def index(self, value):
+        """Find index of value."""
+        start = 0
+        for chunk in self._chunks:
+            if value in chunk:
+                return start + chunk.index(value)
+            start += len(chunk)
+        raise ValueError("%r is not in rope" % (value,))
+
+    def count(self, value):
+        """Count occurances of value."""
+        return sum(chunk.count(value) for chunk in self._chunks)
+
+    def reverse(self):
+        """Reverse order of the items."""
+        self._chunks.reverse()
+        for chunk in self._chunks:
+            chunk.reverse()
+        self._restructured()
+
+    def sort(self, cmp=None, key=None, reverse=False):
+        """Sort items."""
+        items = list(self)
+        items.sort(cmp, key, reverse)
+        self._fill(items)
+
+    def total(self, measure):
+        """
+        Return the sum of measure(item) over all items.
+
+        Sums per chunk are cached, so after a change only the chunks
+        that changed are measured again. Pass the same function every
+        time, the cache is kept per function.
+        """
+        if self._subtotals is None:
+            self._subtotals = {}
+        values = self._subtotals.get(measure)
+        if values is None:
+            values = self._subtotals[measure] = [None] * len(self._chunks)
+        result = 0
+        for number, value in enumerate(values):
+            if value is None:
+                value = values[number] = sum(
+                    measure(item) for item in self._chunks[number])
+            result += value
+        return result
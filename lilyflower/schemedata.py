@@ -1,11 +1,335 @@
-"""Scheme datatypes."""
+r"""
+Scheme datatypes.
+
+Scheme data is immutable, and values other than pairs and lists are
+interned: asking for the same value twice gives the same object, so the
+thousands of identical colors, directions and numbers in a markup heavy
+score are validated and formatted only once. Lilypond code is cached on
+the object the first time it is needed.
+
+Pairs and lists are formatted by recursion up to `_RECURSION_DEPTH`
+levels, which is fastest, and without recursion below that, so even
+very deeply nested ones are no problem. A streaming writer gets the
+pieces instead (see `lilyflower.writer`). `to_scheme` converts plain
+python values, nested lists and tuples included, in one go.
+
+Examples
+========
+.. testsetup::
+
+    from lilyflower.schemedata import Color, SignedInt
+
+.. doctest::
+
+    >>> Color('snow4') is Color('snow4')
+    True
+    >>> SignedInt(1) is SignedInt(1)
+    True
+"""
 # pylint: disable=super-init-not-called
 import collections
 import re
+from weakref import ref
 from lilyflower.errors import InvalidArgument
+from lilyflower.pickling import CompactPickle
+
+_DIRECTIONS = {
+    'up': 'UP', 'Up': 'UP', 'UP': 'UP',
+    'down': 'DOWN', 'Down': 'DOWN', 'DOWN': 'DOWN',
+    'center': 'CENTER', 'Center': 'CENTER', 'CENTER': 'CENTER'}
+_AXES = {'x': 'X', 'X': 'X', 'y': 'Y', 'Y': 'Y'}
+_SYMBOL = re.compile(r"^[a-zA-Z][a-zA-Z:_\-0-9]*$")
+_PROCEDURE = re.compile(r"^\(.*\)$", re.DOTALL)
+_GREY = re.compile("^grey[0-9]+$")
+
+_NORMAL_COLORS = frozenset([
+    'black',
+    'blue',
+    'grey',
+    'darkcyan',
+    'white',
+    'cyan',
+    'darkred',
+    'darkmagenta',
+    'red',
+    'magenta',
+    'darkgreen',
+    'darkyellow',
+    'green',
+    'yellow',
+    'darkblue'])
+
+_NUMBERED_COLORS = (
+    'snow', 'seashell', 'AntiqueWhite', 'bisque', 'PeachPuff',
+    'NavajoWhite', 'LemonChiffon', 'cornsilk', 'ivory', 'honeydew',
+    'LavenderBlush', 'MistyRose', 'azure', 'SlateBlue', 'RoyalBlue',
+    'blue', 'DodgerBlue', 'SteelBlue', 'DeepSkyBlue', 'SkyBlue',
+    'LightSkyBlue', 'LightSteelBlue', 'LightBlue', 'LightCyan',
+    'CadetBlue', 'turquoise', 'cyan', 'aquamarine', 'DarkSeaGreen',
+    'SeaGreen', 'PaleGreen', 'SpringGreen', 'green', 'chartreuse',
+    'OliveDrab', 'DarkOliveGreen', 'khaki', 'LightGoldenrod',
+    'yellow', 'gold', 'goldenrod', 'DarkGoldenrod', 'RosyBrown',
+    'IndianRed', 'sienna', 'burlywood', 'wheat', 'tan',
+    'chocolate', 'firebrick', 'brown', 'salmon', 'LightSalmon',
+    'orange', 'DarkOrange', 'coral', 'tomato', 'OrangeRed',
+    'red', 'DeepPink', 'HotPink', 'pink', 'LightPink',
+    'PaleVioletRed', 'maroon', 'VioletRed', 'magenta', 'orchid',
+    'plum', 'MediumOrchid', 'DarkOrchid', 'purple',
+    'MediumPurple', 'thistle', 'LightYellow', 'PaleTurquoise')
+
+_X11_COLORS = frozenset([
+    'snow',
+    'GhostWhite', 'ghost white',
+    'WhiteSmoke', 'white smoke',
+    'gainsboro',
+    'FloralWhite', 'floral white',
+    'OldLace', 'old lace',
+    'linen',
+    'AntiqueWhite', 'antique white',
+    'PapayaWhip', 'papaya whip',
+    'BlanchedAlmond', 'blanched almond',
+    'bisque',
+    'PeachPuff', 'peach puff',
+    'NavajoWhite', 'navajo white',
+    'moccasin',
+    'cornsilk',
+    'ivory',
+    'LemonChiffon', 'lemon chiffon',
+    'seashell',
+    'honeydew',
+    'MintCream', 'mint cream',
+    'azure',
+    'AliceBlue', 'alice blue',
+    'lavender',
+    'LavenderBlush', 'lavender blush',
+    'MistyRose', 'misty rose',
+    'white',
+    'black',
+    'DarkSlateGrey', 'dark slate grey',
+    'DimGrey', 'dim grey',
+    'SlateGrey', 'slate grey',
+    'LightSlateGrey', 'light slate grey',
+    'grey',
+    'LightGrey', 'light grey',
+    'MidnightBlue', 'midnight blue',
+    'navy',
+    'NavyBlue', 'navy blue',
+    'CornflowerBlue', 'cornflower blue',
+    'DarkSlateBlue', 'dark slate blue',
+    'SlateBlue', 'slate blue',
+    'MediumSlateBlue', 'medium slate blue',
+    'LightSlateBlue', 'light slate blue',
+    'MediumBlue', 'medium blue',
+    'RoyalBlue', 'royal blue',
+    'blue',
+    'DodgerBlue', 'dodger blue',
+    'DeepSkyBlue', 'deep sky blue',
+    'SkyBlue', 'sky blue',
+    'LightSkyBlue', 'light sky blue',
+    'SteelBlue', 'steel blue',
+    'LightSteelBlue', 'light steel blue',
+    'LightBlue', 'light blue',
+    'PowderBlue', 'powder blue',
+    'PaleTurquoise', 'pale turquoise',
+    'DarkTurquoise', 'dark turquoise',
+    'MediumTurquoise', 'medium turquoise',
+    'turquoise',
+    'cyan',
+    'LightCyan', 'light cyan',
+    'CadetBlue', 'cadet blue',
+    'MediumAquamarine', 'medium aquamarine',
+    'aquamarine',
+    'DarkGreen', 'dark green',
+    'DarkOliveGreen', 'dark olive green',
+    'DarkSeaGreen', 'dark sea green',
+    'SeaGreen', 'sea green',
+    'MediumSeaGreen', 'medium sea green',
+    'LightSeaGreen', 'light sea green',
+    'PaleGreen', 'pale green',
+    'SpringGreen', 'spring green',
+    'LawnGreen', 'lawn green',
+    'green',
+    'chartreuse',
+    'MediumSpringGreen', 'medium spring green',
+    'GreenYellow', 'green yellow',
+    'LimeGreen', 'lime green',
+    'YellowGreen', 'yellow green',
+    'ForestGreen', 'forest green',
+    'OliveDrab', 'olive drab',
+    'DarkKhaki', 'dark khaki',
+    'khaki',
+    'PaleGoldenrod', 'pale goldenrod',
+    'LightGoldenrodYellow', 'light goldenrod yellow',
+    'LightYellow', 'light yellow',
+    'yellow',
+    'gold',
+    'LightGoldenrod', 'light goldenrod',
+    'goldenrod',
+    'DarkGoldenrod', 'dark goldenrod',
+    'RosyBrown', 'rosy brown',
+    'IndianRed', 'indian red',
+    'SaddleBrown', 'saddle brown',
+    'sienna',
+    'peru',
+    'burlywood',
+    'beige',
+    'wheat',
+    'SandyBrown', 'sandy brown',
+    'tan',
+    'chocolate',
+    'firebrick',
+    'brown',
+    'DarkSalmon', 'dark salmon',
+    'salmon',
+    'LightSalmon', 'light salmon',
+    'orange',
+    'DarkOrange', 'dark orange',
+    'coral',
+    'LightCoral', 'light coral',
+    'tomato',
+    'OrangeRed', 'orange red',
+    'red',
+    'HotPink', 'hot pink',
+    'DeepPink', 'deep pink',
+    'pink',
+    'LightPink', 'light pink',
+    'PaleVioletRed', 'pale violet red',
+    'maroon',
+    'MediumVioletRed', 'medium violet red',
+    'VioletRed', 'violet red',
+    'magenta',
+    'violet',
+    'plum',
+    'orchid',
+    'MediumOrchid', 'medium orchid',
+    'DarkOrchid', 'dark orchid',
+    'DarkViolet', 'dark violet',
+    'BlueViolet', 'blue violet',
+    'purple',
+    'MediumPurple', 'medium purple',
+    'thistle',
+    'DarkGrey', 'dark grey',
+    'DarkBlue', 'dark blue',
+    'DarkCyan', 'dark cyan',
+    'DarkMagenta', 'dark magenta',
+    'DarkRed', 'dark red',
+    'LightGreen', 'light green'] + [
+    name + str(number)
+    for name in _NUMBERED_COLORS for number in range(1, 5)])
+
+# number of pieces joined before compound data is streamed
+_CHUNK = 4096
+# levels of compound data formatted by recursion, deeper nesting uses a
+# stack, so python's recursion limit is never hit
+_RECURSION_DEPTH = 100
+
+# (class, type of data, data) -> weak reference to the object
+_INTERNED = {}
+# drop dead references when there are this many
+_purge_at = 1024
+
+
+class _Interned(type):
+
+    """Metaclass that returns the existing object for a value."""
+
+    def __call__(cls, *args, **kwargs):
+        """Look the value up before creating a new object."""
+        if len(args) != 1 or kwargs:
+            return type.__call__(cls, *args, **kwargs)
+        data = args[0]
+        key = (cls, type(data), data)
+        try:
+            reference = _INTERNED.get(key)
+        except TypeError:
+            # unhashable data can't be interned
+            return type.__call__(cls, data)
+        if reference is not None:
+            obj = reference()
+            if obj is not None:
+                return obj
+        obj = type.__call__(cls, data)
+        _INTERNED[key] = ref(obj)
+        if len(_INTERNED) >= _purge_at:
+            _purge()
+        return obj
+
+
+def _purge():
+    """Drop references to objects that are gone."""
+    global _purge_at  # pylint: disable=global-statement
+    for key in [
+            key for key, reference in _INTERNED.iteritems()
+            if reference() is None]:
+        del _INTERNED[key]
+    _purge_at = max(1024, 2 * len(_INTERNED))
+
+
+class _Compound(_Interned):
+
+    """Metaclass for pairs and lists, which are not interned."""
+
+    __call__ = type.__call__
+
+
+def _recursive_code(obj, depth):
+    """
+    Return the nested code of compound obj, made by recursion.
 
+    Returns None if obj is nested deeper than depth. Code of the items
+    that were done is cached, so the stack based formatting that takes
+    over from there does not do them again.
+    """
+    codes = []
+    append = codes.append
+    for item in obj._data:
+        code = item.__dict__.get('_nested')
+        if code is None:
+            if not item._compound:
+                code = item.nested()
+            else:
+                code = item._flat_code()
+                if code is None:
+                    if depth <= 1:
+                        return None
+                    code = _recursive_code(item, depth - 1)
+                    if code is None:
+                        return None
+                item.__dict__['_nested'] = code
+        append(code)
+    return obj._join(codes)
+
+
+def _iter_nested(obj):
+    """Generate the nested code for obj in chunks, without recursion."""
+    pieces = []
+    append = pieces.append
+    stack = [iter((obj,))]
+    while stack:
+        for item in stack[-1]:
+            if type(item) is str:
+                append(item)
+                continue
+            code = item.__dict__.get('_nested')
+            if code is None:
+                if not item._compound:
+                    code = item.nested()
+                else:
+                    code = item._flat_code()
+                    if code is None:
+                        stack.append(item._parts())
+                        break
+                    item.__dict__['_nested'] = code
+            append(code)
+        else:
+            stack.pop()
+        if len(pieces) >= _CHUNK:
+            yield "".join(pieces)
+            del pieces[:]
+    yield "".join(pieces)
 
-class SchemeData(object):
+
+class SchemeData(CompactPickle):
 
     r"""
     Scheme data.
@@ -22,22 +346,79 @@ class SchemeData(object):
         #5
         >>> print SchemeData(5).nested()
         5
+
+    Scheme data can't be changed:
+
+    .. doctest::
+
+        >>> SchemeData(5)._data = 6
+        Traceback (most recent call last):
+          ...
+        AttributeError: SchemeData is immutable
     """
 
+    __metaclass__ = _Interned
+    _state = ('_data',)
+    _transient = ('_nested', '_code')
     _start_symbol = "#"
+    # between start symbol and nested code
+    _quote = ""
+    # made of other scheme data. Compound classes store a tuple of items
+    # in _data and implement _join, which returns the nested code given
+    # the nested code of every item, _flat_code, which returns the
+    # nested code when no item is compound and None otherwise, and
+    # _parts, which returns an iterator over the strings and items that
+    # make up the code, in order. Deep nesting uses _parts to avoid
+    # recursion.
+    _compound = False
     _inline = True
 
     def __init__(self, data):
         """Convert python data to scheme data."""
         self._data = data
 
+    def __setattr__(self, name, value):
+        """Set attributes until the data is in."""
+        if '_data' in self.__dict__:
+            raise AttributeError("%s is immutable" % type(self).__name__)
+        object.__setattr__(self, name, value)
+
+    def __delattr__(self, name):
+        """Refuse, scheme data is immutable."""
+        raise AttributeError("%s is immutable" % type(self).__name__)
+
     def nested(self):
         """Data for nested use (used by compound SchemeData objects)."""
+        code = self.__dict__.get('_nested')
+        if code is None:
+            code = self.__dict__['_nested'] = self._nested_code()
+        return code
+
+    def _nested_code(self):
+        """Return the code for `nested`, which caches it."""
         return "%r" % self._data
 
     def __format__(self, _):
         """Return lilypond code."""
-        return "%s%r" % (self._start_symbol, self._data)
+        code = self.__dict__.get('_code')
+        if code is None:
+            code = self.__dict__['_code'] = "%s%s%s" % (
+                self._start_symbol, self._quote, self.nested())
+        return code
+
+    def _iter_format(self, _):
+        """
+        Generate lilypond code in pieces.
+
+        Nested compound data that was not formatted before is streamed
+        in chunks, without caching the code.
+        """
+        if self._compound and '_nested' not in self.__dict__:
+            yield "%s%s" % (self._start_symbol, self._quote)
+            for piece in _iter_nested(self):
+                yield piece
+        else:
+            yield format(self)
 
 
 class Boolean(SchemeData):
@@ -68,14 +449,10 @@ class Boolean(SchemeData):
         else:
             self._data = "#f"
 
-    def nested(self):
-        """Data for nested use (used by compound SchemeData objects)."""
+    def _nested_code(self):
+        """Return the code for `nested`, which caches it."""
         return self._data
 
-    def __format__(self, _):
-        """Return lilypond cgde."""
-        return "%s%s" % (self._start_symbol, self._data)
-
 
 class UnsignedInt(SchemeData):
 
@@ -234,23 +611,15 @@ class Direction(SignedFloat):
 
     def __init__(self, data):
         """Check it it's a valid direction."""
-        if data in ["up", "Up", "UP"]:
-            self._data = "UP"
-        elif data in ["down", "Down", "DOWN"]:
-            self._data = "DOWN"
-        elif data in ["center", "Center", "CENTER"]:
-            self._data = "CENTER"
-        else:
+        try:
+            self._data = _DIRECTIONS[data]
+        except (KeyError, TypeError):
             raise InvalidArgument("Expected up, down or center, not %r" % data)
 
-    def nested(self):
-        """Data for nested use (used by compound SchemeData objects)."""
+    def _nested_code(self):
+        """Return the code for `nested`, which caches it."""
         return self._data
 
-    def __format__(self, _):
-        """Return lilypond code."""
-        return "%s%s" % (self._start_symbol, self._data)
-
 
 class Axis(SignedInt):
 
@@ -273,21 +642,15 @@ class Axis(SignedInt):
 
     def __init__(self, data):
         """Check if it's a valid axis."""
-        if data in ["x", "X"]:
-            self._data = "X"
-        elif data in ["y", "Y"]:
-            self._data = "Y"
-        else:
+        try:
+            self._data = _AXES[data]
+        except (KeyError, TypeError):
             raise InvalidArgument("Expected X or Y, not %r" % data)
 
-    def nested(self):
-        """Data for nested use (used by compound SchemeData objects)."""
+    def _nested_code(self):
+        """Return the code for `nested`, which caches it."""
         return self._data
 
-    def __format__(self, _):
-        """Return lilypond code."""
-        return "%s%s" % (self._start_symbol, self._data)
-
 
 class Symbol(SchemeData):
 
@@ -308,20 +671,18 @@ class Symbol(SchemeData):
         header:title
     """
 
+    _quote = "'"
+
     def __init__(self, data):
         """Check if this is a valid field."""
-        if re.match(r"^[a-zA-Z][a-zA-Z:_\-0-9]*$", data) is None:
+        if _SYMBOL.match(data) is None:
             raise InvalidArgument("%r is not a valid symbol" % data)
         self._data = data
 
-    def nested(self):
-        """Data for nested use (used by compound SchemeData objects)."""
+    def _nested_code(self):
+        """Return the code for `nested`, which caches it."""
         return self._data
 
-    def __format__(self, _):
-        """Return lilypond code."""
-        return "%s'%s" % (self._start_symbol, self._data)
-
 
 class Procedure(SchemeData):
 
@@ -350,18 +711,14 @@ class Procedure(SchemeData):
 
     def __init__(self, data):
         """Check if it looks remotely like a scheme procedure."""
-        if re.match(r"^\(.*\)$", data) is None:
+        if _PROCEDURE.match(data) is None:
             raise InvalidArgument("%r does not look like a procedure." % data)
         self._data = data
 
-    def nested(self):
-        """Data for nested use (used by compound SchemeData objects)."""
+    def _nested_code(self):
+        """Return the code for `nested`, which caches it."""
         return self._data
 
-    def __format__(self, _):
-        """Return lilypond code."""
-        return "%s%s" % (self._start_symbol, self._data)
-
 
 class Pair(SchemeData):
 
@@ -383,6 +740,10 @@ class Pair(SchemeData):
         (5 . 0)
     """
 
+    __metaclass__ = _Compound
+    _quote = "'"
+    _compound = True
+
     def __init__(self, data):
         """Make sure it's a sequence of length two."""
         if isinstance(data, basestring) or \
@@ -395,18 +756,44 @@ class Pair(SchemeData):
         elif not isinstance(data[1], SchemeData):
             raise InvalidArgument("%r is not a SchemeData object." % data)
         else:
-            self._data = data
-
-    def nested(self):
-        """Data for nested use (used by compound SchemeData objects)."""
-        return "(%s . %s)" % (self._data[0].nested(), self._data[1].nested())
-
-    def __format__(self, _):
-        """Return lilypond code."""
-        return "%s'(%s . %s)" % (
-            self._start_symbol,
-            self._data[0].nested(),
-            self._data[1].nested())
+            self._data = tuple(data)
+
+    @classmethod
+    def from_python(cls, values):
+        """
+        Make a pair of python values, see `to_scheme`.
+
+        .. doctest::
+
+            >>> print format(Pair.from_python((1, [2.5, 'up'])))
+            #'(1 . (2.5 up))
+        """
+        return cls([to_scheme(value) for value in values])
+
+    def _nested_code(self):
+        """Return the code for `nested`, which caches it."""
+        code = self._flat_code()
+        if code is None:
+            code = _recursive_code(self, _RECURSION_DEPTH)
+        if code is None:
+            return "".join(_iter_nested(self))
+        return code
+
+    @staticmethod
+    def _join(codes):
+        """Return the nested code, given that of the items."""
+        return "(%s . %s)" % (codes[0], codes[1])
+
+    def _parts(self):
+        """Return an iterator over the strings and items of the pair."""
+        return iter(("(", self._data[0], " . ", self._data[1], ")"))
+
+    def _flat_code(self):
+        """Return the nested code, None if an item is compound."""
+        first, second = self._data
+        if first._compound or second._compound:
+            return None
+        return "(%s . %s)" % (first.nested(), second.nested())
 
 
 class List(SchemeData):
@@ -429,6 +816,10 @@ class List(SchemeData):
         (5 0 3)
     """
 
+    __metaclass__ = _Compound
+    _quote = "'"
+    _compound = True
+
     def __init__(self, data):
         """Make sure it's a sequence."""
         if isinstance(data, basestring) or \
@@ -437,17 +828,54 @@ class List(SchemeData):
         for item in data:
             if not isinstance(item, SchemeData):
                 raise InvalidArgument("%r is not a SchemeData object." % item)
-        self._data = data
-
-    def nested(self):
-        """Data for nested use (used by compound SchemeData objects)."""
-        return "(%s)" % " ".join("%s" % item.nested() for item in self._data)
-
-    def __format__(self, _):
-        """Return lilypond code."""
-        return "%s'(%s)" % (
-            self._start_symbol,
-            " ".join("%s" % item.nested() for item in self._data))
+        self._data = tuple(data)
+
+    @classmethod
+    def from_python(cls, values):
+        """
+        Make a list of python values, see `to_scheme`.
+
+        .. doctest::
+
+            >>> print format(List.from_python([1, -2, (3, 4.5)]))
+            #'(1 -2 (3 . 4.5))
+        """
+        return cls([to_scheme(value) for value in values])
+
+    def _nested_code(self):
+        """Return the code for `nested`, which caches it."""
+        code = self._flat_code()
+        if code is None:
+            code = _recursive_code(self, _RECURSION_DEPTH)
+        if code is None:
+            return "".join(_iter_nested(self))
+        return code
+
+    def _flat_code(self):
+        """Return the nested code, None if an item is compound."""
+        codes = []
+        for item in self._data:
+            if item._compound:
+                return None
+            codes.append(item.nested())
+        return "(%s)" % " ".join(codes)
+
+    @staticmethod
+    def _join(codes):
+        """Return the nested code, given that of the items."""
+        return "(%s)" % " ".join(codes)
+
+    def _parts(self):
+        """Generate the strings and items of the list."""
+        yield "("
+        first = True
+        for item in self._data:
+            if first:
+                first = False
+            else:
+                yield " "
+            yield item
+        yield ")"
 
 
 class AssociationList(List):
@@ -475,7 +903,7 @@ class AssociationList(List):
     def __init__(self, data):
         """Make sure every item is a pair."""
         List.__init__(self, data)
-        for item in data:
+        for item in self._data:
             if not isinstance(item, Pair):
                 raise InvalidArgument("%r is not a Pair object." % item)
 
@@ -502,194 +930,92 @@ class Color(SchemeData):
 
     def __init__(self, data):
         """Determine if color is valid and wihat type it is."""
-        normal_colors = [
-            'black',
-            'blue',
-            'grey',
-            'darkcyan',
-            'white',
-            'cyan',
-            'darkred',
-            'darkmagenta',
-            'red',
-            'magenta',
-            'darkgreen',
-            'darkyellow',
-            'green',
-            'yellow',
-            'darkblue']
-        x11_colors_simple = [
-            'snow',
-            'GhostWhite', 'ghost white',
-            'WhiteSmoke', 'white smoke',
-            'gainsboro',
-            'FloralWhite', 'floral white',
-            'OldLace', 'old lace',
-            'linen',
-            'AntiqueWhite', 'antique white',
-            'PapayaWhip', 'papaya whip',
-            'BlanchedAlmond', 'blanched almond',
-            'bisque',
-            'PeachPuff', 'peach puff',
-            'NavajoWhite', 'navajo white',
-            'moccasin',
-            'cornsilk',
-            'ivory',
-            'LemonChiffon', 'lemon chiffon',
-            'seashell',
-            'honeydew',
-            'MintCream', 'mint cream',
-            'azure',
-            'AliceBlue', 'alice blue',
-            'lavender',
-            'LavenderBlush', 'lavender blush',
-            'MistyRose', 'misty rose',
-            'white',
-            'black',
-            'DarkSlateGrey', 'dark slate grey',
-            'DimGrey', 'dim grey',
-            'SlateGrey', 'slate grey',
-            'LightSlateGrey', 'light slate grey',
-            'grey',
-            'LightGrey', 'light grey',
-            'MidnightBlue', 'midnight blue',
-            'navy',
-            'NavyBlue', 'navy blue',
-            'CornflowerBlue', 'cornflower blue',
-            'DarkSlateBlue', 'dark slate blue',
-            'SlateBlue', 'slate blue',
-            'MediumSlateBlue', 'medium slate blue',
-            'LightSlateBlue', 'light slate blue',
-            'MediumBlue', 'medium blue',
-            'RoyalBlue', 'royal blue',
-            'blue',
-            'DodgerBlue', 'dodger blue',
-            'DeepSkyBlue', 'deep sky blue',
-            'SkyBlue', 'sky blue',
-            'LightSkyBlue', 'light sky blue',
-            'SteelBlue', 'steel blue',
-            'LightSteelBlue', 'light steel blue',
-            'LightBlue', 'light blue',
-            'PowderBlue', 'powder blue',
-            'PaleTurquoise', 'pale turquoise',
-            'DarkTurquoise', 'dark turquoise',
-            'MediumTurquoise', 'medium turquoise',
-            'turquoise',
-            'cyan',
-            'LightCyan', 'light cyan',
-            'CadetBlue', 'cadet blue',
-            'MediumAquamarine', 'medium aquamarine',
-            'aquamarine',
-            'DarkGreen', 'dark green',
-            'DarkOliveGreen', 'dark olive green',
-            'DarkSeaGreen', 'dark sea green',
-            'SeaGreen', 'sea green',
-            'MediumSeaGreen', 'medium sea green',
-            'LightSeaGreen', 'light sea green',
-            'PaleGreen', 'pale green',
-            'SpringGreen', 'spring green',
-            'LawnGreen', 'lawn green',
-            'green',
-            'chartreuse',
-            'MediumSpringGreen', 'medium spring green',
-            'GreenYellow', 'green yellow',
-            'LimeGreen', 'lime green',
-            'YellowGreen', 'yellow green',
-            'ForestGreen', 'forest green',
-            'OliveDrab', 'olive drab',
-            'DarkKhaki', 'dark khaki',
-            'khaki',
-            'PaleGoldenrod', 'pale goldenrod',
-            'LightGoldenrodYellow', 'light goldenrod yellow',
-            'LightYellow', 'light yellow',
-            'yellow',
-            'gold',
-            'LightGoldenrod', 'light goldenrod',
-            'goldenrod',
-            'DarkGoldenrod', 'dark goldenrod',
-            'RosyBrown', 'rosy brown',
-            'IndianRed', 'indian red',
-            'SaddleBrown', 'saddle brown',
-            'sienna',
-            'peru',
-            'burlywood',
-            'beige',
-            'wheat',
-            'SandyBrown', 'sandy brown',
-            'tan',
-            'chocolate',
-            'firebrick',
-            'brown',
-            'DarkSalmon', 'dark salmon',
-            'salmon',
-            'LightSalmon', 'light salmon',
-            'orange',
-            'DarkOrange', 'dark orange',
-            'coral',
-            'LightCoral', 'light coral',
-            'tomato',
-            'OrangeRed', 'orange red',
-            'red',
-            'HotPink', 'hot pink',
-            'DeepPink', 'deep pink',
-            'pink',
-            'LightPink', 'light pink',
-            'PaleVioletRed', 'pale violet red',
-            'maroon',
-            'MediumVioletRed', 'medium violet red',
-            'VioletRed', 'violet red',
-            'magenta',
-            'violet',
-            'plum',
-            'orchid',
-            'MediumOrchid', 'medium orchid',
-            'DarkOrchid', 'dark orchid',
-            'DarkViolet', 'dark violet',
-            'BlueViolet', 'blue violet',
-            'purple',
-            'MediumPurple', 'medium purple',
-            'thistle',
-            'DarkGrey', 'dark grey',
-            'DarkBlue', 'dark blue',
-            'DarkCyan', 'dark cyan',
-            'DarkMagenta', 'dark magenta',
-            'DarkRed', 'dark red',
-            'LightGreen', 'light green']
-
-        numbered_colors = [
-            'snow', 'seashell', 'AntiqueWhite', 'bisque', 'PeachPuff',
-            'NavajoWhite', 'LemonChiffon', 'cornsilk', 'ivory', 'honeydew',
-            'LavenderBlush', 'MistyRose', 'azure', 'SlateBlue', 'RoyalBlue',
-            'blue', 'DodgerBlue', 'SteelBlue', 'DeepSkyBlue', 'SkyBlue',
-            'LightSkyBlue', 'LightSteelBlue', 'LightBlue', 'LightCyan',
-            'CadetBlue', 'turquoise', 'cyan', 'aquamarine', 'DarkSeaGreen',
-            'SeaGreen', 'PaleGreen', 'SpringGreen', 'green', 'chartreuse',
-            'OliveDrab', 'DarkOliveGreen', 'khaki', 'LightGoldenrod',
-            'yellow', 'gold', 'goldenrod', 'DarkGoldenrod', 'RosyBrown',
-            'IndianRed', 'sienna', 'burlywood', 'wheat', 'tan',
-            'chocolate', 'firebrick', 'brown', 'salmon', 'LightSalmon',
-            'orange', 'DarkOrange', 'coral', 'tomato', 'OrangeRed',
-            'red', 'DeepPink', 'HotPink', 'pink', 'LightPink',
-            'PaleVioletRed', 'maroon', 'VioletRed', 'magenta', 'orchid',
-            'plum', 'MediumOrchid', 'DarkOrchid', 'purple',
-            'MediumPurple', 'thistle', 'LightYellow', 'PaleTurquoise']
-
-        x11_colors_numbered = [
-            a + str(b) for a in numbered_colors for b in range(1, 5)]
-
-        if data in normal_colors:
+        if not isinstance(data, basestring):
+            raise InvalidArgument("%r is not a valid color." % data)
+        if data in _NORMAL_COLORS:
             self._data = data
-        elif re.match("^grey[0-9]+$", data):
-            self._data = "(x11-color \"%s\")" % data
-        elif data in x11_colors_simple or data in x11_colors_numbered:
+        elif data in _X11_COLORS or _GREY.match(data):
             self._data = "(x11-color \"%s\")" % data
         else:
-            raise InvalidArgument("%r is not a valid color.")
+            raise InvalidArgument("%r is not a valid color." % data)
 
-    def nested(self):
-        """Data for nested use (used by compound SchemeData objects)."""
-        return "%s" % self._data
+    def _nested_code(self):
+        """Return the code for `nested`, which caches it."""
+        return self._data
 
-    def __format__(self, _):
-        """Return lilypond code."""
-        return "%s%s" % (self._start_symbol, self._data)
+
+_CONVERSIONS = {
+    bool: Boolean,
+    str: Symbol,
+    unicode: Symbol}
+# valid by type, interned like any other number
+_NUMBERS = {
+    int: SignedInt,
+    float: SignedFloat}
+
+
+def _make(cls, data):
+    """Create a pair or list that is valid as it is, skipping __init__."""
+    obj = object.__new__(cls)
+    obj.__dict__['_data'] = data
+    return obj
+
+
+def _convert(value):
+    """Convert a single python value that is not a list or tuple."""
+    kind = type(value)
+    if kind in _NUMBERS:
+        return _NUMBERS[kind](value)
+    if isinstance(value, SchemeData):
+        return value
+    try:
+        return _CONVERSIONS[kind](value)
+    except KeyError:
+        raise InvalidArgument("Can't convert %r to scheme data." % value)
+
+
+def _convert_sequence(sequence, items):
+    """Make scheme data of a sequence, with its items already converted."""
+    if type(sequence) is tuple and len(items) == 2:
+        return _make(Pair, tuple(items))
+    return _make(List, tuple(items))
+
+
+def to_scheme(value):
+    """
+    Convert python values to scheme data.
+
+    Booleans, integers and floats become `Boolean`, `SignedInt` and
+    `SignedFloat`. Strings become a `Symbol`, wrap them in `String`
+    yourself if that is what you need. Tuples of two become a `Pair`,
+    other tuples and lists a `List`. Scheme data is left as it is.
+    Nested lists and tuples are converted without recursion, so they
+    can be as deep as you like.
+
+    Numbers are interned like everywhere else.
+
+    .. doctest::
+
+        >>> from lilyflower.schemedata import SignedInt, to_scheme
+        >>> to_scheme(1) is SignedInt(1)
+        True
+        >>> print format(to_scheme([('moveto', 0, 0), ('lineto', 1, 1.5)]))
+        #'((moveto 0 0) (lineto 1 1.5))
+    """
+    if not isinstance(value, (list, tuple)):
+        return _convert(value)
+    # sequence, iterator over its items, converted items
+    stack = [(value, iter(value), [])]
+    while True:
+        sequence, items, converted = stack[-1]
+        for item in items:
+            if isinstance(item, (list, tuple)):
+                stack.append((item, iter(item), []))
+                break
+            converted.append(_convert(item))
+        else:
+            stack.pop()
+            result = _convert_sequence(sequence, converted)
+            if not stack:
+                return result
+            stack[-1][2].append(result)
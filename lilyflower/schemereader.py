@@ -0,0 +1,237 @@
+r"""
+Read scheme expressions back into scheme data.
+
+`read` turns scheme code, like lilyflower writes it in arguments, into
+:mod:`lilyflower.schemedata` objects: numbers, booleans, strings,
+symbols, directions, axes, colors, pairs, lists and association lists.
+Anything else in parentheses, a call like ``(ly:make-moment 1/4)``,
+is kept verbatim as a `Procedure`.
+
+Expressions are split into tokens by a single regular expression and
+built with an explicit stack. Nothing is read twice, even the source of
+a procedure is only sliced out once it is closed, so reading time is
+linear in the size of the input and nesting depth is not limited by
+the recursion limit. The lilypond parser uses `read_scheme` for every
+``#`` it meets.
+
+Strings are read in double quotes, and in single quotes the way
+`String` is formatted, as long as there is no whitespace, parenthesis
+or semicolon in them: lilypond code after a scheme value can have
+quotes too (``c'``), so there is no telling where such a string ends.
+Those raise a `ParseError` rather than turn into symbols.
+
+Examples
+========
+.. testsetup::
+
+    from lilyflower.schemereader import read
+
+.. doctest::
+
+    >>> alist = read("#'((0 . 1) (2 . 3))")
+    >>> type(alist).__name__
+    'AssociationList'
+    >>> print format(alist)
+    #'((0 . 1) (2 . 3))
+    >>> type(read('#(x11-color "snow4")')).__name__
+    'Color'
+    >>> print format(read("#(ly:make-moment 1/4)"))
+    #(ly:make-moment 1/4)
+"""
+import re
+from lilyflower.errors import InvalidArgument, ParseError
+from lilyflower.schemedata import (
+    Boolean,
+    SignedInt,
+    SignedFloat,
+    String,
+    Direction,
+    Axis,
+    Symbol,
+    Procedure,
+    Pair,
+    List,
+    AssociationList,
+    Color)
+
+_TOKENS = re.compile(r"""
+    (?P<space>(?:\s+|;[^\n]*)+)
+    |(?P<open>\()
+    |(?P<close>\))
+    |(?P<string>"(?:[^"\\]|\\.)*")
+    |(?P<pystring>'[^'\s();]*')
+    |(?P<quote>')
+    |(?P<atom>[^\s()"';]+)
+    """, re.VERBOSE)
+
+_NUMBER = re.compile(r"^[\-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][\-+]?\d+)?$")
+_BOOLEANS = {'#t': True, '#f': False, '#true': True, '#false': False}
+_DIRECTIONS = frozenset(('UP', 'DOWN', 'CENTER'))
+_AXES = frozenset(('X', 'Y'))
+
+
+class _Dot(object):
+
+    """The dot in a scheme pair."""
+
+    pass
+
+_DOT = _Dot()
+
+
+class _Incomplete(ParseError):
+
+    """Input ended in the middle of a scheme expression."""
+
+    pass
+
+
+def _atom(kind, text, quoted):
+    """Convert a scheme atom to SchemeData."""
+    if kind == 'string':
+        return String(text[1:-1].decode('string_escape'))
+    elif kind == 'pystring':
+        # this is how lilyflower formats String
+        return String(text[1:-1])
+    elif text == '.':
+        return _DOT
+    elif text in _BOOLEANS:
+        return Boolean(_BOOLEANS[text])
+    elif _NUMBER.match(text):
+        if '.' in text or 'e' in text or 'E' in text:
+            return SignedFloat(float(text))
+        return SignedInt(int(text))
+    elif text in _DIRECTIONS:
+        return Direction(text)
+    elif text in _AXES:
+        return Axis(text)
+    elif quoted:
+        return Symbol(text)
+    try:
+        return Color(text)
+    except InvalidArgument:
+        raise ParseError("unknown scheme value %r" % text)
+
+
+def _list(items, text, start, end):
+    """Convert the items of a quoted list to SchemeData."""
+    if len(items) == 3 and items[1] is _DOT:
+        return Pair([items[0], items[2]])
+    for item in items:
+        if item is _DOT:
+            raise ParseError("improper list %r" % text[start:end])
+    if items and all(isinstance(item, Pair) for item in items):
+        return AssociationList(items)
+    return List(items)
+
+
+def _procedure(source, words):
+    """Convert a procedure call, words are its first tokens."""
+    if len(words) == 2 and words[0] == ('atom', 'x11-color') and \
+            words[1][0] == 'string':
+        try:
+            return Color(words[1][1][1:-1])
+        except InvalidArgument:
+            pass
+    return Procedure(source)
+
+
+def read_scheme(text, pos=0, final=True):
+    """
+    Read a scheme expression from text, starting after the hash.
+
+    If text is not `final`, more input might follow it, so anything
+    that touches the end of text counts as unterminated.
+
+    Returns a tuple (SchemeData, end position).
+
+    Raises
+    ======
+    ParseError:
+        if the expression is invalid, or not complete
+    """
+    # items and start of the quoted lists being read
+    stack = []
+    quoted = False
+    # open parentheses in the procedure call being read, where it starts
+    # and its first few tokens
+    depth = 0
+    start = 0
+    words = []
+    match = _TOKENS.match
+    while True:
+        found = match(text, pos)
+        if found is None:
+            # only the end of input or an unterminated string get here
+            raise _Incomplete("unterminated scheme expression")
+        kind = found.lastgroup
+        begin, pos = found.span()
+        if pos == len(text) and not final:
+            raise _Incomplete("unterminated scheme expression")
+        if quoted and kind in ('space', 'close'):
+            # what is left of a single quoted string with whitespace
+            # or parentheses in it, see the module documentation
+            raise ParseError("quote without a value in scheme")
+        if kind == 'space':
+            if not stack and not depth:
+                raise ParseError("empty scheme expression")
+            continue
+        elif depth:
+            # procedure calls are kept verbatim, only count parentheses
+            if depth == 1 and len(words) < 3 and kind != 'close':
+                words.append((kind, found.group()))
+            if kind == 'open':
+                depth += 1
+                continue
+            elif kind != 'close':
+                continue
+            depth -= 1
+            if depth:
+                continue
+            value = _procedure(text[start:pos], words)
+        elif kind == 'quote':
+            quoted = True
+            continue
+        elif kind == 'open':
+            if quoted or stack:
+                stack.append(([], begin))
+                quoted = False
+            else:
+                depth = 1
+                start = begin
+                words = []
+            continue
+        elif kind == 'close':
+            if not stack:
+                raise ParseError("unbalanced parenthesis in scheme")
+            items, list_start = stack.pop()
+            value = _list(items, text, list_start, pos)
+        else:
+            try:
+                value = _atom(kind, found.group(), quoted or bool(stack))
+            except InvalidArgument as error:
+                raise ParseError(str(error))
+        quoted = False
+        if not stack:
+            if value is _DOT:
+                raise ParseError("unexpected . in scheme")
+            return value, pos
+        stack[-1][0].append(value)
+
+
+def read(text):
+    """
+    Read a single scheme expression, with or without the leading hash.
+
+    Raises
+    ======
+    ParseError:
+        if text is not exactly one valid expression
+    """
+    text = text.strip()
+    # a boolean starts with a hash of its own
+    pos = 1 if text[:1] == '#' and text not in _BOOLEANS else 0
+    value, end = read_scheme(text, pos)
+    if text[end:].strip():
+        raise ParseError("unexpected %r after scheme" % text[end:].strip())
+    return value
@@ -0,0 +1,142 @@
+r"""
+Write a big score as a main file with included parts.
+
+`write_sharded` writes every score and book part of a `LilyFile` (or
+whatever types you choose, like `New` for every staff) to a file of its
+own, and a main file that pulls them in with ``\include``. Parts are
+written in parallel, each with `lilyflower.writer.save`, so a crash
+never leaves a half written file behind.
+
+A manifest next to the main file remembers a hash of every part. Parts
+whose code did not change since the last run are not written again,
+and neither is the main file if only its creation time changed, so
+regenerating a big score only touches the parts that changed and
+editors and build tools don't see changes that aren't there.
+
+Parts are named after the main file and a hash of their code, like
+``score-3f786850e387.ly``. A name only changes when the code of its part
+does, so adding or removing a score writes just that part and the main
+file, not every part after it. Lilypond looks for included files in the
+directory of the main file.
+
+Examples
+========
+.. testsetup::
+
+    import os, tempfile
+    from lilyflower.shard import write_sharded
+    from lilyflower.dom import LilyFile
+    from lilyflower.containers import Score
+    from lilyflower.tones import Note
+
+.. doctest::
+
+    >>> directory = tempfile.mkdtemp()
+    >>> lily_file = LilyFile([
+    ...     Score([Note('c'), Note('d')]), Score([Note('e'), Note('f')])])
+    >>> len(write_sharded(lily_file, directory))
+    3
+    >>> print open(os.path.join(directory, 'score.ly')).read()
+    % Created with lilyflower at ...
+    \version "2.18.2"
+    <BLANKLINE>
+    \include "score-....ly"
+    \include "score-....ly"
+    >>> lily_file = LilyFile([Score([Note('g')])] + list(lily_file))
+    >>> len(write_sharded(lily_file, directory))
+    2
+"""
+import hashlib
+import json
+from multiprocessing.pool import ThreadPool
+import os
+from lilyflower import dom, containers
+from lilyflower.writer import iter_format, save
+from lilyflower.tools import without_creation_comment
+
+SHARD_TYPES = (
+    dom.Score,
+    containers.Score,
+    containers.BookPart)
+
+
+def _digest(text):
+    """Hash of lilypond code, without creation time."""
+    return hashlib.sha1(without_creation_comment(text)).hexdigest()
+
+
+def write_sharded(
+        lily_file, directory, name='score', types=SHARD_TYPES, workers=4):
+    """
+    Write lily_file as a main file and one file per part.
+
+    Parameters
+    ==========
+    lily_file: LilyFile
+        what to write
+    directory: str
+        where to write it, created if it does not exist
+    name: str, optional
+        main file is name.ly, parts are name-<hash>.ly
+    types: tuple of classes, optional
+        everything of these types gets a file of its own, nested items
+        of these types stay with their parent
+    workers: int, optional
+        number of files written at the same time
+
+    Returns
+    =======
+    list of the names of the files that were written
+    """
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    parts = []
+
+    def substitute(item, _):
+        """Replace parts with an include."""
+        if not isinstance(item, types):
+            return None
+        text = format(item)
+        filename = "%s-%s.ly" % (name, _digest(text)[:12])
+        parts.append((filename, text))
+        return '\\include "%s"' % filename
+
+    files = parts + [(
+        "%s.ly" % name,
+        "".join(iter_format(lily_file, substitute=substitute)))]
+    manifest_path = os.path.join(directory, ".%s.shards" % name)
+    try:
+        with open(manifest_path) as manifest_file:
+            manifest = json.load(manifest_file)
+    except (IOError, ValueError):
+        manifest = {}
+    hashes = {}
+    changed = []
+    for filename, text in files:
+        if filename in hashes:
+            # the same part twice, it only needs a single file
+            continue
+        hashes[filename] = _digest(text)
+        if manifest.get(filename) != hashes[filename] or \
+                not os.path.exists(os.path.join(directory, filename)):
+            changed.append((os.path.join(directory, filename), text))
+    # formatting keeps state in spanners, so it has to happen in order,
+    # only the writing is done in parallel
+    if len(changed) > 1 and workers > 1:
+        pool = ThreadPool(min(workers, len(changed)))
+        try:
+            pool.map(lambda job: save(job[1], job[0]), changed, 1)
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        for path, text in changed:
+            save(text, path)
+    for filename in manifest:
+        if filename not in hashes:
+            try:
+                os.remove(os.path.join(directory, filename))
+            except OSError:
+                pass
+    save(json.dumps(hashes, indent=2, sort_keys=True), manifest_path)
+    return [os.path.basename(path) for path, _ in changed]
@@ -0,0 +1,643 @@
+r"""
+Binary snapshots of lilyflower trees.
+
+A snapshot stores a tree in a compact, versioned binary format that
+loads much faster than building or parsing the tree again:
+
+- every string is stored once, in a string table, and referred to by
+  number
+- structure and numbers are varint encoded, classes are stored once by
+  name and referred to by number
+- runs of plain notes are stored column by column: all pitches, all
+  octaves, all durations, then flags for the rare extras
+- every item of the root (the scores in a `LilyFile`, say) is a block
+  of its own, listed in an index at the end of the file
+
+Because of the index, a snapshot can be memory mapped with
+`Snapshot.open` and items loaded one at a time. `Snapshot.load` with
+``lazy=True`` returns a root that loads its items while it is being
+formatted, so a big score can be rendered without ever having the
+whole tree in memory. Objects that occur in more than one place, like
+a slur that is formatted in two notes, are stored once and loaded with
+the snapshot, so they stay shared.
+
+Loading a snapshot never runs code from the file: values are strings,
+numbers, lists, tuples, dicts and lilyflower objects, and classes are
+only looked up in the class table of `lilyflower.pickling`, never
+imported by name. `dumps` refuses trees with anything else in them.
+
+File layout::
+
+    MAGIC VERSION
+    strings classes shared-objects root blocks index
+    footer: offsets of the sections, number of blocks, MAGIC
+
+Examples
+========
+.. testsetup::
+
+    from lilyflower.snapshot import dumps, loads, Snapshot
+    from lilyflower.containers import LilyFile
+    from lilyflower.container import Container
+    from lilyflower.tones import Note
+
+.. doctest::
+
+    >>> lily_file = LilyFile([
+    ...     Container([Note('c'), Note('d'), Note('e', '', '2')]),
+    ...     Container([Note('f'), Note('g')])])
+    >>> data = dumps(lily_file)
+    >>> print format(loads(data)).split("\n", 1)[1]
+    <BLANKLINE>
+    {
+      c d e2
+    }
+    {
+      f g
+    }
+    >>> snapshot = Snapshot(data)
+    >>> len(snapshot)
+    2
+    >>> print format(snapshot[1])
+    {
+      f g
+    }
+"""
+from collections import OrderedDict
+import mmap
+import struct
+from lilyflower.errors import SnapshotError
+from lilyflower.pickling import (
+    CompactPickle, class_id, class_named, restore, state_names)
+from lilyflower.tones import Note
+
+MAGIC = "LILYSNAP"
+VERSION = 2
+
+(_NONE, _FALSE, _TRUE, _INT, _FLOAT, _STR, _UNICODE, _LIST, _TUPLE,
+ _OBJECT, _DICT_OBJECT, _SHARED, _NOTES, _DICT, _BLOCKS,
+ _ORDERED_DICT) = range(16)
+
+# offsets of strings, classes, shared objects, root and index, and the
+# number of blocks
+_FOOTER = struct.Struct("<6Q")
+_DOUBLE = struct.Struct("<d")
+_NOTE_STATE = Note._state
+# attributes that hold the content of a root
+_CONTENT = ('_content', '_container')
+
+
+def _write_varint(out, value):
+    """Append an unsigned varint to a bytearray."""
+    while value >= 0x80:
+        out.append(value & 0x7f | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def _read_varint(buf, pos):
+    """Read an unsigned varint, return value and new position."""
+    result = 0
+    shift = 0
+    while True:
+        byte = buf[pos]
+        pos += 1
+        result |= (byte & 0x7f) << shift
+        if byte < 0x80:
+            return result, pos
+        shift += 7
+
+
+class _Encoder(object):
+
+    """Encodes values, collects strings, classes and shared objects."""
+
+    def __init__(self, root):
+        """Find the state of every object, and which are shared."""
+        self.strings = {}
+        self.string_list = []
+        self.classes = {}
+        self.class_list = []
+        self.shared = {}
+        self.shared_list = []
+        self.states = {}
+        self.shared_ids = set()
+        stack = [root]
+        while stack:
+            value = stack.pop()
+            kind = type(value)
+            if kind is list or kind is tuple:
+                stack.extend(value)
+            elif kind is dict or kind is OrderedDict:
+                stack.extend(value.keys())
+                stack.extend(value.values())
+            elif isinstance(value, CompactPickle):
+                key = id(value)
+                if key in self.states:
+                    self.shared_ids.add(key)
+                    continue
+                if value.__dict__.viewkeys() <= state_names(type(value)):
+                    state = self.states[key] = (value._state_values(), None)
+                    stack.extend(state[0])
+                else:
+                    state = self.states[key] = (None, value.__dict__)
+                    stack.extend(state[1].values())
+
+    def string(self, value):
+        """Return the number of a string in the string table."""
+        number = self.strings.get(value)
+        if number is None:
+            number = self.strings[value] = len(self.string_list)
+            self.string_list.append(value)
+        return number
+
+    def class_number(self, cls):
+        """Return the number of a class in the class table."""
+        number = self.classes.get(cls)
+        if number is None:
+            if type(class_id(cls)) is not int:
+                # only classes of lilyflower itself are loaded again
+                raise SnapshotError(
+                    "can't store %s.%s objects in a snapshot" % (
+                        cls.__module__, cls.__name__))
+            number = self.classes[cls] = len(self.class_list)
+            self.class_list.append(cls)
+        return number
+
+    def value(self, out, value):
+        """Append a tagged value."""
+        kind = type(value)
+        if kind is str:
+            out.append(_STR)
+            _write_varint(out, self.string(value))
+        elif kind is list:
+            self.sequence(out, value)
+        elif value is None:
+            out.append(_NONE)
+        elif kind is bool:
+            out.append(_TRUE if value else _FALSE)
+        elif kind is int or kind is long:
+            out.append(_INT)
+            # zigzag, so small negative numbers are small too
+            _write_varint(out, value << 1 if value >= 0 else ~value << 1 | 1)
+        elif kind is tuple:
+            out.append(_TUPLE)
+            _write_varint(out, len(value))
+            for item in value:
+                self.value(out, item)
+        elif kind is unicode:
+            out.append(_UNICODE)
+            _write_varint(out, self.string(value.encode('utf-8')))
+        elif kind is float:
+            out.append(_FLOAT)
+            out.extend(_DOUBLE.pack(value))
+        elif isinstance(value, CompactPickle):
+            self.obj(out, value)
+        elif kind is dict or kind is OrderedDict:
+            out.append(_DICT if kind is dict else _ORDERED_DICT)
+            _write_varint(out, len(value))
+            for key, item in value.iteritems():
+                self.value(out, key)
+                self.value(out, item)
+        else:
+            raise SnapshotError(
+                "can't store %s values in a snapshot" % kind.__name__)
+
+    def obj(self, out, obj):
+        """Append an object, or a reference to a shared one."""
+        key = id(obj)
+        if key not in self.shared_ids:
+            self.object_body(out, obj)
+            return
+        if key not in self.shared:
+            # objects it refers to are added to the list first
+            body = bytearray()
+            self.object_body(body, obj)
+            self.shared[key] = len(self.shared_list)
+            self.shared_list.append(body)
+        out.append(_SHARED)
+        _write_varint(out, self.shared[key])
+
+    def object_body(self, out, obj, blocks=None):
+        """
+        Append class and state of an object.
+
+        If blocks is a list, the content of obj goes in there, a block
+        per item, instead of in out.
+        """
+        values, attributes = self.states[id(obj)]
+        if values is None:
+            out.append(_DICT_OBJECT)
+            _write_varint(out, self.class_number(type(obj)))
+            _write_varint(out, len(attributes))
+            for name, value in sorted(attributes.items()):
+                _write_varint(out, self.string(name))
+                self.value(out, value)
+            return
+        names = type(obj)._state
+        out.append(_OBJECT)
+        _write_varint(out, self.class_number(type(obj)))
+        _write_varint(out, len(values))
+        for name, value in zip(names, values):
+            if blocks is not None and name in _CONTENT and \
+                    type(value) is list:
+                out.append(_BLOCKS)
+                _write_varint(out, len(value))
+                for item in value:
+                    block = bytearray()
+                    self.value(block, item)
+                    blocks.append(block)
+            else:
+                self.value(out, value)
+
+    def _plain_note(self, item):
+        """See if item can go in a column block."""
+        if type(item) is not Note or id(item) in self.shared_ids:
+            return False
+        values = self.states[id(item)][0]
+        return values is not None and type(values[0]) is str and \
+            type(values[1]) is str and type(values[2]) is str
+
+    def sequence(self, out, items):
+        """Append a list, with runs of plain notes as column blocks."""
+        # (run of notes or None, item)
+        entries = []
+        index = 0
+        while index < len(items):
+            end = index
+            while end < len(items) and self._plain_note(items[end]):
+                end += 1
+            if end - index > 1:
+                entries.append((items[index:end], None))
+                index = end
+            else:
+                entries.append((None, items[index]))
+                index += 1
+        out.append(_LIST)
+        _write_varint(out, len(entries))
+        for run, item in entries:
+            if run is not None:
+                self.notes(out, run)
+            else:
+                self.value(out, item)
+
+    def notes(self, out, notes):
+        """Append a column block of notes."""
+        rows = [self.states[id(note)][0] for note in notes]
+        out.append(_NOTES)
+        _write_varint(out, len(rows))
+        for column in range(3):
+            for row in rows:
+                _write_varint(out, self.string(row[column]))
+        extras = []
+        for row in rows:
+            flags = 0
+            if row[3] is not None:
+                flags |= 1
+                extras.append(row[3])
+            if row[4] is True:
+                flags |= 2
+            elif row[4] is not False:
+                flags |= 4
+                extras.append(row[4])
+            if type(row[5]) is not list or row[5]:
+                flags |= 8
+                extras.append(row[5])
+            if type(row[6]) is not list or row[6]:
+                flags |= 16
+                extras.append(row[6])
+            out.append(flags)
+        for value in extras:
+            self.value(out, value)
+
+
+def dumps(tree):
+    """
+    Return a snapshot of tree, as a string.
+
+    Raises
+    ======
+    SnapshotError:
+        if tree holds values or objects a snapshot can't store
+    """
+    encoder = _Encoder(tree)
+    root = bytearray()
+    blocks = []
+    if isinstance(tree, CompactPickle):
+        encoder.object_body(root, tree, blocks)
+    else:
+        encoder.value(root, tree)
+    shared = bytearray()
+    _write_varint(shared, len(encoder.shared_list))
+    for body in encoder.shared_list:
+        shared.extend(body)
+    classes = bytearray()
+    _write_varint(classes, len(encoder.class_list))
+    for cls in encoder.class_list:
+        _write_varint(classes, encoder.string(
+            "%s.%s" % (cls.__module__, cls.__name__)))
+    strings = bytearray()
+    _write_varint(strings, len(encoder.string_list))
+    for value in encoder.string_list:
+        _write_varint(strings, len(value))
+        strings.extend(value)
+    out = bytearray(MAGIC)
+    out.append(VERSION)
+    offsets = []
+    for section in (strings, classes, shared, root):
+        offsets.append(len(out))
+        out.extend(section)
+    index = bytearray()
+    _write_varint(index, len(blocks))
+    for block in blocks:
+        _write_varint(index, len(out))
+        _write_varint(index, len(block))
+        out.extend(block)
+    offsets.append(len(out))
+    out.extend(index)
+    out.extend(_FOOTER.pack(*(offsets + [len(blocks)])))
+    out.extend(MAGIC)
+    return str(out)
+
+
+def dump(tree, target):
+    """Write a snapshot of tree to a file object or path."""
+    if isinstance(target, basestring):
+        with open(target, 'wb') as output:
+            output.write(dumps(tree))
+    else:
+        target.write(dumps(tree))
+
+
+class _Items(object):
+
+    """Read-only content of a lazily loaded root."""
+
+    def __init__(self, snapshot):
+        """Load items from snapshot when asked for."""
+        self._snapshot = snapshot
+
+    def __len__(self):
+        """Return the number of items."""
+        return len(self._snapshot)
+
+    def __getitem__(self, index):
+        """Load an item."""
+        if isinstance(index, slice):
+            return [
+                self._snapshot[item]
+                for item in range(*index.indices(len(self)))]
+        return self._snapshot[index]
+
+    def __iter__(self):
+        """Load items one by one."""
+        for index in range(len(self)):
+            yield self._snapshot[index]
+
+
+class Snapshot(object):
+
+    """
+    An opened snapshot.
+
+    Strings, classes and shared objects are read right away, items of
+    the root only when they are asked for.
+
+    Parameters
+    ==========
+    data: str or mmap
+        the snapshot, see `dumps`
+
+    Raises
+    ======
+    SnapshotError:
+        if data is not a snapshot, or of a different version
+    """
+
+    def __init__(self, data):
+        """Read the tables."""
+        self._data = data
+        if len(data) < len(MAGIC) * 2 + 1 + _FOOTER.size or \
+                data[:len(MAGIC)] != MAGIC or data[-len(MAGIC):] != MAGIC:
+            raise SnapshotError("not a lilyflower snapshot")
+        version = ord(data[len(MAGIC)])
+        if version != VERSION:
+            raise SnapshotError(
+                "snapshot version %d, expected %d" % (version, VERSION))
+        footer = len(data) - len(MAGIC) - _FOOTER.size
+        (strings_at, classes_at, shared_at, self._root_at, index_at,
+         count) = _FOOTER.unpack(data[footer:footer + _FOOTER.size])
+        buf = bytearray(data[strings_at:classes_at])
+        number, pos = _read_varint(buf, 0)
+        self._strings = strings = []
+        for _ in range(number):
+            size, pos = _read_varint(buf, pos)
+            strings.append(str(buf[pos:pos + size]))
+            pos += size
+        buf = bytearray(data[classes_at:shared_at])
+        number, pos = _read_varint(buf, 0)
+        self._classes = []
+        for _ in range(number):
+            name, pos = _read_varint(buf, pos)
+            # never import by name: only lilyflower classes are allowed
+            cls = class_named(strings[name])
+            if cls is None:
+                raise SnapshotError("unknown class %s" % strings[name])
+            self._classes.append(cls)
+        buf = bytearray(data[index_at:footer])
+        number, pos = _read_varint(buf, 0)
+        self._blocks = []
+        for _ in range(number):
+            offset, pos = _read_varint(buf, pos)
+            size, pos = _read_varint(buf, pos)
+            self._blocks.append((offset, size))
+        self._root_end = self._blocks[0][0] if self._blocks else index_at
+        # make sure the class table of lilyflower.pickling is loaded
+        class_id(Note)
+        self._shared = []
+        buf = bytearray(data[shared_at:self._root_at])
+        number, pos = _read_varint(buf, 0)
+        for _ in range(number):
+            value, pos = self._value(buf, pos)
+            self._shared.append(value)
+
+    @classmethod
+    def open(cls, path):
+        """Memory map a snapshot file."""
+        with open(path, 'rb') as snapshot_file:
+            data = mmap.mmap(
+                snapshot_file.fileno(), 0, access=mmap.ACCESS_READ)
+        return cls(data)
+
+    def close(self):
+        """Unmap the file, if it was mapped."""
+        if isinstance(self._data, mmap.mmap):
+            self._data.close()
+
+    def __enter__(self):
+        """Use as context manager."""
+        return self
+
+    def __exit__(self, *_):
+        """Close when done."""
+        self.close()
+
+    def __len__(self):
+        """Return the number of items in the root."""
+        return len(self._blocks)
+
+    def __getitem__(self, index):
+        """Load a single item of the root."""
+        offset, size = self._blocks[index]
+        return self._value(bytearray(self._data[offset:offset + size]), 0)[0]
+
+    def load(self, lazy=False):
+        """
+        Load the tree.
+
+        With lazy, the content of the root is loaded item by item when
+        it is used, which is enough for formatting and writing. The
+        content can't be changed.
+        """
+        buf = bytearray(self._data[self._root_at:self._root_end])
+        return self._value(buf, 0, _Items(self) if lazy else None)[0]
+
+    def _value(self, buf, pos, content=None):
+        """Read a tagged value, return value and new position."""
+        tag = buf[pos]
+        pos += 1
+        if tag == _STR:
+            number = buf[pos]
+            pos += 1
+            if number >= 0x80:
+                number, pos = _read_varint(buf, pos - 1)
+            return self._strings[number], pos
+        elif tag == _OBJECT:
+            number, pos = _read_varint(buf, pos)
+            cls = self._classes[number]
+            count, pos = _read_varint(buf, pos)
+            if count != len(cls._state):
+                raise SnapshotError("%s has changed" % cls.__name__)
+            values = []
+            strings = self._strings
+            for _ in range(count):
+                tag = buf[pos]
+                if tag == _STR and buf[pos + 1] < 0x80:
+                    values.append(strings[buf[pos + 1]])
+                    pos += 2
+                    continue
+                if tag == _BLOCKS:
+                    size, pos = _read_varint(buf, pos + 1)
+                    values.append(
+                        content if content is not None else
+                        [self[index] for index in range(size)])
+                    continue
+                value, pos = self._value(buf, pos)
+                values.append(value)
+            return restore(cls, tuple(values)), pos
+        elif tag == _LIST:
+            count, pos = _read_varint(buf, pos)
+            items = []
+            for _ in range(count):
+                if buf[pos] == _NOTES:
+                    pos = self._notes(buf, pos + 1, items)
+                else:
+                    value, pos = self._value(buf, pos)
+                    items.append(value)
+            return items, pos
+        elif tag == _NONE:
+            return None, pos
+        elif tag == _SHARED:
+            number, pos = _read_varint(buf, pos)
+            return self._shared[number], pos
+        elif tag == _FALSE:
+            return False, pos
+        elif tag == _TRUE:
+            return True, pos
+        elif tag == _INT:
+            number, pos = _read_varint(buf, pos)
+            return (~(number >> 1) if number & 1 else number >> 1), pos
+        elif tag == _TUPLE:
+            count, pos = _read_varint(buf, pos)
+            items = []
+            for _ in range(count):
+                value, pos = self._value(buf, pos)
+                items.append(value)
+            return tuple(items), pos
+        elif tag == _UNICODE:
+            number, pos = _read_varint(buf, pos)
+            return self._strings[number].decode('utf-8'), pos
+        elif tag == _FLOAT:
+            return _DOUBLE.unpack(str(buf[pos:pos + 8]))[0], pos + 8
+        elif tag == _DICT_OBJECT:
+            number, pos = _read_varint(buf, pos)
+            obj = object.__new__(self._classes[number])
+            count, pos = _read_varint(buf, pos)
+            for _ in range(count):
+                name, pos = _read_varint(buf, pos)
+                value, pos = self._value(buf, pos)
+                obj.__dict__[self._strings[name]] = value
+            return obj, pos
+        elif tag == _DICT or tag == _ORDERED_DICT:
+            count, pos = _read_varint(buf, pos)
+            items = []
+            for _ in range(count):
+                key, pos = self._value(buf, pos)
+                value, pos = self._value(buf, pos)
+                items.append((key, value))
+            return (dict if tag == _DICT else OrderedDict)(items), pos
+        raise SnapshotError("unknown tag %d at %d" % (tag, pos - 1))
+
+    def _notes(self, buf, pos, items):
+        """Read a column block of notes into items, return new position."""
+        count, pos = _read_varint(buf, pos)
+        strings = self._strings
+        columns = []
+        for _ in range(3):
+            column = []
+            for _ in range(count):
+                number = buf[pos]
+                pos += 1
+                if number >= 0x80:
+                    number, pos = _read_varint(buf, pos - 1)
+                column.append(strings[number])
+            columns.append(column)
+        flags = buf[pos:pos + count]
+        pos += count
+        new = object.__new__
+        (pitch_name, octave_name, duration_name, division_name, tie_name,
+         commands_name, spanners_name) = _NOTE_STATE
+        for pitch, octave, duration, flag in zip(
+                columns[0], columns[1], columns[2], flags):
+            note = new(Note)
+            # a dict display is a lot faster than zipping names and values
+            note.__dict__ = {
+                pitch_name: pitch,
+                octave_name: octave,
+                duration_name: duration,
+                division_name: None,
+                tie_name: flag & 2 == 2,
+                commands_name: [],
+                spanners_name: []}
+            if flag & 29:
+                attributes = note.__dict__
+                for bit, name in (
+                        (1, division_name), (4, tie_name),
+                        (8, commands_name), (16, spanners_name)):
+                    if flag & bit:
+                        attributes[name], pos = self._value(buf, pos)
+            items.append(note)
+        return pos
+
+
+def loads(data):
+    """Load a tree from a snapshot string."""
+    return Snapshot(data).load()
+
+
+def load(source):
+    """Load a tree from a snapshot file object or path."""
+    if isinstance(source, basestring):
+        with open(source, 'rb') as snapshot_file:
+            return loads(snapshot_file.read())
+    return loads(source.read())
@@ -1,7 +1,8 @@
 """Spanner objects."""
+from lilyflower.pickling import CompactPickle
 
 
-class Spanner(object):
+class Spanner(CompactPickle):
 
     """
     Parent for spanner objects.
@@ -13,6 +14,7 @@ class Spanner(object):
     closed properly, even if a sequense is reversed or sorted.
     """
 
+    _state = ('_num_displays',)
     _num_displays = 0
     _delimiter_open = "("
     _delimiter_close = ")"
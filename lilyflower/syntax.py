@@ -17,6 +17,7 @@ from lilyflower.schemedata import (
     Procedure,
     Boolean,
     SignedInt)
+from lilyflower.tones import Pitch
 from lilyflower.errors import InvalidArgument
 
 Argument = namedtuple('Argument', 'name type_ optional')
@@ -170,6 +171,7 @@ markup_c = ('markup', 'comment', 'setting', 'variable')
 markup_a = ('markup', 'variable')
 music_c = ('music',)
 music_t = ('music', 'comment')
+music_a = ('music', 'variable')
 accent_t = ('attachment', 'accent')
 
 # arguments
@@ -223,6 +225,18 @@ procedure = Argument('procedure', Procedure, False)
 # TODO: create scheme stencil
 stencil = Argument('stencil', None, False)
 color = Argument('color', Color, False)
+style = Argument('style', Symbol, False)
+key_symbol = Argument('key_symbol', Symbol, False)
+tuning = Argument('tuning', List, False)
+# TODO: create scheme types for these
+shape_definition = Argument('shape_definition', None, False)
+lst = Argument('lst', None, False)
+bar = Argument('bar', String, False)
+main_music = Argument('main_music', music_a, False)
+grace = Argument('grace', music_a, False)
+pitch = Argument('pitch', Pitch, True)
+from_pitch = Argument('from_pitch', Pitch, False)
+to_pitch = Argument('to_pitch', Pitch, False)
 
 # markup container
 SPEC.markup(r'\markup', markup_t, None, markup_c)
@@ -359,7 +373,8 @@ SPEC.custom_tab_clef(
 SPEC.doubleflat(r'\doubleflat', markup_t, None, None)
 SPEC.doublesharp(r'\doublesharp', markup_t, None, None)
 # fermata is listed under accents as well as markup
-# to make things simpler, we place it under accents only.
+# to make things simpler, we define it under accents only,
+# with the markup type added.
 # SPEC.fermata(r'\fermata', markup_t, None, None)
 SPEC.flat(r'\flat', markup_t, None, None)
 SPEC.musicglyph(r'\musicglyph', markup_t, (glyph_name,), None)
@@ -485,7 +500,7 @@ SPEC.prallup(r'\prallup', accent_t, None, None)
 SPEC.reverseturn(r'\reverseturn', accent_t, None, None)
 SPEC.trill(r'\trill', accent_t, None, None)
 SPEC.shortfermata(r'\shortfermata', accent_t, None, None)
-SPEC.fermata(r'\fermata', accent_t, None, None)
+SPEC.fermata(r'\fermata', accent_t + ('markup',), None, None)
 SPEC.longfermata(r'\longfermata', accent_t, None, None)
 SPEC.verylongfermata(r'\verylongfermata', accent_t, None, None)
 SPEC.upbow(r'\upbow', accent_t, None, None)
@@ -561,7 +576,7 @@ SPEC.endSpanners(r'\endSpanners', music_t, None, music_c)
 SPEC.eventChords(r'\eventChords', music_t, None, music_c)
 SPEC.featherDurations(r'\featherDurations', music_t, None, music_c)
 SPEC.finger(r'\finger', music_t, None, music_c)
-SPEC.footnote(r'\footnote', music_t, None, music_c)
+SPEC.footnote_music(r'\footnote', music_t, None, music_c)
 SPEC.grace(r'\grace', music_t, None, music_c)
 SPEC.gobdescriptions(r'\gobdescriptions', music_t, None, music_c)
 SPEC.harmonicByFret(r'\harmonicByFret', music_t, None, music_c)
@@ -599,7 +614,7 @@ SPEC.pageTurn(r'\pageTurn', music_t, None, music_c)
 SPEC.palmMute(r'\palmMute', music_t, None, music_c)
 SPEC.palmMuteOn(r'\palmMuteOn', music_t, None, music_c)
 SPEC.parallelMusic(r'\parallelMusic', music_t, None, music_c)
-SPEC.parenthesize(r'\parenthesize', music_t, None, music_c)
+SPEC.parenthesize_music(r'\parenthesize', music_t, None, music_c)
 SPEC.partcombine(r'\partcombine', music_t, None, music_c)
 SPEC.partcombineDown(r'\partcombineDown', music_t, None, music_c)
 SPEC.partcombineForce(r'\partcombineForce', music_t, None, music_c)
@@ -612,7 +627,7 @@ SPEC.pointAndClockOn(r'\pointAndClockOn', music_t, None, music_c)
 SPEC.pointAndClickTypes(r'\pointAndClickTypes', music_t, None, music_c)
 SPEC.pushToTag(r'\pushToTag', music_t, None, music_c)
 SPEC.quoteDuring(r'\quoteDuring', music_t, None, music_c)
-SPEC.relative(r'\relative', music_t, None, music_c)
+SPEC.relative(r'\relative', music_t, (pitch,), music_c)
 SPEC.removeWithTag(r'\removeWithTag', music_t, None, music_c)
 SPEC.resetRelativeOctave(r'\resetRelativeOctave', music_t, None, music_c)
 SPEC.retrograde(r'\retrograde', music_t, None, music_c)
@@ -638,7 +653,8 @@ SPEC.tieDashPattern(r'\tieDashPattern', music_t, None, music_c)
 SPEC.time(r'\time', music_t, None, music_c)
 SPEC.times(r'\times', music_t, None, music_c)
 SPEC.tocItem(r'\tocItem', music_t, None, music_c)
-SPEC.transpose(r'\transpose', music_t, None, music_c)
+SPEC.transpose(
+    r'\transpose', music_t, (from_pitch, to_pitch), music_c)
 SPEC.transposedCueDuring(r'\transposedCueDuring', music_t, None, music_c)
 SPEC.transposition(r'\transposition', music_t, None, music_c)
 SPEC.tuplet(r'\tuplet', music_t, None, music_c)
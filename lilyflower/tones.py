@@ -7,6 +7,7 @@ from lilyflower.errors import (
     InvalidArgument)
 from lilyflower.spanners import Spanner
 from lilyflower.notecommands import NoteCommand
+from lilyflower.pickling import CompactPickle
 
 
 def _validate_pitch(pitch):
@@ -35,10 +36,11 @@ def _validate_duration(duration):
         raise InvalidDuration("%s is not a valid duration" % duration)
 
 
-class Tone(object):
+class Tone(CompactPickle):
 
     """Grouping class so tones can be recognized."""
 
+    _types = ('music',)
     _inline = True
 
 
@@ -94,6 +96,8 @@ class Pitch(Tone):
 
     """Pitch - octave and pitch without duration."""
 
+    _state = ('_pitch', 'octave')
+
     def __init__(self, pitch, octave=""):
         """Set basic data."""
         self._pitch = pitch
@@ -110,6 +114,8 @@ class Rest(Tone, NoteCommandMixin):
 
     """Rest - duration - no octave and pitch."""
 
+    _state = ('_duration', '_note_commands')
+
     def __init__(self, duration="", note_commands=None):
         """Set basic data."""
         self._duration = duration
@@ -125,6 +131,10 @@ class Note(Tone, NoteCommandMixin, SpannerMixin):
 
     """Represent a single pitch."""
 
+    _state = (
+        '_pitch', 'octave', '_duration', '_division', '_tie',
+        '_note_commands', '_spanners')
+
     def __init__(
             self,
             pitch,
@@ -179,6 +189,10 @@ class Chord(Tone, NoteCommandMixin, SpannerMixin):
 
     """All the goodness of notes, but with more of them together."""
 
+    _state = (
+        '_pitches', '_duration', '_division', '_tie', '_note_commands',
+        '_spanners')
+
     def __init__(
             self,
             pitches,
@@ -1,4 +1,6 @@
 """Some tools."""
+from contextlib import contextmanager
+import gc
 import re
 from lilyflower.schemedata import (
     String,
@@ -17,6 +19,11 @@ from lilyflower.schemedata import (
     Boolean)
 from lilyflower.errors import InvalidArgument
 
+# format spec for code without indentation or newlines
+COMPACT = "c"
+# comment a `LilyFile` starts with, see `without_creation_comment`
+_CREATED = re.compile(r"\A% Created with lilyflower at [^\n]*\n")
+
 
 def compare_iter(one, two):
     r"""
@@ -48,6 +55,107 @@ def compare_iter(one, two):
     return False
 
 
+def get_indent_level(format_spec):
+    """
+    Read the indent level from a format spec.
+
+    Lilyflower objects take their indent level as format spec, with ""
+    for level 0. The `COMPACT` spec asks for code with as little
+    whitespace as possible instead, which gives None.
+
+    .. testsetup::
+
+        from lilyflower.tools import get_indent_level, COMPACT
+
+    .. doctest::
+
+        >>> print get_indent_level(""), get_indent_level("2")
+        0 2
+        >>> print get_indent_level(COMPACT)
+        None
+    """
+    if format_spec == "":
+        return 0
+    if format_spec == COMPACT:
+        return None
+    return int(format_spec)
+
+
+def child_format_spec(indent_level):
+    """Return the format spec for children, see `get_indent_level`."""
+    if indent_level is None:
+        return COMPACT
+    return str(indent_level + 1)
+
+
+def format_pieces(pieces):
+    """
+    Join pieces of lilypond code into a string.
+
+    Pieces are strings, or (object, format_spec) tuples that are
+    formatted first. See `Node._iter_format`.
+
+    .. testsetup::
+
+        from lilyflower.tools import format_pieces
+        from lilyflower.tones import Note
+
+    .. doctest::
+
+        >>> print format_pieces(["{ ", (Note('c'), "1"), " }"])
+        { c }
+    """
+    return "".join([
+        format(*piece) if type(piece) is tuple else piece
+        for piece in pieces])
+
+
+def shallow_copy(obj):
+    """
+    Return a copy of obj that shares its attribute values.
+
+    Observers belong to the object they were added to, so the copy is
+    not observed, see `lilyflower.events`. Retrograde, transformers and
+    history all copy nodes this way.
+    """
+    new = object.__new__(type(obj))
+    attributes = new.__dict__
+    attributes.update(obj.__dict__)
+    attributes.pop('_observers', None)
+    return new
+
+
+def without_creation_comment(text):
+    """
+    Return lilypond code without the creation comment it starts with.
+
+    The comment has the time, so it changes every time a file is
+    formatted. Hashes of code that should only change with the music
+    are made without it.
+    """
+    return _CREATED.sub("", text, 1)
+
+
+@contextmanager
+def collection_paused(pause=True):
+    """
+    Turn off garbage collection in the block, if pause is true.
+
+    Building a big tree only makes new objects, so the collection passes
+    python starts along the way find nothing to free, and take longer
+    the bigger the tree gets. Garbage collection is process wide:
+    other threads don't collect either while the block runs.
+    """
+    enabled = pause and gc.isenabled()
+    if enabled:
+        gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
+
 def property_to_class(name):
     r"""Convert property name to class name.
 
@@ -140,7 +248,10 @@ def generate_docstring(class_name, attributes):
         docstring += """:class:`lilyflower.errors.InvalidContent`
     """
 
+    # tones imports this module
+    from lilyflower.tones import Pitch
     imports_scheme = []
+    imports_tones = []
     imports_this = [class_name]
     args = []
     for arg in attributes.arguments:
@@ -158,6 +269,10 @@ def generate_docstring(class_name, attributes):
                 # dependencies
                 args.append(("Bold([])", r"\bold { }"))
             # TODO: handle other argument types (like 'music')
+        elif issubclass(arg.type_, Pitch):
+            if "Pitch" not in imports_tones:
+                imports_tones.append("Pitch")
+            args.append(("Pitch('c')", Pitch('c')))
         elif issubclass(arg.type_, String):
             imports_scheme.append("String")
             args.append(("String('test')", String("test")))
@@ -251,6 +366,9 @@ def generate_docstring(class_name, attributes):
     if len(imports_scheme) > 0:
         docstring += """    from lilyflower.schemedata import {imports}
     """.format(imports=", ".join(imports_scheme))
+    if len(imports_tones) > 0:
+        docstring += """    from lilyflower.tones import {imports}
+    """.format(imports=", ".join(imports_tones))
 
     docstring += """
 
@@ -0,0 +1,159 @@
+r"""
+Slices of content that don't copy it.
+
+Slicing a `Node` or `Container` gives a `View`: a read-only sequence
+over a range of the content, that reads the content directly when it
+is used. Views can be sliced again, iterated in both directions, and
+formatted like a container with those items, so part of a voice can be
+written out without copying it.
+
+A view sees later changes to the items in its range, but its length is
+fixed when it is made. Pickling a view stores a copy of its items.
+
+Examples
+========
+.. testsetup::
+
+    from lilyflower.container import Container
+    from lilyflower.tones import Note
+
+.. doctest::
+
+    >>> music = Container([Note(name) for name in 'cdefgab'])
+    >>> part = music[1:6]
+    >>> len(part)
+    5
+    >>> print format(part)
+    {
+      d e f g a
+    }
+    >>> print format(part[::-2])
+    {
+      a f d
+    }
+    >>> print " ".join(format(note) for note in reversed(music))
+    b a g f e d c
+"""
+from itertools import islice, izip
+from lilyflower.container import Container
+from lilyflower.tools import format_pieces, get_indent_level
+
+
+class View(object):
+
+    """
+    Read-only view of a range of a sequence.
+
+    Usage::
+
+        View(sequence, start=None, stop=None, step=None)
+
+    Parameters
+    ==========
+    sequence: list-like
+        the content to look at, anything with len and integer indexing
+    start, stop, step: int, optional
+        the range, like in a slice
+    """
+
+    __slots__ = ('_sequence', '_start', '_step', '_length')
+    _inline = False
+    # layout of a plain container, see `Container._iter_items`
+    _command = ""
+    _delimiter_pre = Container._delimiter_pre
+    _delimiter_post = Container._delimiter_post
+    _validated_arguments = ()
+    _iter_items = vars(Container)['_iter_items']
+
+    def __init__(self, sequence, start=None, stop=None, step=None):
+        """Store sequence and range."""
+        start, stop, step = slice(start, stop, step).indices(len(sequence))
+        self._sequence = sequence
+        self._start = start
+        self._step = step
+        self._length = len(xrange(start, stop, step))
+
+    def _position(self, index):
+        """Return the index into the sequence for index into the view."""
+        if index < 0:
+            index += self._length
+        if not 0 <= index < self._length:
+            raise IndexError("view index out of range")
+        return self._start + index * self._step
+
+    def __len__(self):
+        """Return number of items."""
+        return self._length
+
+    def __iter__(self):
+        """Iterate over the items."""
+        sequence = self._sequence
+        if self._step == 1 and type(sequence) is list:
+            return islice(sequence, self._start, self._start + self._length)
+        return (sequence[index] for index in xrange(
+            self._start, self._start + self._length * self._step,
+            self._step))
+
+    def __reversed__(self):
+        """Iterate over the items backwards."""
+        sequence = self._sequence
+        last = self._start + (self._length - 1) * self._step
+        return (sequence[index] for index in xrange(
+            last, last - self._length * self._step, -self._step))
+
+    def __getitem__(self, index):
+        """Return item at index, or a view for a slice."""
+        if isinstance(index, slice):
+            start, stop, step = index.indices(self._length)
+            view = View.__new__(View)
+            view._sequence = self._sequence
+            view._start = self._start + start * self._step
+            view._step = self._step * step
+            view._length = len(xrange(start, stop, step))
+            return view
+        return self._sequence[self._position(index)]
+
+    def __contains__(self, value):
+        """See if value is one of the items."""
+        return any(item == value for item in self)
+
+    def __eq__(self, other):
+        """Compare items with another view or a list."""
+        if isinstance(other, (View, list)):
+            return len(self) == len(other) and \
+                all(mine == theirs for mine, theirs in izip(self, other))
+        return NotImplemented
+
+    def __ne__(self, other):
+        """Compare items with another view or a list."""
+        equal = self.__eq__(other)
+        return equal if equal is NotImplemented else not equal
+
+    __hash__ = None
+
+    def __repr__(self):
+        """Show items like a list."""
+        return "View(%r)" % list(self)
+
+    def __reduce__(self):
+        """Pickle a copy of the items."""
+        return (View, (list(self),))
+
+    def index(self, value):
+        """Find index of value."""
+        for index, item in enumerate(self):
+            if item == value:
+                return index
+        raise ValueError("%r is not in view" % (value,))
+
+    def count(self, value):
+        """Count occurances of value."""
+        return sum(1 for item in self if item == value)
+
+    def __format__(self, format_spec):
+        """Return lilypond code."""
+        return format_pieces(self._iter_format(get_indent_level(format_spec)))
+
+    def _iter_format(self, indent_level):
+        """Generate lilypond code in pieces, see `Container._iter_format`."""
+        return self._iter_items(indent_level, iter(self), self._length)
@@ -0,0 +1,308 @@
+r"""
+Visitors and transformers for lilyflower trees.
+
+A `Visitor` walks a tree and calls a method for every lilyflower
+object it meets, picked by class: ``visit_Note`` for notes, and so on.
+If a class has no method of its own, the one for the nearest base class
+is used (``visit_Tone`` for all tones, ``visit_SchemeData`` for scheme
+data), so there is no need for ``isinstance`` chains. Which method goes
+with which class is worked out once per class and cached.
+
+``visit_<Class>`` is called on the way down and can return `SKIP` to
+leave out everything below the object, or `STOP` to end the walk.
+``leave_<Class>`` is called on the way back up, after everything below
+the object was visited.
+
+A `Transformer` also rebuilds the tree: ``leave_<Class>`` can return a
+replacement, or `REMOVE` to drop the object from the content it's in.
+Returning None keeps the object. Only objects with a changed child are
+copied, everything else in the new tree is shared with the old one, and
+the old tree is not changed. An object that occurs more than once, like
+a spanner, is transformed once and replaced by the same result
+everywhere. When ``visit_<Class>`` returns `STOP`, the result is the
+tree as far as it was transformed: the object that stopped the walk and
+everything after it are left as they were, and no more ``leave_<Class>``
+methods are called.
+
+Below an object are the content of containers and nodes, the arguments
+of nodes, the pitches of chords and the note commands and spanners of
+tones. The walk uses an explicit stack, so deep trees don't hit the
+recursion limit.
+
+Examples
+========
+.. testsetup::
+
+    from lilyflower.visitor import Visitor, Transformer, SKIP
+    from lilyflower.container import Container
+    from lilyflower.tones import Note, Rest
+
+.. doctest::
+
+    >>> class CountTones(Visitor):
+    ...     count = 0
+    ...     def visit_Tone(self, tone):
+    ...         self.count += 1
+    ...         return SKIP
+    >>> music = Container([Note('c'), Container([Note('d'), Rest()])])
+    >>> counter = CountTones()
+    >>> counter.visit(music)
+    >>> counter.count
+    3
+    >>> class RestsToNotes(Transformer):
+    ...     def leave_Rest(self, rest):
+    ...         return Note('c', '', rest._duration)
+    >>> print format(RestsToNotes().transform(music))
+    {
+      c
+      {
+        d c
+      }
+    }
+"""
+from collections import OrderedDict
+from lilyflower.pickling import CompactPickle
+from lilyflower.rope import Rope
+from lilyflower.tools import shallow_copy
+
+
+class _Signal(object):
+
+    """Special return value of a visitor method."""
+
+    def __init__(self, name):
+        """Store name."""
+        self._name = name
+
+    def __repr__(self):
+        """Return name."""
+        return self._name
+
+SKIP = _Signal('SKIP')
+STOP = _Signal('STOP')
+REMOVE = _Signal('REMOVE')
+
+# attributes that hold the objects below an object, in walking order
+_CHILD_FIELDS = (
+    '_stored_arguments',
+    '_pitches',
+    '_container',
+    '_content',
+    '_note_commands',
+    '_spanners')
+# class -> names of its child fields
+_FIELDS = {}
+# (visitor class, class) -> (visit function, leave function)
+_DISPATCH = {}
+
+
+def _fields(cls):
+    """Return the names of the attributes that hold children of cls."""
+    fields = _FIELDS.get(cls)
+    if fields is None:
+        if issubclass(cls, CompactPickle):
+            fields = tuple(
+                name for name in _CHILD_FIELDS if name in cls._state)
+        else:
+            fields = ()
+        _FIELDS[cls] = fields
+    return fields
+
+
+def _children(obj, fields):
+    """Return a list of the values in the child fields of obj."""
+    children = []
+    for name in fields:
+        value = getattr(obj, name)
+        if value is None:
+            continue
+        elif type(value) is OrderedDict:
+            children.extend(value.itervalues())
+        else:
+            children.extend(value)
+    return children
+
+
+def _stopped(stack):
+    """Return the tree with everything that is not done left as it was."""
+    result = None
+    while stack:
+        obj, fields, children, results, changed = stack.pop()
+        if result is not None:
+            results.append(result)
+            changed = changed or result is not children[len(results) - 1]
+        results.extend(children[len(results):])
+        result = _rebuild(obj, fields, results) if changed else obj
+    return result
+
+
+def _rebuild(obj, fields, results):
+    """Return a copy of obj with results as the values of its children."""
+    new = shallow_copy(obj)
+    position = 0
+    for name in fields:
+        value = getattr(obj, name)
+        if value is None:
+            continue
+        end = position + len(value)
+        if type(value) is OrderedDict:
+            replacement = OrderedDict(
+                (key, result) for key, result in zip(
+                    value.iterkeys(), results[position:end])
+                if result is not REMOVE)
+        else:
+            replacement = [
+                result for result in results[position:end]
+                if result is not REMOVE]
+            if type(value) is Rope:
+                replacement = Rope(replacement, value._chunk_size)
+        setattr(new, name, replacement)
+        position = end
+    return new
+
+
+class Visitor(object):
+
+    """
+    Walk a tree, calling methods by class.
+
+    Subclasses define ``visit_<Class>`` and ``leave_<Class>`` methods
+    for the classes they are interested in, see the module
+    documentation.
+    """
+
+    def _dispatch(self, cls):
+        """Return (visit function, leave function) for objects of cls."""
+        key = (type(self), cls)
+        functions = _DISPATCH.get(key)
+        if functions is None:
+            found = []
+            for prefix in ('visit_', 'leave_'):
+                for base in cls.__mro__:
+                    function = getattr(
+                        type(self), prefix + base.__name__, None)
+                    if function is not None:
+                        found.append(function.__func__)
+                        break
+                else:
+                    found.append(None)
+            functions = _DISPATCH[key] = tuple(found)
+        return functions
+
+    def visit(self, tree):
+        """Walk tree, top down."""
+        # (object, leaving) pairs
+        stack = [(tree, False)]
+        pop = stack.pop
+        push = stack.append
+        dispatch = _DISPATCH
+        visitor_class = type(self)
+        while stack:
+            obj, leaving = pop()
+            cls = type(obj)
+            functions = dispatch.get((visitor_class, cls))
+            if functions is None:
+                if not isinstance(obj, CompactPickle):
+                    continue
+                functions = self._dispatch(cls)
+            if leaving:
+                functions[1](self, obj)
+                continue
+            result = None
+            if functions[0] is not None:
+                result = functions[0](self, obj)
+                if result is STOP:
+                    return
+            if functions[1] is not None:
+                push((obj, True))
+            if result is SKIP:
+                continue
+            fields = _FIELDS.get(cls)
+            if fields is None:
+                fields = _fields(cls)
+            if fields:
+                children = _children(obj, fields)
+                children.reverse()
+                stack.extend([(child, False) for child in children])
+
+
+class Transformer(Visitor):
+
+    """
+    Rebuild a tree, replacing objects by what methods return.
+
+    ``leave_<Class>`` methods return a replacement, `REMOVE`, or None to
+    keep the object, see the module documentation.
+    """
+
+    def transform(self, tree):
+        """Return the transformed tree, tree itself if nothing changed."""
+        # results for objects that were already done
+        done = {}
+        # frames of [object, fields, children, results, changed]
+        stack = []
+        result = self._start(tree, stack, done)
+        if result is STOP:
+            return tree
+        while stack:
+            frame = stack[-1]
+            children, results = frame[2], frame[3]
+            while len(results) < len(children):
+                child = children[len(results)]
+                if not isinstance(child, CompactPickle):
+                    results.append(child)
+                    continue
+                if id(child) in done:
+                    result = done[id(child)]
+                else:
+                    result = self._start(child, stack, done)
+                    if result is STOP:
+                        return _stopped(stack)
+                    if stack[-1] is not frame:
+                        break
+                results.append(result)
+                if result is not child:
+                    frame[4] = True
+            else:
+                stack.pop()
+                obj, fields = frame[0], frame[1]
+                new = _rebuild(obj, fields, results) if frame[4] else obj
+                result = self._finish(obj, new, done)
+                if stack:
+                    parent = stack[-1]
+                    parent[3].append(result)
+                    if result is not obj:
+                        parent[4] = True
+        return result
+
+    def _start(self, obj, stack, done):
+        """
+        Call the visit method for obj, then push a frame for its children.
+
+        Returns the result for obj if it has no children to do, and
+        `STOP` if the walk ends here.
+        """
+        if not isinstance(obj, CompactPickle):
+            return obj
+        visit = self._dispatch(type(obj))[0]
+        signal = None if visit is None else visit(self, obj)
+        if signal is STOP:
+            return STOP
+        if signal is SKIP:
+            return self._finish(obj, obj, done)
+        fields = _fields(type(obj))
+        children = _children(obj, fields) if fields else None
+        if not children:
+            return self._finish(obj, obj, done)
+        stack.append([obj, fields, children, [], False])
+        return None
+
+    def _finish(self, obj, new, done):
+        """Call the leave method, return and remember the result."""
+        leave = self._dispatch(type(obj))[1]
+        if leave is not None:
+            result = leave(self, new)
+            if result is not None:
+                new = result
+        done[id(obj)] = new
+        return new
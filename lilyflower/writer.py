@@ -0,0 +1,259 @@
+r"""
+Streaming output of lilypond code.
+
+`format` builds the code for a whole tree in memory before returning
+it. The functions here produce the same code piece by piece instead,
+walking the tree with an explicit stack, so output can start right away
+and memory use does not grow with the size of the score.
+
+Containers and nodes are expanded as they are reached. Other objects,
+and subclasses with their own `__format__`, are formatted as a whole.
+
+Since output comes in chunks, an event loop can serve other requests
+in between. With tornado, for example::
+
+    for chunk in iter_chunks(lily_file):
+        self.write(chunk)
+        yield self.flush()
+
+To write a file, `save` streams into a temporary file next to it and
+renames that over the old file when done, so a crash never leaves a
+half written file behind. It can also compress the output, and leave
+the file alone when the code did not change.
+
+Examples
+========
+.. testsetup::
+
+    from lilyflower.writer import iter_chunks, write
+    from lilyflower.container import Container
+    from lilyflower.tones import Note
+    from StringIO import StringIO
+
+.. doctest::
+
+    >>> music = Container([Note('c'), Note('d'), Container([Note('e')])])
+    >>> for chunk in iter_chunks(music, chunk_size=4):
+    ...     print repr(chunk)
+    '{\n  '
+    'c d\n  '
+    'e\n}'
+    >>> target = StringIO()
+    >>> write(music, target)
+    >>> target.getvalue() == format(music)
+    True
+"""
+import gzip
+import hashlib
+import itertools
+import os
+import stat
+import sys
+import tempfile
+import zlib
+from lilyflower.tools import (
+    get_indent_level, without_creation_comment, COMPACT)
+
+CHUNK_SIZE = 64 * 1024
+BUFFER_SIZE = 1024 * 1024
+
+# the umask can only be read by setting it, which is not thread safe,
+# so do it once, before any threads are started
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+
+# class -> whether its own formatting can be streamed
+_STREAMABLE = {}
+
+
+def _streamable(cls):
+    """See if the __format__ used by cls comes with an _iter_format."""
+    if cls not in _STREAMABLE:
+        for base in cls.__mro__:
+            if '__format__' in vars(base):
+                _STREAMABLE[cls] = '_iter_format' in vars(base)
+                break
+        else:
+            _STREAMABLE[cls] = False
+    return _STREAMABLE[cls]
+
+
+def iter_format(obj, format_spec="", substitute=None):
+    """
+    Generate the lilypond code for obj, in small pieces.
+
+    If given, substitute is called with every object and format spec
+    below obj. When it returns a string, that is used instead of the
+    code for the object. A string obj is lilypond code already, and
+    comes out as it is, whatever the format spec.
+    """
+    if isinstance(obj, basestring):
+        yield obj
+        return
+    stack = [iter([(obj, format_spec)])]
+    while stack:
+        for piece in stack[-1]:
+            if type(piece) is not tuple:
+                yield piece
+                continue
+            child, spec = piece
+            if substitute is not None and child is not obj:
+                replacement = substitute(child, spec)
+                if replacement is not None:
+                    yield replacement
+                    continue
+            if _streamable(type(child)):
+                stack.append(child._iter_format(get_indent_level(spec)))
+                break
+            yield format(child, spec)
+        else:
+            stack.pop()
+
+
+def iter_chunks(obj, chunk_size=CHUNK_SIZE, format_spec=""):
+    """Generate the lilypond code for obj, in chunks of about chunk_size."""
+    pieces = []
+    size = 0
+    for piece in iter_format(obj, format_spec):
+        pieces.append(piece)
+        size += len(piece)
+        if size >= chunk_size:
+            yield "".join(pieces)
+            pieces = []
+            size = 0
+    if pieces:
+        yield "".join(pieces)
+
+
+def write(obj, target, chunk_size=CHUNK_SIZE, compact=False):
+    """Write lilypond code for obj to a file object or path."""
+    if isinstance(target, basestring):
+        with open(target, 'w') as output:
+            write(obj, output, chunk_size, compact)
+        return
+    format_spec = COMPACT if compact else ""
+    for chunk in iter_chunks(obj, chunk_size, format_spec):
+        target.write(chunk)
+
+
+def _body_digest(chunks):
+    """Hash of chunks of lilypond code, without creation time."""
+    digest = hashlib.sha1()
+    first = True
+    for chunk in chunks:
+        if first:
+            chunk = without_creation_comment(chunk)
+            first = False
+        digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _open_read(path, compress):
+    """Open a file written by save for reading."""
+    if compress:
+        return gzip.open(path, 'rb')
+    return open(path, 'rb')
+
+
+def _file_digest(path, compress):
+    """Hash of a file written by save, None if it can't be read."""
+    try:
+        with _open_read(path, compress) as input_file:
+            first = input_file.readline()
+            rest = iter(lambda: input_file.read(CHUNK_SIZE), b"")
+            return _body_digest(itertools.chain([first], rest))
+    except (IOError, EOFError, zlib.error):
+        return None
+
+
+def _mode(path):
+    """Permissions for the new file, same as the old one if there is one."""
+    try:
+        return stat.S_IMODE(os.stat(path).st_mode)
+    except OSError:
+        return 0o666 & ~_UMASK
+
+
+def save(obj, path, fsync=False, compress=None, keep_unchanged=False,
+         compact=False, buffer_size=BUFFER_SIZE):
+    """
+    Write lilypond code for obj to a file, atomically.
+
+    The code is streamed into a temporary file in the same directory,
+    which then replaces path in a single rename. If anything goes
+    wrong, the temporary file is removed and path is left as it was, so
+    there never is a half written file.
+
+    Parameters
+    ==========
+    obj: lilyflower object
+        what to write, usually a `LilyFile`, or a string of code that
+        is written as it is
+    path: str
+        file to write
+    fsync: bool, optional
+        make sure the file is on disk before it replaces path
+    compress: bool, optional
+        gzip the output, default is to compress when path ends in .gz
+    keep_unchanged: bool, optional
+        if path already contains the same code (apart from the creation
+        time), leave it alone, so its modification time stays the same
+        and build tools don't do unnecessary work
+    compact: bool, optional
+        write code with as little whitespace as possible, see
+        `lilyflower.tools.get_indent_level`
+    buffer_size: int, optional
+        write buffer size in bytes
+
+    Returns
+    =======
+    bool, False if the file was left alone because it did not change
+    """
+    if compress is None:
+        compress = path.endswith('.gz')
+    directory = os.path.dirname(os.path.abspath(path))
+    handle, temp_path = tempfile.mkstemp(
+        prefix='.' + os.path.basename(path) + '-', dir=directory)
+    try:
+        with os.fdopen(handle, 'wb', buffer_size) as raw:
+            if compress:
+                # no name or time in the header, same code gives same bytes
+                output = gzip.GzipFile(
+                    filename='', mode='wb', fileobj=raw, mtime=0)
+            else:
+                output = raw
+
+            def written():
+                """Write chunks as they pass."""
+                format_spec = COMPACT if compact else ""
+                for chunk in iter_chunks(obj, format_spec=format_spec):
+                    output.write(chunk)
+                    yield chunk
+            digest = _body_digest(written())
+            if compress:
+                output.close()
+            if fsync:
+                raw.flush()
+                os.fsync(raw.fileno())
+        if keep_unchanged and _file_digest(path, compress) == digest:
+            os.remove(temp_path)
+            return False
+        os.chmod(temp_path, _mode(path))
+        if os.name == 'nt' and os.path.exists(path):
+            # rename does not replace files on windows
+            os.remove(path)
+        os.rename(temp_path, path)
+    except:
+        exc_info = sys.exc_info()
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+        raise exc_info[0], exc_info[1], exc_info[2]
+    if fsync and hasattr(os, 'O_DIRECTORY'):
+        directory_handle = os.open(directory, os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(directory_handle)
+        finally:
+            os.close(directory_handle)
+    return True
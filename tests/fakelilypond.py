@@ -0,0 +1,56 @@
+"""
+Stand-in for the lilypond binary, used by the render tests.
+
+Understands --pdf, --png, --ps and -o, writes output files that contain
+the format and the input, and reports an error for input containing
+'\\error'. Every run is logged to the file named by $FAKE_LILYPOND_LOG.
+"""
+import os
+import sys
+
+
+def main(args):
+    """Pretend to compile the input files."""
+    formats = []
+    output = None
+    inputs = []
+    args = list(args)
+    while args:
+        arg = args.pop(0)
+        if arg == '-o':
+            output = args.pop(0)
+        elif arg.startswith('--'):
+            formats.append(arg[2:])
+        elif not arg.startswith('-'):
+            inputs.append(arg)
+    if 'FAKE_LILYPOND_LOG' in os.environ:
+        with open(os.environ['FAKE_LILYPOND_LOG'], 'a') as log:
+            log.write(" ".join(inputs) + "\n")
+    failed = []
+    for filename in inputs:
+        sys.stdout.write("Processing `%s'\n" % filename)
+        with open(filename) as source:
+            text = source.read()
+        if '\\error' in text:
+            line = text[:text.index('\\error')].count("\n") + 1
+            sys.stdout.write(
+                "%s:%d:1: error: unknown escaped string: `\\error'\n" % (
+                    filename, line))
+            failed.append(filename)
+            continue
+        base = output if output is not None else filename[:-3]
+        for output_format in formats:
+            with open("%s.%s" % (base, output_format), 'w') as result:
+                result.write("%s\n%s" % (output_format, text))
+        if '\\midi' in text:
+            with open("%s.midi" % base, 'w') as result:
+                result.write("midi")
+    if failed:
+        sys.stdout.write("fatal error: failed files: \"%s\"\n" % (
+            " ".join(failed)))
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,54 @@
+"""Tests for lilyflower.benchmark."""
+import json
+import os
+from lilyflower import benchmark
+from lilyflower.benchmark import Config, compare, generate, run, run_all
+# pylint: disable=no-name-in-module
+from nose.tools import assert_equals, assert_greater, assert_true
+
+_SMALL = Config(notes=20, voices=2, depth=2, markup=0.2)
+
+
+def test_generate():
+    """Test generated scores only depend on config and seed."""
+    assert_equals(
+        format(generate(_SMALL, seed=3)).split("\n", 1)[1],
+        format(generate(_SMALL, seed=3)).split("\n", 1)[1])
+    assert_true(
+        format(generate(_SMALL, seed=3)).split("\n", 1)[1] !=
+        format(generate(_SMALL, seed=4)).split("\n", 1)[1])
+
+
+def test_run():
+    """Test a run measures everything."""
+    result = run(_SMALL, repeat=1)
+    for key in benchmark.TIMINGS:
+        assert_true(result[key] >= 0)
+    assert_true(result['round_trip'])
+    assert_greater(result['bytes'], 0)
+    assert_greater(result['snapshot_bytes'], 0)
+    if hasattr(os, 'fork'):
+        # memory is measured on python 2 as well
+        assert_true(result['construct_memory'] >= 0)
+        assert_true(result['format_memory'] >= 0)
+
+
+def test_peak():
+    """Test peak memory grows with what the function allocates."""
+    small = benchmark._peak(lambda: None)  # pylint: disable=protected-access
+    big = benchmark._peak(  # pylint: disable=protected-access
+        lambda: [None] * (8 * 1024 * 1024))
+    if small is not None:
+        assert_greater(big, small + 32 * 1024 * 1024)
+
+
+def test_compare():
+    """Test regressions are found between stored runs."""
+    old = run_all([_SMALL], repeat=1)
+    new = json.loads(json.dumps(old))
+    assert_equals(compare(old, new), [])
+    new['results'][0]['format'] = old['results'][0]['format'] * 2 + 1
+    regressions = compare(old, new)
+    assert_equals([(config, key) for config, key, _, _ in regressions],
+                  [(_SMALL, 'format')])
+
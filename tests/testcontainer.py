@@ -29,6 +29,12 @@ class Note(object):
                 return True
         return False
 
+    def __lt__(self, other):
+        """Order by note, so sorting doesn't depend on memory addresses."""
+        if isinstance(other, Note):
+            return self.note < other.note
+        return self.note < other
+
 
 def test_init():
     """Test Container.__init__()."""
@@ -0,0 +1,27 @@
+"""Tests for lilyflower.dom."""
+from lilyflower.dom import (
+    Markup, Bold, Italic, AbsFontsize, Combine, Concat, Eyeglasses, Fermata,
+    Huge)
+from lilyflower.node import Node
+from lilyflower.schemedata import SignedFloat
+from lilyflower.tools import COMPACT
+# pylint: disable=no-name-in-module
+from nose.tools import assert_equals
+
+
+def test_compiled_format():
+    """Test specialised formatting gives the same code as Node."""
+    nodes = [
+        Eyeglasses(),
+        Fermata(),
+        Fermata(position='^'),
+        Combine(Eyeglasses(), Fermata()),
+        Bold(),
+        Bold([Eyeglasses()]),
+        Concat(),
+        AbsFontsize(SignedFloat(2), []),
+        AbsFontsize(SignedFloat(2), [Huge([Eyeglasses()])]),
+        Markup([Bold([Italic([Eyeglasses()]), Eyeglasses()]), Huge()])]
+    for node in nodes:
+        for spec in ("", "2", COMPACT):
+            assert_equals(format(node, spec), Node.__format__(node, spec))
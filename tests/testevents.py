@@ -0,0 +1,149 @@
+"""Tests for lilyflower.events."""
+import cPickle
+import threading
+from lilyflower.events import batch, observe, unobserve
+from lilyflower.container import Container
+from lilyflower.dom import Relative
+from lilyflower.repetition import Repetition
+from lilyflower.rope import chunk_content
+from lilyflower.tones import Note
+# pylint: disable=no-name-in-module
+from nose.tools import assert_equals, assert_is, assert_raises
+
+
+class _Recorder(object):
+
+    """Observer that keeps changes, with content formatted."""
+
+    def __init__(self, obj):
+        """Start observing obj."""
+        self.changes = []
+        observe(obj, self)
+
+    def __call__(self, change):
+        """Record change."""
+        def show(value):
+            """Format items."""
+            if isinstance(value, list):
+                return " ".join(format(item, 'c') for item in value)
+            return value
+        self.changes.append((
+            change.operation, change.index,
+            show(change.old), show(change.new)))
+
+
+def _notes(names):
+    """Return notes for names."""
+    return [Note(name) for name in names]
+
+
+def test_container():
+    """Test every container mutator reports its change."""
+    music = Container(_notes('cde'))
+    changes = _Recorder(music).changes
+    music.append(Note('f'))
+    music.extend(_notes('ga'))
+    music.insert(-1, Note('b'))
+    music.pop()
+    music.remove(music[0])
+    music[0] = Note('c')
+    music[1:3] = _notes('gab')
+    del music[::2]
+    music.sort(key=lambda note: note._pitch)
+    music.reverse()
+    music *= 2
+    assert_equals(changes, [
+        ('append', 3, "", "f"),
+        ('extend', 4, "", "g a"),
+        ('insert', 5, "", "b"),
+        ('pop', 6, "a", ""),
+        ('remove', 0, "c", ""),
+        ('setitem', 0, "d", "c"),
+        ('setitem', 1, "e f", "g a b"),
+        ('delitem', 0, "c g a b g b", "g b b"),
+        ('sort', 0, "g b b", "b b g"),
+        ('reverse', 0, "b b g", "g b b"),
+        ('imul', 0, "g b b", "g b b g b b")])
+
+
+def test_node():
+    """Test node content and arguments report changes."""
+    relative = Relative(_notes('cd'))
+    changes = _Recorder(relative).changes
+    relative.append(Note('e'))
+    relative.extend(_notes('fg'))
+    relative[0] = Note('a')
+    del relative[-1]
+    relative.reverse()
+    relative['position'] = '^'
+    del relative['position']
+    assert_equals(changes, [
+        ('append', 2, "", "e"),
+        ('extend', 3, "", "f g"),
+        ('setitem', 0, "c", "a"),
+        ('delitem', 4, "g", ""),
+        ('reverse', 0, "a d e f", "f e d a"),
+        ('setitem', 'position', None, '^'),
+        ('delitem', 'position', '^', None)])
+
+
+def test_batch():
+    """Test changes are held back and merged in a batch."""
+    music = chunk_content(Container(_notes('cd')), 4)
+    other = Container([])
+    changes = _Recorder(music).changes
+    other_changes = _Recorder(other).changes
+    with batch():
+        for name in 'efg':
+            music.append(Note(name))
+        other.append(Note('c'))
+        with batch():
+            music[3] = Note('a')
+        assert_equals(changes, [])
+        # undone within the batch
+        music.insert(0, Note('b'))
+        del music[0]
+    assert_equals(changes, [('splice', 2, "", "e a g")])
+    assert_equals(other_changes, [('append', 0, "", "c")])
+    del changes[:]
+    with batch():
+        music.append(Note('b'))
+        music.sort(key=lambda note: note._pitch)
+    assert_equals(changes, [('splice', 0, "c d e a g", "a b c d e g")])
+
+
+def test_batch_thread():
+    """Test a batch doesn't hold back changes made by other threads."""
+    music = Container([])
+    changes = _Recorder(music).changes
+    with batch():
+        thread = threading.Thread(target=music.append, args=(Note('c'),))
+        thread.start()
+        thread.join()
+        assert_equals(changes, [('append', 0, "", "c")])
+        music.append(Note('d'))
+        assert_equals(len(changes), 1)
+    assert_equals(changes[1], ('append', 1, "", "d"))
+
+
+def test_unobserve():
+    """Test observers can be removed, and are not copied or pickled."""
+    music = Container(_notes('c'))
+    recorder = _Recorder(music)
+    copy = cPickle.loads(cPickle.dumps(music, cPickle.HIGHEST_PROTOCOL))
+    copy.append(Note('d'))
+    unobserve(music, recorder)
+    music.append(Note('d'))
+    assert_equals(recorder.changes, [])
+    assert_is(music._observers, None)
+    assert_raises(ValueError, unobserve, music, recorder)
+
+
+def test_repetition():
+    """Test repetitions report changes to their body."""
+    loop = Repetition(_notes('cd'), 3)
+    changes = _Recorder(loop).changes
+    loop[-1] = Note('e')
+    loop *= 2
+    assert_equals(changes, [
+        ('setitem', 1, "d", "e"), ('imul', 'repeats', 3, 6)])
@@ -0,0 +1,99 @@
+"""Tests for lilyflower.history."""
+from lilyflower.history import History
+from lilyflower.container import Container
+from lilyflower.dom import Relative
+from lilyflower.events import observe
+from lilyflower.repetition import Repetition
+from lilyflower.tones import Note
+# pylint: disable=no-name-in-module
+from nose.tools import (
+    assert_equals, assert_false, assert_is, assert_is_not, assert_raises,
+    assert_true)
+
+
+def _compact(music):
+    """Format music on a single line."""
+    return format(music, "c")
+
+
+def _score(voices, length):
+    """Return a container with voices of length notes."""
+    return Container([
+        Container([Note('c') for _ in range(length)])
+        for _ in range(voices)])
+
+
+def test_sharing():
+    """Test edits copy only the path to the edited object."""
+    # pylint: disable=protected-access
+    music = _score(3, 100)
+    history = History(music)
+    history.edit(1, 50)._tie = True
+    root = history.root
+    assert_is_not(root, music)
+    assert_is(root[0], music[0])
+    assert_is(root[2], music[2])
+    assert_is_not(root[1], music[1])
+    assert_is(root[1][49], music[1][49])
+    assert_is_not(root[1][50], music[1][50])
+    assert_true(root[1][50]._tie)
+    assert_false(music[1][50]._tie)
+    # a second edit before the commit changes the copies in place
+    history.edit(1).append(Note('d'))
+    assert_is(history.root, root)
+    snapshot = history.snapshot()
+    assert_is(snapshot, root)
+    history.edit(0).pop()
+    assert_equals(len(snapshot[0]), 100)
+    assert_equals(len(history.root[0]), 99)
+    assert_is(history.root[1], snapshot[1])
+
+
+def test_undo_redo():
+    """Test moving through versions."""
+    history = History(Container([Note('c')]))
+    assert_false(history.can_undo())
+    assert_raises(IndexError, history.undo)
+    for name in 'def':
+        history.edit().append(Note(name))
+        history.commit()
+    assert_equals(len(history), 4)
+    assert_equals(_compact(history.undo()), "{ c d e }")
+    assert_equals(_compact(history.undo()), "{ c d }")
+    assert_true(history.can_redo())
+    assert_equals(_compact(history.redo()), "{ c d e }")
+    # a new edit forgets what was undone
+    history.edit().append(Note('g'))
+    assert_false(history.can_redo())
+    assert_equals(_compact(history.undo()), "{ c d e }")
+    assert_equals(_compact(history.redo()), "{ c d e g }")
+    assert_raises(IndexError, history.redo)
+    assert_equals(len(history), 4)
+
+
+def test_limit():
+    """Test only limit versions are kept."""
+    history = History(Container([]), limit=2)
+    for name in 'cde':
+        history.edit().append(Note(name))
+        history.commit()
+    assert_equals(len(history), 2)
+    assert_equals(_compact(history.undo()), "{ c d }")
+    assert_raises(IndexError, history.undo)
+
+
+def test_paths():
+    """Test arguments, repetitions and observers."""
+    # pylint: disable=protected-access
+    relative = Relative([Repetition([Note('c')], 2)])
+    relative['position'] = '^'
+    observe(relative, lambda change: None)
+    history = History(relative)
+    history.edit()['position'] = '_'
+    history.edit(0, 0)._tie = True
+    assert_equals(history.root['position'], '_')
+    assert_equals(relative['position'], '^')
+    assert_equals(_compact(history.root[0]), "{ c~ c~ }")
+    assert_equals(_compact(relative[0]), "{ c c }")
+    assert_is(history.root._observers, None)
+    assert_raises(KeyError, history.edit, 0, 0, 'position')
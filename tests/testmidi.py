@@ -0,0 +1,121 @@
+"""Tests for lilyflower.midi."""
+import struct
+from StringIO import StringIO
+from lilyflower.midi import iter_events, ticks, write_midi
+from lilyflower.container import Container
+from lilyflower.containers import Parallel, Relative
+from lilyflower.tones import Note, Rest, Chord, Pitch
+from lilyflower.dynamics import Forte, Piano
+# pylint: disable=no-name-in-module
+from nose.tools import assert_equals, assert_list_equal
+
+
+class Pipe(object):
+
+    """Mock file object that can't seek."""
+
+    def __init__(self):
+        """Set up buffer."""
+        self.data = []
+
+    def write(self, data):
+        """Store data."""
+        self.data.append(data)
+
+
+def test_durations():
+    """Test inherited and dotted durations."""
+    music = Container([
+        Note('c', "'", '4.'),
+        Note('d', "'"),
+        Rest('8'),
+        Note('e', "'", '2')])
+    assert_list_equal(list(iter_events(music, 4)), [
+        (0, 1, 0, 60, 90),
+        (6, 0, 0, 60, 0),
+        (6, 1, 0, 62, 90),
+        (12, 0, 0, 62, 0),
+        (14, 1, 0, 64, 90),
+        (22, 0, 0, 64, 0)])
+
+
+def test_ticks():
+    """Test lengths, repeated with the inherited duration."""
+    music = Container([Note('c'), Note('d', '', '8'), Note('e')])
+    assert_equals(ticks(music, 4), 8)
+    # from the second time on, c inherits an eighth
+    assert_equals(ticks(music, 4, 3), 8 + 2 * 6)
+    assert_equals(ticks(music, 4, 0), 0)
+
+
+def test_pitches():
+    """Test accidentals, octaves and relative mode."""
+    music = Container([
+        Note('bes', ","),
+        Note('fis', "''"),
+        Note('ases'),
+        Relative([Note('c'), Note('g'), Note('e', "'")], [Pitch('c', "'")]),
+        Note('c')])
+    keys = [event[3] for event in iter_events(music) if event[1] == 1]
+    assert_list_equal(keys, [46, 78, 55, 60, 55, 64, 48])
+
+
+def test_ties_and_chords():
+    """Test tied notes sound once and chords sound together."""
+    music = Container([
+        Chord([Pitch('c'), Pitch('e')], '2', tie=True),
+        Chord([Pitch('c'), Pitch('g')]),
+        Note('c')])
+    assert_list_equal(list(iter_events(music, 4)), [
+        (0, 1, 0, 48, 90),
+        (0, 1, 0, 52, 90),
+        (8, 0, 0, 52, 0),
+        (8, 1, 0, 55, 90),
+        (16, 0, 0, 48, 0),
+        (16, 0, 0, 55, 0),
+        (16, 1, 0, 48, 90),
+        (24, 0, 0, 48, 0)])
+
+
+def test_dynamics():
+    """Test dynamics set velocity for following notes."""
+    music = Container([
+        Note('c', note_commands=[Piano()]),
+        Note('c'),
+        Note('c', note_commands=[Forte()])])
+    velocities = [event[4] for event in iter_events(music) if event[1] == 1]
+    assert_list_equal(velocities, [48, 48, 96])
+
+
+def test_parallel():
+    """Test simultaneous voices are merged in order."""
+    music = Container([
+        Parallel([
+            Container([Note('c', '', '2'), Note('d')]),
+            Container([Note('e'), Note('f')])]),
+        Note('g')])
+    assert_list_equal(list(iter_events(music, 4)), [
+        (0, 1, 1, 48, 90),
+        (0, 1, 2, 52, 90),
+        (4, 0, 2, 52, 0),
+        (4, 1, 2, 53, 90),
+        (8, 0, 1, 48, 0),
+        (8, 0, 2, 53, 0),
+        (8, 1, 1, 50, 90),
+        (16, 0, 1, 50, 0),
+        (16, 1, 0, 55, 90),
+        (20, 0, 0, 55, 0)])
+
+
+def test_write():
+    """Test track length is correct for seekable and unseekable targets."""
+    music = Container([Note('c'), Note('d'), Note('e')])
+    seekable = StringIO()
+    write_midi(music, seekable)
+    data = seekable.getvalue()
+    assert_equals(data[:4], "MThd")
+    assert_equals(data[14:18], "MTrk")
+    assert_equals(struct.unpack(">L", data[18:22])[0], len(data) - 22)
+    pipe = Pipe()
+    write_midi(music, pipe)
+    assert_equals("".join(pipe.data), data)
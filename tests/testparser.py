@@ -0,0 +1,197 @@
+"""Tests for lilyflower.parser."""
+import gc
+from StringIO import StringIO
+from lilyflower.parser import parse, tokenize, iterparse
+from lilyflower.dom import Markup, Bold, AbsFontsize, Combine, Eyeglasses
+from lilyflower.dom import Fermata, Relative, Transpose, Comment
+from lilyflower.container import Container
+from lilyflower.containers import Parallel
+from lilyflower.repetition import Repetition
+from lilyflower.tones import Note, Rest, Chord, Pitch
+from lilyflower.spanners import Slur
+from lilyflower.dynamics import Crescendo, Forte
+from lilyflower.schemedata import SignedFloat, Color, AssociationList, Pair
+from lilyflower.errors import ParseError
+from lilyflower.tools import COMPACT
+# pylint: disable=no-name-in-module
+from nose.tools import assert_equals, assert_is, assert_raises
+from nose.tools import assert_list_equal
+# pylint: disable=protected-access
+
+
+def _body(lily_file):
+    """Strip the creation comment from formatted output."""
+    return format(lily_file).split("\n", 1)[1]
+
+
+def test_tokenize():
+    """Test token kinds and line numbers."""
+    tokens = list(tokenize("\\bold {\n  c'4.~ #'(1 . 2) }"))
+    assert_equals(
+        [token.kind for token in tokens],
+        ['command', 'brace_open', 'note', 'scheme', 'brace_close'])
+    assert_equals(tokens[2].parts, ('c', "'", '4.', None, '~'))
+    assert_equals(tokens[3].line, 2)
+    assert_equals(format(tokens[3].value), "#'(1 . 2)")
+
+
+def test_spec_commands():
+    """Test dom nodes are built from the spec."""
+    tree = parse(
+        r"\markup { \bold { \abs-fontsize #0 { \combine \eyeglasses "
+        r"\fermata } } }")
+    markup = tree[0]
+    assert_is(type(markup), Markup)
+    assert_is(type(markup[0]), Bold)
+    assert_is(type(markup[0][0]), AbsFontsize)
+    assert_is(type(markup[0][0]['size']), SignedFloat)
+    assert_is(type(markup[0][0][0]), Combine)
+    assert_is(type(markup[0][0][0]['arg1']), Eyeglasses)
+    assert_is(type(markup[0][0][0]['arg2']), Fermata)
+
+
+def test_round_trip():
+    """Test formatted trees parse back to the same code."""
+    original = parse(r"""
+        % comment
+        \markup {
+          \with-color #(x11-color "snow4") { \bold { } }
+          \replace #'(("a" . "b")) { }
+          \draw-circle #1 #0.5 ##t
+        }
+        \relative { c'4( d8[ e] <c e g>2.~\< <c e g>4\!) r2 }
+        << { a4:16 b\> c\f } { r1 } >>
+        { a b | c d | }
+        """)
+    text = _body(original)
+    assert_equals(_body(parse(text)), text)
+    compact = format(original, COMPACT)
+    assert "\n  " not in compact
+    assert len(compact) < len(format(original))
+    assert_equals(_body(parse(compact)), text)
+
+
+def test_chunks():
+    """Test reading from a file in chunks gives the same result."""
+    text = (
+        "%{ block\ncomment %}\n\\markup {\n"
+        "  \\with-color #(x11-color \"snow4\") { }\n"
+        "  \\draw-circle #12 #0.25 ##t\n}\n"
+        "\\relative { c''4.( d16[ eeses] <c e g>2:8~\\< <c e g>\\!) }\n")
+    def _tokens(source, chunk_size=None):
+        """Tokens with comparable values."""
+        return [
+            (token.kind, format(token.value), token.line, token.parts)
+            for token in tokenize(source, chunk_size)]
+    expected = _tokens(text)
+    for chunk_size in (1, 2, 3, 7):
+        assert_list_equal(_tokens(StringIO(text), chunk_size), expected)
+    assert_equals(_body(parse(StringIO(text), 5)), _body(parse(text)))
+    assert_raises(ParseError, list, tokenize(StringIO("%{ open"), 2))
+    assert_raises(ParseError, list, tokenize(StringIO("#'(1 2"), 2))
+
+
+def test_pause_gc():
+    """Test garbage collection is only paused when asked, and restored."""
+    text = "{ c d e }"
+    assert_equals(
+        _body(parse(text, pause_gc=True)), _body(parse(text)))
+    assert gc.isenabled()
+    assert_raises(ParseError, parse, "{ c", pause_gc=True)
+    assert gc.isenabled()
+
+
+def test_events():
+    """Test the event stream."""
+    events = list(iterparse(
+        '\\version "2.18.2" \\markup { \\abs-fontsize #3 \\eyeglasses } '
+        '{ c | d }'))
+    assert_equals([event.kind for event in events], [
+        'version', 'start_container', 'start_container', 'argument',
+        'scheme', 'command', 'end_container', 'end_container',
+        'start_container', 'tone',
+        'bar_check', 'tone', 'end_container'])
+    assert_is(events[1].value.cls, Markup)
+    assert_is(events[2].value.cls, AbsFontsize)
+    assert_equals(events[3].value, 'size')
+
+
+def test_tones():
+    """Test notes, chords, rests and what's attached to them."""
+    tree = parse(r"{ c'4(\< <e g>8~\! r16\f d,) }")
+    container = tree[0]
+    assert_is(type(container), Container)
+    note, chord, rest, last = container
+    assert_is(type(note), Note)
+    assert_is(type(chord), Chord)
+    assert_is(type(rest), Rest)
+    assert_equals(chord._tie, True)
+    # spanners and hairpins are shared between opening and closing tone
+    assert_is(type(note._spanners[0]), Slur)
+    assert_is(note._spanners[0], last._spanners[0])
+    assert_is(type(note._note_commands[0]), Crescendo)
+    assert_is(type(rest._note_commands[0]), Forte)
+    assert_is(note._note_commands[0], chord._note_commands[0])
+
+
+def test_scheme():
+    """Test scheme values and argument coercion."""
+    tree = parse(r"""
+        \markup { \with-color #blue { } \replace #'((1 . 2)) { } }
+        """)
+    assert_is(type(tree[0][0]['color']), Color)
+    replace = tree[0][1]['association_list']
+    assert_is(type(replace), AssociationList)
+    assert_is(type(replace._data[0]), Pair)
+
+
+def test_structure():
+    """Test braces, parallel music, comments and spec music functions."""
+    tree = parse("%{ one\ntwo %}\n<< { a b } \\relative { c d } >>")
+    assert_is(type(tree[0]), Comment)
+    assert_is(type(tree[1]), Parallel)
+    assert_is(type(tree[1][1]), Relative)
+    assert_equals(len(tree[1][1]), 2)
+
+
+def test_pitch_arguments():
+    """Test relative and transpose read their pitches, not music."""
+    tree = parse(r"\relative c' { c d e }")
+    assert_equals(len(tree), 1)
+    relative = tree[0]
+    assert_is(type(relative), Relative)
+    assert_is(type(relative['pitch']), Pitch)
+    assert_equals(len(relative), 3)
+    assert_equals(format(relative, COMPACT), "\\relative c' { c d e }")
+    assert_equals(
+        format(parse(r"\relative { c' d }")[0], COMPACT),
+        "\\relative { c' d }")
+    tree = parse(r"\transpose c d { c e }")
+    assert_equals(len(tree), 1)
+    assert_is(type(tree[0]), Transpose)
+    assert_equals(format(tree[0], COMPACT), "\\transpose c d { c e }")
+    assert_raises(ParseError, parse, r"\transpose c { c e }")
+    assert_raises(ParseError, parse, r"\transpose c d4 { c e }")
+
+
+def test_repeat():
+    """Test unfolded repeats read back as they are written."""
+    loop = Repetition([Note('c'), Note('d', '', '8')], 3, unfold=True)
+    tree = parse(format(loop))
+    assert_is(type(tree[0]), Repetition)
+    assert_equals(format(tree[0]), format(loop))
+    assert_equals(tree[0].repeats, 3)
+    single = parse(r"{ \repeat unfold 2 c4 d }")[0][0]
+    assert_equals(format(single, COMPACT), "\\repeat unfold 2 c4")
+    assert_raises(ParseError, parse, r"\repeat volta 2 { c }")
+    assert_raises(ParseError, parse, r"\repeat unfold { c }")
+
+
+def test_errors():
+    """Test unsupported input raises ParseError."""
+    assert_raises(ParseError, parse, r"\nosuchcommand")
+    assert_raises(ParseError, parse, r"{ a( b }")
+    assert_raises(ParseError, parse, r"{ a b) }")
+    assert_raises(ParseError, parse, r"\markup { hello }")
+    assert_raises(ParseError, parse, r"\abs-fontsize { }")
+    assert_raises(ParseError, parse, r"\markup { \bold { }")
@@ -0,0 +1,127 @@
+"""Tests for lilyflower.patch."""
+import os
+import random
+import shutil
+import tempfile
+from lilyflower.patch import Edit, Output, apply_edits, patch_file
+from lilyflower.benchmark import generate, Config
+from lilyflower.container import Container
+from lilyflower.tones import Note
+from lilyflower.spanners import Slur
+# pylint: disable=no-name-in-module
+from nose.tools import assert_equals
+
+
+def _containers(tree):
+    """Return all containers in tree."""
+    found = []
+    stack = list(tree)
+    while stack:
+        item = stack.pop()
+        if isinstance(item, Container):
+            found.append(item)
+            stack.extend(item)
+    return found
+
+
+def test_update():
+    """Test edits turn the previous code into the current code."""
+    rng = random.Random(3)
+    tree = generate(Config(notes=40, voices=2, depth=3, markup=0.2))
+    output = Output(tree)
+    directory = tempfile.mkdtemp()
+    try:
+        path = os.path.join(directory, 'music.ly')
+        with open(path, 'w') as lily_file:
+            lily_file.write(output.text)
+        for _ in range(20):
+            previous = output.text
+            container = rng.choice(_containers(tree))
+            if len(container) > 1 and rng.random() < 0.5:
+                del container[rng.randrange(len(container))]
+            else:
+                container.append(Note(rng.choice('abcdefg')))
+            edits = output.update()
+            assert_equals(apply_edits(previous, edits), output.text)
+            # only the creation comment and the changed container
+            assert len(edits) <= 3
+            patch_file(path, edits)
+            with open(path) as lily_file:
+                assert_equals(lily_file.read(), output.text)
+        start, end = output.span(tree[0])
+        assert_equals(output.text[start:end], format(tree[0]))
+    finally:
+        shutil.rmtree(directory)
+
+
+def test_patch_file():
+    """Test small tails are moved in place, big ones saved atomically."""
+    text = "".join("%04d\n" % number for number in range(100))
+    directory = tempfile.mkdtemp()
+    try:
+        path = os.path.join(directory, 'music.ly')
+        with open(path, 'w') as lily_file:
+            lily_file.write(text)
+        for edits, saved in (
+                ([Edit(0, 4, "zero"), Edit(490, 4, "last!")], False),
+                ([Edit(0, 4, ""), Edit(10, 0, "new\n")], True)):
+            inode = os.stat(path).st_ino
+            patch_file(path, edits)
+            assert_equals(os.stat(path).st_ino != inode, saved)
+            text = apply_edits(text, edits)
+            with open(path) as lily_file:
+                assert_equals(lily_file.read(), text)
+    finally:
+        shutil.rmtree(directory)
+
+
+def test_spanners():
+    """Test spanners are formatted in the context of the whole tree."""
+    slur = Slur()
+    tree = Container([
+        Container([Note('c', spanners=[slur]), Note('d')]),
+        Container([Note('e', spanners=[slur])])])
+    output = Output(tree)
+    tree[0].append(Note('f'))
+    edits = output.update()
+    assert_equals(edits[0].replacement, ' f')
+    assert_equals(output.text, format(tree))
+
+
+def test_reuse():
+    """Test only changed nodes are formatted again."""
+    first = Container([Note('c'), Note('d')])
+    second = Container([Note('e')])
+    tree = Container([first, second])
+    output = Output(tree)
+    assert_equals(output.update(), [])
+    # not reported to observers, so the old code is kept
+    second._container.append(Note('f'))  # pylint: disable=protected-access
+    first.append(Note('g'))
+    output.update()
+    assert "e f" not in output.text
+    start, end = output.span(first)
+    assert_equals(output.text[start:end], "{\n    c d g\n  }")
+    output.update(full=True)
+    assert_equals(output.text, format(tree))
+    # containers that are gone are not watched anymore
+    tree.remove(second)
+    output.update()
+    assert_equals(output.text, format(tree))
+    assert second._observers is None  # pylint: disable=protected-access
+    output.close()
+    assert tree._observers is None  # pylint: disable=protected-access
+
+
+def test_new_spanners():
+    """Test new spanners make the whole tree be formatted."""
+    slur = Slur()
+    tree = Container([
+        Container([Note('c'), Note('d')]),
+        Container([Note('e', spanners=[slur])])])
+    output = Output(tree)
+    tree[0].append(Note('f', spanners=[slur]))
+    previous = output.text
+    edits = output.update()
+    assert_equals(output.text, format(tree))
+    assert_equals(apply_edits(previous, edits), output.text)
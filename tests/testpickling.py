@@ -0,0 +1,58 @@
+"""Tests for lilyflower.pickling."""
+import cPickle
+import pickle
+from lilyflower.benchmark import generate, Config
+from lilyflower.parser import parse
+from lilyflower.container import Container
+from lilyflower.tones import Note
+from lilyflower.spanners import Slur
+from lilyflower.dynamics import Crescendo, Forte
+# pylint: disable=no-name-in-module
+from nose.tools import assert_equals, assert_is
+
+
+class _Custom(Container):
+
+    """Container subclass from outside lilyflower."""
+
+    def __init__(self, content, extra):
+        """Set an attribute that is not in _state."""
+        Container.__init__(self, content)
+        self.extra = extra
+
+
+def _body(tree):
+    """Strip the creation comment from formatted output."""
+    return format(tree).split("\n", 1)[1]
+
+
+def test_round_trip():
+    """Test trees format the same after pickling."""
+    trees = [
+        generate(Config(notes=50, voices=2, depth=3, markup=0.3)),
+        parse(r"""
+            \markup { \with-color #(x11-color "snow4") { \bold { } } }
+            \relative { c'4( d8[ e] <c e g>2.~\< <c e g>4\!) r2 }
+            """)]
+    for tree in trees:
+        for module in (pickle, cPickle):
+            for protocol in range(3):
+                data = module.dumps(tree, protocol)
+                assert 'Note' not in data
+                assert_equals(_body(module.loads(data)), _body(tree))
+
+
+def test_shared():
+    """Test shared objects and state survive pickling."""
+    slur = Slur()
+    crescendo = Crescendo(Forte())
+    music = _Custom([
+        Note('c', spanners=[slur], note_commands=[crescendo]),
+        Note('d', spanners=[slur], note_commands=[crescendo])], 'extra')
+    copy = cPickle.loads(cPickle.dumps(music, 2))
+    assert_is(type(copy), _Custom)
+    assert_equals(copy.extra, 'extra')
+    assert_is(copy[0]._spanners[0], copy[1]._spanners[0])
+    assert_equals(format(copy), format(music))
+    format(slur)
+    assert_equals(format(cPickle.loads(cPickle.dumps(slur, 2))), ")")
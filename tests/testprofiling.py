@@ -0,0 +1,46 @@
+"""Tests for lilyflower.profiling."""
+import pstats
+from lilyflower.profiling import Profile
+from lilyflower.container import Container
+from lilyflower.tones import Note
+from lilyflower.dynamics import Forte
+# pylint: disable=no-name-in-module
+from nose.tools import assert_equals, assert_is, assert_raises
+
+
+def test_enable_disable():
+    """Test original methods come back and nothing is recorded after."""
+    original = vars(Note)['__format__']
+    profile = Profile()
+    with profile:
+        assert vars(Note)['__format__'] is not original
+        format(Note('c', note_commands=[Forte()]))
+    assert_is(vars(Note)['__format__'], original)
+    format(Note('c'))
+    stats = dict(profile.items())
+    assert_equals(stats[Note].calls, 1)
+    assert_equals(stats[Note].bytes, len("c\\f"))
+    # NoteCommand calls Command.__format__, that's still one call
+    assert_equals(stats[Forte].calls, 1)
+
+
+def test_nesting():
+    """Test own and cumulative time of nested classes."""
+    music = Container([Container([Note('c'), Note('d')]), Note('e')])
+    with Profile() as profile:
+        format(music)
+    stats = dict(profile.items())
+    assert_equals(stats[Container].calls, 2)
+    assert stats[Container].cumulative >= stats[Note].cumulative
+    assert stats[Container].own <= stats[Container].cumulative
+    assert_raises(ValueError, profile.report, 'name')
+    assert_equals(len(profile.report(limit=1).splitlines()), 2)
+
+
+def test_pstats():
+    """Test data can be read by pstats."""
+    with Profile() as profile:
+        format(Container([Note('c'), Note('d')]))
+    stats = pstats.Stats(profile)
+    assert_equals(stats.total_calls, 3)
+    assert_equals(stats.prim_calls, 3)
@@ -0,0 +1,159 @@
+"""Tests for lilyflower.render, using a fake lilypond."""
+import os
+import shutil
+import sys
+import tempfile
+from lilyflower.render import Renderer
+from lilyflower.dom import LilyFile, Comment
+from lilyflower.containers import Midi
+from lilyflower.errors import RenderError
+# pylint: disable=no-name-in-module
+from nose.tools import assert_equals, assert_true, assert_false
+from nose.tools import assert_raises, with_setup
+
+FAKE = [
+    sys.executable,
+    os.path.join(os.path.dirname(__file__), 'fakelilypond.py')]
+TEMP = []
+
+
+def _setup():
+    """Create scratch directory and invocation log."""
+    TEMP.append(tempfile.mkdtemp())
+    os.environ['FAKE_LILYPOND_LOG'] = os.path.join(TEMP[-1], 'runs')
+
+
+def _teardown():
+    """Remove scratch directory."""
+    del os.environ['FAKE_LILYPOND_LOG']
+    shutil.rmtree(TEMP.pop())
+
+
+def _runs():
+    """Return number of fake lilypond invocations."""
+    if not os.path.exists(os.environ['FAKE_LILYPOND_LOG']):
+        return 0
+    with open(os.environ['FAKE_LILYPOND_LOG']) as log:
+        return len(log.readlines())
+
+
+@with_setup(_setup, _teardown)
+def test_render():
+    """Test outputs, diagnostics and the memory cache."""
+    renderer = Renderer(FAKE, formats=('pdf', 'png'))
+    result = renderer.render(LilyFile([Midi([])]))
+    assert_true(result.ok)
+    assert_false(result.cached)
+    assert_equals(
+        sorted(result.outputs), ['score.midi', 'score.pdf', 'score.png'])
+    assert_true(result.outputs['score.pdf'].startswith("pdf\n%"))
+    # the creation time differs, but that's left out of the key
+    again = renderer.render(LilyFile([Midi([])]))
+    assert_true(again.cached)
+    assert_equals(again.outputs, result.outputs)
+    assert_equals(_runs(), 1)
+    failed = renderer.render(LilyFile([Comment(["x"]), Comment(["\\error"])]))
+    assert_false(failed.ok)
+    assert_equals(failed.outputs, {})
+    assert_equals(
+        [(item.severity, item.file, item.line)
+         for item in failed.diagnostics],
+        [('error', 'score.ly', 5), ('fatal error', None, None)])
+
+
+@with_setup(_setup, _teardown)
+def test_pool_and_disk_cache():
+    """Test parallel rendering and a cache that survives the renderer."""
+    cache = os.path.join(TEMP[-1], 'cache')
+    files = [LilyFile([Comment([str(number)])]) for number in range(6)]
+    with Renderer(FAKE, workers=3, cache_dir=cache) as renderer:
+        results = renderer.render_all(files + files[:2])
+    assert_equals(len(results), 8)
+    assert_true(all(result.ok for result in results))
+    assert_equals(
+        [result.outputs['score.pdf'].rsplit("% ", 1)[1] for result in results],
+        ["0", "1", "2", "3", "4", "5", "0", "1"])
+    assert_equals(len(os.listdir(cache)), 6)
+    runs = _runs()
+    with Renderer(FAKE, workers=3, cache_dir=cache) as renderer:
+        results = renderer.render_all(files)
+    assert_true(all(result.cached for result in results))
+    assert_equals(_runs(), runs)
+    # other options, other key
+    renderer = Renderer(FAKE, options=('-dresolution=300',), cache_dir=cache)
+    assert_false(renderer.render(files[0]).cached)
+
+
+@with_setup(_setup, _teardown)
+def test_batches():
+    """Test outputs and errors are mapped back from a batch."""
+    files = [LilyFile([Comment([str(number)])]) for number in range(7)]
+    files[4] = LilyFile([Comment(["\\error"])])
+    with Renderer(FAKE, batch_size=3, workers=2) as renderer:
+        results = renderer.render_all(files)
+    assert_equals(_runs(), 3)
+    assert_equals(
+        [result.ok for result in results],
+        [True, True, True, True, False, True, True])
+    for number, result in enumerate(results):
+        if number != 4:
+            assert_equals(result.outputs.keys(), ['score.pdf'])
+            assert_true(result.outputs['score.pdf'].endswith(str(number)))
+            assert_equals(result.diagnostics, [])
+    assert_equals(results[4].outputs, {})
+    assert_equals(
+        [(item.severity, item.file, item.line)
+         for item in results[4].diagnostics],
+        [('error', 'score.ly', 4), ('fatal error', None, None)])
+    assert_true(results[4].log.startswith("Processing `score.ly'"))
+
+
+def test_errors():
+    """Test bad formats and missing executables."""
+    assert_raises(ValueError, Renderer, formats=('doc',))
+    assert_raises(ValueError, Renderer, batch_size=0)
+    renderer = Renderer('/nonexistent/lilypond')
+    assert_raises(RenderError, renderer.render, LilyFile())
+
+
+@with_setup(_setup, _teardown)
+def test_async():
+    """Test compiling in the background."""
+    files = [LilyFile([Comment([str(number)])]) for number in range(4)]
+    called = []
+    with Renderer(FAKE, workers=2, batch_size=2) as renderer:
+        pending = renderer.render_async(files, callback=called.append)
+        results = pending.get(10)
+        assert_true(pending.ready())
+        assert_true(pending.successful())
+        assert_equals(called, [results])
+        assert_equals(
+            [result.outputs['score.pdf'][-1] for result in results],
+            ["0", "1", "2", "3"])
+        # everything is cached now, so it's done right away
+        assert_true(renderer.render_async(files).ready())
+    broken = Renderer('/nonexistent/lilypond')
+    errors = []
+    pending = broken.render_async(
+        files, callback=called.append, error_callback=errors.append)
+    assert_raises(RenderError, pending.get, 10)
+    assert_false(pending.successful())
+    assert_equals(len(called), 1)
+    assert_equals([type(error) for error in errors], [RenderError])
+    broken.close()
+
+
+@with_setup(_setup, _teardown)
+def test_async_callback_error():
+    """Test a failing callback doesn't break later compilations."""
+    def fail(_):
+        """Raise."""
+        raise ValueError("callback failed")
+    with Renderer(FAKE, workers=1) as renderer:
+        pending = renderer.render_async(
+            [LilyFile([Comment(["first"])])], callback=fail)
+        assert_equals(len(pending.get(10)), 1)
+        assert_equals(type(pending.callback_error), ValueError)
+        pending = renderer.render_async([LilyFile([Comment(["second"])])])
+        assert_equals(len(pending.get(10)), 1)
+        assert_equals(pending.callback_error, None)
@@ -0,0 +1,92 @@
+"""Tests for lilyflower.repetition."""
+import cPickle
+from lilyflower.repetition import Repetition
+from lilyflower.container import Container
+from lilyflower.containers import Parallel, Relative, Staff
+from lilyflower.midi import iter_events
+from lilyflower.rope import chunk_content
+from lilyflower.snapshot import dumps, loads
+from lilyflower.spanners import Slur
+from lilyflower.tones import Note, Pitch
+from lilyflower.errors import InvalidArgument
+# pylint: disable=no-name-in-module
+from nose.tools import assert_equals, assert_is, assert_raises
+
+
+def test_expanded():
+    """Test a repetition acts like the expanded container."""
+    body = [Note('c', '', '8'), Note('d'), Note('e', '', '4')]
+    loop = Repetition(body, 4)
+    expanded = Container(body * 4)
+    assert_equals(format(loop), format(expanded))
+    assert_equals(format(loop, "c"), format(expanded, "c"))
+    assert_equals(len(loop), 12)
+    assert_equals(list(loop), body * 4)
+    assert_equals(list(reversed(loop)), body[::-1] * 4)
+    assert_equals(
+        list(reversed(chunk_content(Repetition(body, 2), 2))),
+        body[::-1] * 2)
+    assert_is(loop[-1], body[2])
+    assert_equals(loop[2:8:3], [body[2], body[2]])
+    assert_raises(IndexError, loop.__getitem__, 12)
+    assert_equals(loop.count(body[0]), 4)
+    # the last event is the last note off
+    assert_equals(loop.duration(), list(iter_events(expanded))[-1][0])
+
+
+def test_huge():
+    """Test nothing is copied, however many repeats."""
+    loop = Repetition([Note('c'), Note('d')], 10 ** 9)
+    assert_equals(len(loop), 2 * 10 ** 9)
+    assert_equals(loop.duration(), 2 * 10 ** 9 * 384)
+    assert_is(loop[10 ** 9 + 1], loop[1])
+    assert_equals(next(reversed(loop)), loop[1])
+    assert_equals(len(cPickle.dumps(loop, -1)) < 200, True)
+
+
+def test_unfold():
+    """Test unfolded repeats write the body once."""
+    slur = Slur()
+    loop = Repetition([Note('c'), slur, Note('d')], 1000, unfold=True)
+    assert_equals(format(loop, "c"), "\\repeat unfold 1000 { c ( d }")
+    assert_equals(format(loop, "c"), "\\repeat unfold 1000 { c ) d }")
+
+
+def test_multiply():
+    """Test multiplying doesn't change the container."""
+    container = Container([Note('c'), Note('d')])
+    loop = container * 3
+    assert_equals(len(container), 2)
+    assert_equals(type(loop), Repetition)
+    assert_equals(len(loop * 2), 12)
+    loop *= 5
+    assert_equals(loop.repeats, 15)
+    assert_raises(InvalidArgument, Repetition, [], -1)
+
+
+def test_multiply_command():
+    """Test multiplying keeps the class, command and arguments."""
+    notes = [Note('c'), Note('d')]
+    staff = Staff(notes) * 2
+    assert_equals(type(staff), Staff)
+    assert_equals(format(staff), "\\staff {\n  c d c d\n}")
+    assert_equals(format(staff), format(Staff(notes * 2)))
+    relative = Relative(notes, [Pitch('c', "'")]) * 2
+    assert_equals(type(relative), Relative)
+    assert_equals(format(relative, "c"), "\\relative c' { c d c d }")
+    assert_equals(
+        format(Relative(notes[:1], [Pitch('c', "'")]), "c"),
+        "\\relative c' c")
+    voices = [Container(notes), Container([Note('e')])]
+    assert_equals(
+        format(Parallel(voices) * 2), format(Parallel(voices * 2)))
+    assert_equals(len(notes), 2)
+    assert_raises(InvalidArgument, Relative, notes, [Note('c')])
+
+
+def test_state():
+    """Test repetitions survive pickles and snapshots."""
+    loop = Repetition([Note('c'), Note('d')], 7, True)
+    assert_equals(format(cPickle.loads(cPickle.dumps(loop, -1))),
+                  format(loop))
+    assert_equals(format(loads(dumps(loop))), format(loop))
@@ -0,0 +1,109 @@
+"""Tests for lilyflower.retrograde."""
+import gc
+import time
+from lilyflower.retrograde import retrograde
+from lilyflower.container import Container
+from lilyflower.containers import Parallel, Score
+from lilyflower.dom import AfterGrace, Grace
+from lilyflower.events import observe
+from lilyflower.dynamics import Crescendo, Decrescendo, Forte, Piano
+from lilyflower.repetition import Repetition
+from lilyflower.spanners import Beam, Slur
+from lilyflower.tones import Chord, Note, Pitch, Rest
+# pylint: disable=no-name-in-module
+from nose.tools import assert_equals, assert_less
+
+
+def _compact(music):
+    """Format music on a single line."""
+    return format(music, "c")
+
+
+def test_ties():
+    """Test ties move to the new predecessor."""
+    music = Container([
+        Note('c', '', '4', tie=True), Note('c', tie=True),
+        Chord([Pitch('c'), Pitch('e')], '2'), Rest('4'),
+        Note('d', tie=True)])
+    assert_equals(_compact(retrograde(music)), "{ d4 r4 < c e>2~ c4~ c4 }")
+    # the original is left alone
+    assert_equals(_compact(music), "{ c4~ c~ < c e>2 r4 d~ }")
+
+
+def test_spanners():
+    """Test spanners and hairpins are anchored where they end."""
+    slur = Slur()
+    beam = Beam()
+    hairpin = Decrescendo()
+    music = Container([
+        Note('c', '', '8', note_commands=[hairpin]), slur, Note('d'),
+        Note('e', spanners=[beam]), slur,
+        Note('f', '', '4', spanners=[beam], note_commands=[hairpin])])
+    result = retrograde(music)
+    assert_equals(_compact(result), "{ f4\\<[ e8] ( d c8\\! ) }")
+    assert_equals(type(result[0]._note_commands[0]), Crescendo)
+    assert_equals(
+        _compact(retrograde(result)), "{ c8\\> ( d e8[ ) f4\\!] }")
+
+
+def test_hairpin_dynamics():
+    """Test dynamics at the ends of a hairpin swap places, and back."""
+    hairpin = Crescendo(Forte())
+    music = Container([
+        Note('c', '', '4', note_commands=[Piano(), hairpin]),
+        Note('e', '', '2', note_commands=[hairpin])])
+    result = retrograde(music)
+    assert_equals(_compact(result), "{ e2\\f\\> c4\\p }")
+    assert_equals(_compact(retrograde(result)), _compact(music))
+
+
+def test_graces():
+    """Test grace notes turn into after graces, and back."""
+    music = Container([
+        Grace([Note('b', '', '16'), Note('a')]), Note('c', '', '4'),
+        Note('d')])
+    result = retrograde(music)
+    assert_equals(type(result[1]), AfterGrace)
+    assert_equals(
+        format(result[1], "c"), "\\afterGrace c4 {\n  a16 b16\n}")
+    assert_equals(
+        _compact(retrograde(result)), "{ \\grace { b16 a16 } c4 d4 }")
+
+
+def test_observers():
+    """Test copies don't take over the observers of the original."""
+    inner = Container([Note('c'), Note('d')])
+    music = Container([inner, Note('e')])
+    for obj in (music, inner):
+        observe(obj, lambda change: None)
+    result = retrograde(music)
+    assert_equals(
+        [result._observers, result[1]._observers], [None, None])
+
+
+def test_structure():
+    """Test simultaneous music and scores keep their order."""
+    music = Score([
+        Parallel([
+            Container([Note('c', '', '4'), Note('d', '', '8')]),
+            Repetition([Note('e', '', '2'), Note('f')], 2)])])
+    assert_equals(
+        _compact(retrograde(music)),
+        "\\score << { d8 c4 } { f2 e2 f2 e2 } >>")
+
+
+def test_linear():
+    """Test large music takes time in proportion to its size."""
+    def timed(size):
+        """Time retrograde of size notes."""
+        slurs = [Slur() for _ in range(size // 2)]
+        music = Container([
+            Note('c', '', '' if index % 3 else '8', tie=index % 2 == 0,
+                 spanners=[slurs[index // 2]])
+            for index in range(size)])
+        start = time.time()
+        retrograde(music, pause_gc=True)
+        return time.time() - start
+    small = timed(10000)
+    assert_less(timed(40000), small * 10)
+    assert gc.isenabled()
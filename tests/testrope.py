@@ -0,0 +1,91 @@
+"""Tests for lilyflower.rope."""
+import cPickle
+import random
+from lilyflower.rope import Rope, chunk_content, is_inline
+from lilyflower.container import Container
+from lilyflower.dom import Bold, Markup, Italic
+from lilyflower.snapshot import dumps, loads
+from lilyflower.tones import Note
+# pylint: disable=no-name-in-module
+from nose.tools import assert_equals, assert_raises
+
+
+def test_list():
+    """Test a rope acts like a list under random edits."""
+    rng = random.Random(4)
+    rope = Rope(chunk_size=4)
+    items = []
+    for step in range(3000):
+        choice = rng.random()
+        if choice < 0.4 or not items:
+            index = rng.randint(-len(items) - 2, len(items) + 2)
+            rope.insert(index, step)
+            items.insert(index, step)
+        elif choice < 0.7:
+            index = rng.randrange(-len(items), len(items))
+            del rope[index]
+            del items[index]
+        elif choice < 0.8:
+            index = rng.randrange(len(items))
+            rope[index] = -step
+            items[index] = -step
+        elif choice < 0.9:
+            rope.append(step)
+            items.append(step)
+        else:
+            assert_equals(rope.pop(), items.pop())
+        assert_equals(len(rope), len(items))
+    assert_equals(list(rope), items)
+    assert_equals(list(reversed(rope)), items[::-1])
+    for index in (slice(5, 50, 7), slice(None, None, -3), slice(40, 2, -5),
+                  slice(-30, None), slice(3, 3), slice(2, 9)):
+        assert_equals(rope[index], items[index])
+    assert_equals([rope[index] for index in range(len(items))], items)
+    assert_raises(IndexError, rope.__getitem__, len(items))
+    rope.sort()
+    rope.reverse()
+    assert_equals(rope, sorted(items, reverse=True))
+    assert_equals(rope.index(items[7]), sorted(
+        items, reverse=True).index(items[7]))
+
+
+def test_total():
+    """Test cached subtotals follow changes."""
+    rope = Rope(range(100), chunk_size=8)
+    assert_equals(rope.total(abs), sum(range(100)))
+    rope[10] = 1000
+    rope.insert(50, -7)
+    del rope[0:5]
+    assert_equals(rope.total(abs), sum(abs(item) for item in rope))
+
+
+def test_content():
+    """Test nodes and containers with ropes format and pickle the same."""
+    notes = [Note('c'), Note('d', "'", '8'), Note('e')] * 100
+    container = Container(list(notes))
+    chunked = chunk_content(Container(list(notes)), chunk_size=8)
+    assert_equals(format(chunked), format(container))
+    assert_equals(chunked._container.total(is_inline), 300)
+    copy = cPickle.loads(cPickle.dumps(chunked, -1))
+    assert_equals(format(copy), format(container))
+    copy.insert(0, Note('f'))
+    assert_equals(format(loads(dumps(copy)))[:8], "{\n  f c ")
+    markup = chunk_content(Markup([Bold(), Italic()]))
+    markup.insert(1, Bold())
+    assert_equals(format(markup), format(Markup([Bold(), Bold(), Italic()])))
+
+
+def test_multiply():
+    """Test repeating a rope, and a container with a rope."""
+    rope = Rope(range(5), chunk_size=2)
+    assert_equals(rope * 2, range(5) * 2)
+    assert_equals(2 * rope, range(5) * 2)
+    rope *= 3
+    assert_equals(rope, range(5) * 3)
+    assert_equals(len(rope), 15)
+    rope *= 0
+    assert_equals(len(rope), 0)
+    voice = chunk_content(Container([Note('c'), Note('d')]), 2)
+    voice *= 2
+    assert_equals(format(voice, 'c'), "{ c d c d }")
+    assert_equals(type(voice._container), Rope)
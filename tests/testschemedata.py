@@ -0,0 +1,90 @@
+"""Tests for lilyflower.schemedata."""
+import cPickle
+from lilyflower.schemedata import (
+    Boolean, Color, Direction, Pair, List, AssociationList, SignedInt,
+    SignedFloat, Symbol, to_scheme, _RECURSION_DEPTH)
+from lilyflower.errors import InvalidArgument
+from lilyflower.snapshot import dumps, loads
+from lilyflower.writer import iter_format
+# pylint: disable=no-name-in-module
+from nose.tools import assert_equals, assert_is, assert_is_not, assert_raises
+
+
+def test_interned():
+    """Test equal values give the same object, and only equal values."""
+    assert_is(Color('snow4'), Color('snow4'))
+    assert_is(Direction('up'), Direction('up'))
+    # 1 == 1.0, but they are different scheme values
+    assert_is_not(SignedFloat(1), SignedFloat(1.0))
+    assert_equals(format(SignedFloat(1.0)), "#1.0")
+    assert_is_not(SignedInt(1), SignedFloat(1))
+
+
+def test_immutable():
+    """Test scheme data can't be changed."""
+    pair = Pair([SignedInt(0), SignedInt(1)])
+    assert_raises(AttributeError, setattr, pair, '_data', None)
+    assert_raises(AttributeError, delattr, pair, '_data')
+    assert_is(type(pair._data), tuple)  # pylint: disable=protected-access
+
+
+def test_invalid():
+    """Test invalid values are refused, also when they're not hashable."""
+    assert_raises(InvalidArgument, Color, 'no such color')
+    assert_raises(InvalidArgument, Color, ['red'])
+    assert_raises(InvalidArgument, Direction, ['up'])
+
+
+def test_cached_code():
+    """Test cached code is not stored in pickles or snapshots."""
+    pair = Pair([Color('snow4'), Direction('down')])
+    code = format(pair)
+    data = cPickle.dumps(pair, 2)
+    assert '_code' not in data and '#' not in data
+    assert_equals(format(cPickle.loads(data)), code)
+    assert_equals(format(loads(dumps(pair))), code)
+
+
+def test_deep():
+    """Test deeply nested data formats without recursion, also streamed."""
+    value = 1
+    for _ in range(10000):
+        value = [value, 2]
+    deep = to_scheme(value)
+    # a copy, so deep is streamed before its code is cached
+    code = format(to_scheme(value))
+    assert_equals(code, "#'" + "(" * 10000 + "1" + " 2)" * 10000)
+    assert_equals("".join(iter_format(deep)), code)
+    assert_equals(format(deep), code)
+
+
+def test_recursion_depth():
+    """Test formatting is the same just above and below the switch."""
+    for depth in range(_RECURSION_DEPTH - 2, _RECURSION_DEPTH + 3):
+        value = [1]
+        for _ in range(depth):
+            value = [(value, 2), [3]]
+        code = format(to_scheme(value))
+        assert_equals(code, format(to_scheme(value)))
+        expected = "(1)"
+        for _ in range(depth):
+            expected = "((%s . 2) (3))" % expected
+        assert_equals(code, "#'" + expected)
+
+
+def test_to_scheme():
+    """Test python values are converted to the right scheme data."""
+    # pylint: disable=protected-access
+    data = to_scheme([
+        True, 1, 1.5, 'up', (1, 2), (1, 2, 3), [], Color('red')])
+    assert_equals(
+        [type(item) for item in data._data],
+        [Boolean, SignedInt, SignedFloat, Symbol, Pair, List, List, Color])
+    assert_is(data._data[1], SignedInt(1))
+    assert_is(to_scheme(1.5), SignedFloat(1.5))
+    assert_equals(format(data), "#'(#t 1 1.5 up (1 . 2) (1 2 3) () red)")
+    pairs = AssociationList.from_python([('a', 1), ('b', 2)])
+    assert_is(type(pairs), AssociationList)
+    assert_equals(format(pairs), "#'((a . 1) (b . 2))")
+    assert_raises(InvalidArgument, to_scheme, [None])
+    assert_raises(InvalidArgument, AssociationList.from_python, [1])
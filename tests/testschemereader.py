@@ -0,0 +1,77 @@
+"""Tests for lilyflower.schemereader."""
+from lilyflower.schemereader import read, read_scheme
+from lilyflower.schemedata import (
+    AssociationList, Boolean, Color, List, Pair, Procedure, SignedFloat,
+    SignedInt, String, Symbol)
+from lilyflower.errors import ParseError
+from lilyflower.writer import iter_format
+# pylint: disable=no-name-in-module
+from nose.tools import assert_equals, assert_is, assert_raises
+
+
+def test_atoms():
+    """Test numbers, booleans, strings and symbols."""
+    assert_is(read("#2"), SignedInt(2))
+    assert_is(read("#-1.5e3"), SignedFloat(-1500.0))
+    assert_is(read("##t"), Boolean(True))
+    assert_is(read("#f"), Boolean(False))
+    assert_is(read("#'up"), Symbol('up'))
+    assert_is(read('#"a \\"b\\""'), String('a "b"'))
+    assert_is(read('#red'), Color('red'))
+
+
+def test_strings():
+    """Test strings as lilyflower formats them read back, or raise."""
+    for text in ("x", "x-y", "x\"y"):
+        value = String(text)
+        assert_is(read(format(value)), value)
+        pair = Pair([value, List([value, SignedInt(1)])])
+        assert_equals(format(read(format(pair))), format(pair))
+    for text in ("x y", "(x)", "x;"):
+        value = List([String(text)])
+        assert_raises(ParseError, read, format(value))
+        assert_raises(ParseError, read, format(String(text)))
+    quoted = read("#'(a 'b 'c)")._data
+    assert_equals([format(item) for item in quoted], ["#'a", "#'b", "#'c"])
+
+
+def test_compound():
+    """Test pairs, lists, association lists and colors."""
+    assert_equals(type(read("#'(1 . 2)")), Pair)
+    assert_equals(type(read("#'(1 2 (3 . 4))")), List)
+    alist = read("#'((a . 1) ; comment\n (b . #t))")
+    assert_equals(type(alist), AssociationList)
+    assert_equals(format(alist), "#'((a . 1) (b . #t))")
+    assert_is(read('#(x11-color "snow4")'), Color('snow4'))
+
+
+def test_procedure():
+    """Test unknown forms are kept verbatim."""
+    code = '(define-music-function\n  (x) (ly:music?) (f (g "(")))'
+    procedure = read("#" + code)
+    assert_equals(type(procedure), Procedure)
+    assert_equals(format(procedure), "#" + code)
+    assert_equals(type(read('#(x11-color "snow4" 1)')), Procedure)
+
+
+def test_position():
+    """Test reading stops after the expression."""
+    value, end = read_scheme("#'(1 2) c4", 1)
+    assert_equals((format(value), end), ("#'(1 2)", 7))
+    assert_raises(ParseError, read_scheme, "#'(1 2", 1, False)
+
+
+def test_deep():
+    """Test deep nesting doesn't hit the recursion limit."""
+    depth = 10000
+    value = read("#'" + "(" * depth + "1" + ")" * depth)
+    code = "".join(iter_format(value))
+    assert_equals(code, "#'" + "(" * depth + "1" + ")" * depth)
+    value = read("#" + "(" * depth + "f" + ")" * depth)
+    assert_equals(type(value), Procedure)
+
+
+def test_invalid():
+    """Test invalid scheme raises ParseError."""
+    for code in ("#'(1 . 2 3)", "#'(1 2", "#nonsense", "#'(1))", "# 1"):
+        assert_raises(ParseError, read, code)
@@ -0,0 +1,72 @@
+"""Tests for lilyflower.shard."""
+import os
+import re
+import shutil
+import tempfile
+from lilyflower.shard import write_sharded
+from lilyflower.dom import LilyFile
+from lilyflower.containers import Score, New
+from lilyflower.tones import Note
+# pylint: disable=no-name-in-module
+from nose.tools import assert_equals
+
+
+def _read(directory, filename):
+    """Return file contents."""
+    with open(os.path.join(directory, filename)) as input_file:
+        return input_file.read()
+
+
+def _includes(directory, name):
+    """Return the files the main file includes."""
+    return re.findall(r'\\include "([^"]*)"', _read(directory, name + '.ly'))
+
+
+def test_write_sharded():
+    """Test parts are only written when they change."""
+    directory = tempfile.mkdtemp()
+    try:
+        lily_file = LilyFile([
+            Score([Note('c')]), Score([Note('d')]), Score([Note('e')])])
+        written = write_sharded(lily_file, directory, 'music')
+        parts = _includes(directory, 'music')
+        assert_equals(sorted(written), sorted(parts + ['music.ly']))
+        assert_equals(_read(directory, parts[1]), format(lily_file[1]))
+        assert_equals(write_sharded(lily_file, directory, 'music'), [])
+        # a new part at the front doesn't touch the parts after it
+        lily_file = LilyFile([Score([Note('g')])] + list(lily_file))
+        written = write_sharded(lily_file, directory, 'music')
+        new_parts = _includes(directory, 'music')
+        assert_equals(new_parts[1:], parts)
+        assert_equals(sorted(written), sorted([new_parts[0], 'music.ly']))
+        lily_file[1].append(Note('f'))
+        written = write_sharded(lily_file, directory, 'music')
+        assert_equals(len(written), 2)
+        assert not os.path.exists(os.path.join(directory, parts[0]))
+        del lily_file[3]
+        assert_equals(
+            write_sharded(lily_file, directory, 'music'), ['music.ly'])
+        assert not os.path.exists(os.path.join(directory, parts[2]))
+        os.remove(os.path.join(directory, parts[1]))
+        assert_equals(
+            write_sharded(lily_file, directory, 'music'), [parts[1]])
+        # no temporary files are left behind
+        assert_equals(
+            sorted(name for name in os.listdir(directory)
+                   if not name.endswith('.ly')), ['.music.shards'])
+    finally:
+        shutil.rmtree(directory)
+
+
+def test_types():
+    """Test sharding something other than scores."""
+    directory = tempfile.mkdtemp()
+    try:
+        lily_file = LilyFile([Score([
+            New([Note('c')], ['Staff']), New([Note('d')], ['Staff'])])])
+        write_sharded(lily_file, directory, types=(New,), workers=1)
+        parts = _includes(directory, 'score')
+        assert_equals(len(parts), 2)
+        assert_equals(_read(directory, parts[0]), format(lily_file[0][0]))
+    finally:
+        shutil.rmtree(directory)
@@ -0,0 +1,99 @@
+"""Tests for lilyflower.snapshot."""
+from collections import OrderedDict
+import os
+import tempfile
+from lilyflower.benchmark import generate, Config
+from lilyflower.parser import parse
+from lilyflower.container import Container
+from lilyflower.tones import Note
+from lilyflower.spanners import Slur
+from lilyflower.errors import SnapshotError
+from lilyflower.snapshot import dumps, loads, dump, Snapshot
+from lilyflower.writer import iter_format
+# pylint: disable=no-name-in-module
+from nose.tools import assert_equals, assert_is, assert_raises
+
+
+def _body(text):
+    """Strip the creation comment from formatted output."""
+    return text.split("\n", 1)[1]
+
+
+def _trees():
+    """Trees to take snapshots of."""
+    return [
+        generate(Config(notes=50, voices=2, depth=3, markup=0.3)),
+        parse(r"""
+            \markup { \with-color #(x11-color "snow4") { \bold { } } }
+            \relative { c'4( d8[ e] <c e g>2.~\< <c e g>4\!) r2 }
+            """)]
+
+
+def test_round_trip():
+    """Test trees format the same after a snapshot."""
+    for tree in _trees():
+        data = dumps(tree)
+        assert_equals(_body(format(loads(data))), _body(format(tree)))
+
+
+def test_lazy():
+    """Test a lazily loaded tree renders the same, from a mapped file."""
+    for tree in _trees():
+        path = tempfile.mktemp()
+        dump(tree, path)
+        try:
+            with Snapshot.open(path) as snapshot:
+                lazy = snapshot.load(lazy=True)
+                assert_equals(
+                    _body("".join(iter_format(lazy))),
+                    _body(format(tree)))
+                assert_equals(len(snapshot), len(tree))
+                assert_equals(format(snapshot[-1]), format(tree[-1]))
+        finally:
+            os.remove(path)
+
+
+def test_shared():
+    """Test shared objects stay shared."""
+    slur = Slur()
+    music = Container([
+        Note('c', spanners=[slur]), Note('d'), Note('e', spanners=[slur])])
+    copy = loads(dumps(music))
+    assert_is(copy[0]._spanners[0], copy[2]._spanners[0])
+    assert_equals(format(copy), format(music))
+
+
+def test_invalid():
+    """Test bad data is refused."""
+    data = dumps(Container([Note('c')]))
+    assert_raises(SnapshotError, loads, "not a snapshot")
+    assert_raises(SnapshotError, loads, "X" + data[1:])
+    version = len("LILYSNAP")
+    assert_raises(
+        SnapshotError, loads,
+        data[:version] + chr(99) + data[version + 1:])
+
+
+class _Outside(Container):
+
+    """Container class from outside lilyflower."""
+
+    pass
+
+
+def test_safe():
+    """Test only known types are stored, and only known classes loaded."""
+    music = Container([Note('c')])
+    music.extra = {'key': OrderedDict([('a', 1.5), ('b', (None, u'x'))])}
+    copy = loads(dumps(music))
+    assert_equals(copy.extra, music.extra)
+    assert_equals(type(copy.extra['key']), OrderedDict)
+    music.extra = set()
+    assert_raises(SnapshotError, dumps, music)
+    assert_raises(SnapshotError, dumps, _Outside([]))
+    # a class name in the file that is not in the class table
+    data = dumps(Container([]))
+    name = "lilyflower.container.Container"
+    assert_raises(
+        SnapshotError, loads,
+        data.replace(name, "os.system.".ljust(len(name), "x")))
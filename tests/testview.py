@@ -0,0 +1,52 @@
+"""Tests for lilyflower.view."""
+import cPickle
+from lilyflower.view import View
+from lilyflower.container import Container
+from lilyflower.dom import Bold, Italic, Markup
+from lilyflower.rope import chunk_content
+from lilyflower.tones import Note
+# pylint: disable=no-name-in-module
+from nose.tools import assert_equals, assert_is, assert_raises
+
+
+def test_slices():
+    """Test views index like the slices of a list."""
+    items = range(20)
+    for first in (slice(None), slice(3, 17), slice(15, 2, -2), slice(-4, 1)):
+        view = View(items, first.start, first.stop, first.step)
+        expected = items[first]
+        assert_equals(list(view), expected)
+        assert_equals(list(reversed(view)), expected[::-1])
+        for second in (slice(None, None, -1), slice(1, -1, 3), slice(5, 0)):
+            assert_equals(list(view[second]), expected[second])
+        for index in range(-len(expected), len(expected)):
+            assert_equals(view[index], expected[index])
+        assert_raises(IndexError, view.__getitem__, len(expected))
+
+
+def test_no_copy():
+    """Test views read the content, and see changes."""
+    notes = [Note('c'), Note('d'), Note('e'), Note('f')]
+    music = Container(list(notes))
+    view = music[1:3]
+    assert_is(view[0], notes[1])
+    music[1] = Note('g')
+    assert_equals(format(view), "{\n  g e\n}")
+    assert_equals(format(music[2:3]), "e")
+    assert_equals(format(music[::-1], "c"), "{ f e g c }")
+    assert_equals(view, [music[1], music[2]])
+    assert_equals(format(cPickle.loads(cPickle.dumps(view, -1))),
+                  format(view))
+
+
+def test_reversed():
+    """Test reversed iteration over nodes, containers and ropes."""
+    notes = [Note('c'), Note('d'), Note('e')]
+    assert_equals(list(reversed(Container(list(notes)))), notes[::-1])
+    chunked = chunk_content(Container(list(notes)), chunk_size=2)
+    assert_equals(list(reversed(chunked)), notes[::-1])
+    assert_equals(list(chunked[::-1]), notes[::-1])
+    markup = Markup([Bold(), Italic()])
+    assert_equals(
+        [type(item) for item in reversed(markup)], [Italic, Bold])
+    assert_equals(format(markup[1:]), format(Italic()))
@@ -0,0 +1,180 @@
+"""Tests for lilyflower.visitor."""
+import sys
+from lilyflower.visitor import Visitor, Transformer, SKIP, STOP, REMOVE
+from lilyflower.container import Container
+from lilyflower.containers import Score
+from lilyflower.dom import Relative
+from lilyflower.rope import Rope, chunk_content
+from lilyflower.spanners import Slur
+from lilyflower.tones import Chord, Note, Pitch, Rest
+# pylint: disable=no-name-in-module
+from nose.tools import assert_equals, assert_is, assert_is_not
+
+
+class _Names(Visitor):
+
+    """Record class names in walking order."""
+
+    def __init__(self):
+        """Start with no names."""
+        self.names = []
+
+    def visit_CompactPickle(self, obj):
+        """Record obj on the way down."""
+        self.names.append(type(obj).__name__)
+
+    def leave_Container(self, obj):
+        """Record the end of a container."""
+        self.names.append("/" + type(obj).__name__)
+
+
+def test_order():
+    """Test objects are visited depth first, in order."""
+    names = _Names()
+    names.visit(Container([
+        Note('c'), Chord([Pitch('e'), Pitch('g')]), Score([Rest()])]))
+    assert_equals(names.names, [
+        'Container', 'Note', 'Chord', 'Pitch', 'Pitch', 'Score',
+        'Rest', '/Score', '/Container'])
+
+
+def test_dispatch():
+    """Test the method of the nearest base class is used."""
+    class Counter(Visitor):
+        """Count tones and notes apart."""
+        tones = notes = 0
+
+        def visit_Tone(self, _):
+            """Count a tone."""
+            self.tones += 1
+
+        def visit_Note(self, _):
+            """Count a note."""
+            self.notes += 1
+
+    counter = Counter()
+    counter.visit(Relative([Note('c'), Rest(), Note('d')]))
+    assert_equals((counter.tones, counter.notes), (1, 2))
+
+
+def test_skip_stop():
+    """Test subtrees can be skipped and the walk stopped."""
+    class Skipper(_Names):
+        """Skip scores, stop at rests."""
+
+        def visit_Score(self, obj):
+            """Skip."""
+            self.names.append('Score')
+            return SKIP
+
+        def visit_Rest(self, _):
+            """Stop."""
+            return STOP
+
+    names = Skipper()
+    names.visit(Container([Score([Note('c')]), Note('d'), Rest(), Note('e')]))
+    assert_equals(names.names, ['Container', 'Score', '/Score', 'Note'])
+
+
+def test_transform():
+    """Test only changed paths are rebuilt."""
+    class Transpose(Transformer):
+        """Replace c by d, drop rests."""
+
+        def leave_Note(self, note):
+            """Replace c."""
+            if note._pitch == 'c':
+                return Note('d', '', note._duration)
+
+        def leave_Rest(self, _):
+            """Drop."""
+            return REMOVE
+
+    untouched = Container([Note('e')])
+    changed = Container([Note('c', '', '8'), Rest()])
+    music = Container([untouched, changed])
+    result = Transpose().transform(music)
+    assert_equals(format(result, 'c'), "{ e d8 }")
+    assert_equals(format(music, 'c'), "{ e { c8 r } }")
+    assert_is(result._container[0], untouched)
+    assert_is_not(result._container[1], changed)
+    assert_is(Transpose().transform(untouched), untouched)
+
+
+def test_transform_stop():
+    """Test stopping leaves the rest of the tree as it was."""
+    class UntilRest(Transformer):
+        """Replace c by d, until the first rest."""
+
+        def visit_Rest(self, _):
+            """Stop."""
+            return STOP
+
+        def leave_Note(self, note):
+            """Replace c."""
+            if note._pitch == 'c':
+                return Note('d')
+
+        def leave_Container(self, _):
+            """Never reached after stopping."""
+            raise AssertionError("left a container after stopping")
+
+    after = Container([Note('c')])
+    music = Score([Container([Note('c'), Rest(), Note('c')]), after])
+    result = UntilRest().transform(music)
+    assert_equals(format(result, 'c'), "\\score { { d r c } c }")
+    assert_is(result._container[1], after)
+    assert_equals(format(music, 'c'), "\\score { { c r c } c }")
+    rest = Rest()
+    assert_is(UntilRest().transform(rest), rest)
+
+
+def test_shared():
+    """Test shared objects stay shared."""
+    class NewSlurs(Transformer):
+        """Replace slurs."""
+
+        def leave_Slur(self, _):
+            """Replace."""
+            return Slur()
+
+    slur = Slur()
+    music = chunk_content(Container(
+        [Note('c', spanners=[slur]), Note('d', spanners=[slur])]), 4)
+    result = NewSlurs().transform(music)
+    first, second = result._container
+    assert_is(first._spanners[0], second._spanners[0])
+    assert_is_not(first._spanners[0], slur)
+    assert_equals(type(result._container), Rope)
+    assert_equals(format(result, 'c'), "{ c( d) }")
+
+
+def test_deep():
+    """Test deep trees don't hit the recursion limit."""
+    music = Container([Note('c')])
+    for _ in range(sys.getrecursionlimit() * 2):
+        music = Container([music])
+
+    class Count(Visitor):
+        """Count notes."""
+        notes = 0
+
+        def visit_Note(self, _):
+            """Count."""
+            self.notes += 1
+
+    counter = Count()
+    counter.visit(music)
+    assert_equals(counter.notes, 1)
+
+    class Drop(Transformer):
+        """Drop notes."""
+
+        def leave_Note(self, _):
+            """Drop."""
+            return REMOVE
+
+    result = Drop().transform(music)
+    while result._container:
+        result = result._container[0]
+    assert_equals(result._container, [])
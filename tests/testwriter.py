@@ -0,0 +1,76 @@
+"""Tests for lilyflower.writer."""
+import gzip
+import os
+import shutil
+import tempfile
+from lilyflower.writer import iter_format, iter_chunks, save
+from lilyflower.containers import LilyFile
+from lilyflower.tones import Note
+from lilyflower.tools import COMPACT
+from lilyflower.parser import parse
+from lilyflower.benchmark import generate, Config
+# pylint: disable=no-name-in-module
+from nose.tools import assert_equals
+
+
+def _body(text):
+    """Strip the creation comment from output."""
+    return text.split("\n", 1)[1]
+
+
+def test_same_as_format():
+    """Test streamed output is what format gives."""
+    trees = [
+        generate(Config(notes=50, voices=3, depth=3, markup=0.2)),
+        parse(r"""
+            \markup { \bold { \abs-fontsize #3 { \eyeglasses } } }
+            \relative { c'4( d | e) <c e g>2 }
+            % a comment
+            """)]
+    for tree in trees:
+        expected = _body(format(tree))
+        assert_equals(_body("".join(iter_format(tree))), expected)
+        chunks = list(iter_chunks(tree, 100))
+        assert_equals(_body("".join(chunks)), expected)
+        assert all(len(chunk) < 200 for chunk in chunks)
+        assert_equals(
+            _body("".join(iter_chunks(tree, 100, COMPACT))),
+            _body(format(tree, COMPACT)))
+
+
+def test_save():
+    """Test atomic, compressed and unchanged saving."""
+    directory = tempfile.mkdtemp()
+    try:
+        path = os.path.join(directory, 'music.ly')
+        lily_file = LilyFile([Note('c')])
+        assert lily_file.save(path, fsync=True)
+        with open(path) as input_file:
+            expected = _body(format(lily_file))
+            assert_equals(_body(input_file.read()), expected)
+        assert_equals(os.listdir(directory), ['music.ly'])
+        os.utime(path, (0, 0))
+        assert not lily_file.save(path, keep_unchanged=True)
+        assert_equals(os.stat(path).st_mtime, 0)
+        lily_file.append(Note('d'))
+        assert lily_file.save(path, keep_unchanged=True)
+        assert os.stat(path).st_mtime > 0
+        compressed = path + '.gz'
+        assert save(lily_file, compressed)
+        assert not save(lily_file, compressed, keep_unchanged=True)
+        with gzip.open(compressed) as input_file:
+            assert_equals(_body(input_file.read()), _body(format(lily_file)))
+        code = "{ c d }\n"
+        assert save(code, path, compact=True)
+        with open(path) as input_file:
+            assert_equals(input_file.read(), code)
+        try:
+            save(Note('c'), os.path.join(directory, 'nested', 'x.ly'))
+        except OSError:
+            pass
+        else:
+            raise AssertionError("expected an error")
+        assert_equals(
+            sorted(os.listdir(directory)), ['music.ly', 'music.ly.gz'])
+    finally:
+        shutil.rmtree(directory)